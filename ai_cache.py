@@ -0,0 +1,108 @@
+"""generate_ai_response için TTL + LRU yanıt önbelleği.
+
+Anahtar, mesajın normalize edilmiş hali (küçük harf, noktalama ve fazla
+boşluk atılmış), sohbet tipi ve istenirse kullanıcı adıdır; "Merhaba!!"
+ile "merhaba" aynı kayda düşer. Sohbet bağlamı anahtarda yoktur; bot
+önbelleği sadece önceki turu olmayan isteklerde kullanır.
+
+Bellek katmanı hem kayıt sayısı hem yaklaşık bayt ile sınırlıdır. İsteğe
+bağlı kalıcı katman (SQLite) yeniden başlatmalardan sonra da yanıt verir.
+"""
+import hashlib
+import re
+import sys
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+_PUNCT = re.compile(r"[^\w\s?]", re.UNICODE)
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _PUNCT.sub(" ", text)
+    text = re.sub(r"\?+", "?", text)
+    return _SPACE.sub(" ", text).strip()
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 2_000_000,
+                 ttl: float = 3600, load=None, save=None, per_user: bool = False):
+        """load(key, min_ts) / save(key, response, ts): kalıcı katman coroutine'leri."""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.per_user = per_user
+        self._load = load
+        self._save = save
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, message_text: str, chat_type: str, user_name: str = "") -> str:
+        parts = [chat_type, normalize(message_text)]
+        if self.per_user:
+            parts.append(normalize(user_name))
+        return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _size(key: str, value: str) -> int:
+        return sys.getsizeof(key) + sys.getsizeof(value)
+
+    def _remember(self, key: str, value: str, ts: float):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= self._size(key, old[0])
+        self._entries[key] = (value, ts)
+        self._bytes += self._size(key, value)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            old_key, (old_value, _) = self._entries.popitem(last=False)
+            self._bytes -= self._size(old_key, old_value)
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, ts = entry
+            if now - ts <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+            self._bytes -= self._size(key, value)
+
+        if self._load is not None:
+            row = await self._load(key, int(now - self.ttl))
+            if row is not None:
+                value, ts = row
+                self._remember(key, value, ts)
+                self.hits += 1
+                self.persistent_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, value: str):
+        now = time.time()
+        self._remember(key, value, now)
+        if self._save is not None:
+            await self._save(key, value, int(now))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,377 @@
+"""Gemini çağrıları için ayrılmış, sınırlı executor.
+
+Bloklayan ``model.generate_content`` çağrıları varsayılan thread havuzunu
+paylaşmak yerine burada, sabit sayıda thread'de çalışır. Her isteğin bir
+süre sınırı vardır; süre dolunca henüz başlamamış iş iptal edilir,
+başlamış olanın sonucu bekleyene dönmez.
+
+Kuyruk derinliği sınırlıdır ve önce grup istekleri düşürülür: grup
+istekleri ``group_max_pending`` dolunca, özel mesajlar ancak
+``max_pending`` dolunca reddedilir.
+
+Sağlayıcı arızalarında kuyruk hatalı/yavaş çağrılarla dolmasın diye her
+model bir ``CircuitBreaker`` arkasındadır: devre açıkken istek hiç
+gönderilmeden ``CircuitOpen`` ile reddedilir. ``run_hedged`` ise ilk
+istek gecikirse (örn. son çağrıların p95'i) ikinci bir modele paralel
+istek atar ve önce biten başarılı yanıtı döndürür.
+
+``LazyModel`` google.generativeai'yi (gRPC/protobuf yığınıyla ~0.6 s)
+bot modülü yüklenirken değil, ilk ihtiyaçta ya da arka planda ``load``
+ile yükler; bot update almaya bunu beklemeden başlar.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+PRIVATE = "private"
+GROUP = "group"
+
+
+class Overloaded(Exception):
+    """Kuyruk dolu; istek çalıştırılmadan reddedildi."""
+
+
+class CircuitOpen(Exception):
+    """Devre açık; istek Gemini'ye gönderilmeden reddedildi."""
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def _load_genai(api_key: str):
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            _genai = genai
+    return _genai
+
+
+class LazyModel:
+    """İlk kullanımda kurulan ``GenerativeModel`` vekili.
+
+    ``generate_content`` AI thread'lerinde çağrılır; kurulum kilitlidir,
+    aynı anda gelen çağrılar tek kurulumu bekler. google-generativeai
+    0.5'ten eski sürümler ``system_instruction`` bilmez; o durumda talimat
+    bir kez kurulan kullanıcı/model giriş turu olarak her isteğin başına
+    aynı nesnelerle eklenir.
+    """
+
+    def __init__(self, model_name: str, api_key: str, system_instruction: str = None):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.system_instruction = system_instruction
+        self.load_seconds = None
+        self._model = None
+        self._preamble = ()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                started = time.perf_counter()
+                genai = _load_genai(self.api_key)
+                if self.system_instruction is None:
+                    model = genai.GenerativeModel(self.model_name)
+                else:
+                    try:
+                        model = genai.GenerativeModel(self.model_name, system_instruction=self.system_instruction)
+                    except TypeError:
+                        model = genai.GenerativeModel(self.model_name)
+                        self._preamble = (
+                            {"role": "user", "parts": [self.system_instruction]},
+                            {"role": "model", "parts": ["Anlaşıldı."]},
+                        )
+                self.load_seconds = time.perf_counter() - started
+                self._model = model
+                logger.info(f"Gemini model {self.model_name} loaded in {self.load_seconds:.2f}s")
+        return self._model
+
+    def generate_content(self, contents: list, **kwargs):
+        model = self.load()
+        if self._preamble:
+            contents = list(self._preamble) + contents
+        return model.generate_content(contents, **kwargs)
+
+
+class CircuitBreaker:
+    """Son ``window`` çağrının hata ya da yavaşlık oranına göre açılan devre.
+
+    - closed: çağrılar geçer; en az ``min_calls`` sonuçta hata oranı
+      ``error_rate``'i ya da ``slow_call_s``'den uzun sürenlerin oranı
+      ``slow_rate``'i aşarsa açılır.
+    - open: ``open_s`` boyunca her istek reddedilir.
+    - half_open: aynı anda en fazla ``probes`` deneme geçer; hepsi hızlı ve
+      başarılıysa kapanır, biri bile hatalı/yavaşsa tekrar açılır.
+
+    ``acquire`` bir jeton döndürür; sonuç ``record`` ile, sonuçsuz biten
+    (iptal edilen) çağrı ``release`` ile bildirilir. Devre durum
+    değiştirdikten sonra gelen eski sonuçlar sayılmaz.
+    """
+
+    def __init__(self, name: str, window: int = 20, min_calls: int = 10, error_rate: float = 0.5,
+                 slow_call_s: float = 10.0, slow_rate: float = 0.5, open_s: float = 30.0,
+                 probes: int = 2, clock=time.monotonic):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_s = slow_call_s
+        self.slow_rate = slow_rate
+        self.open_s = open_s
+        self.probes = probes
+        self._clock = clock
+        self._calls = deque(maxlen=window)  # (hatalı, yavaş)
+        self.state = CLOSED
+        self._generation = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.trips = 0
+        self.rejected = 0
+
+    def _transition(self, state: str, reason: str = ""):
+        self.state = state
+        self._generation += 1
+        self._calls.clear()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        if state == OPEN:
+            self._opened_at = self._clock()
+            self.trips += 1
+            logger.warning(f"Gemini circuit '{self.name}' opened: {reason}")
+        elif state == CLOSED:
+            logger.info(f"Gemini circuit '{self.name}' closed")
+
+    def acquire(self):
+        if self.state == OPEN:
+            if self._clock() - self._opened_at < self.open_s:
+                self.rejected += 1
+                raise CircuitOpen(f"circuit '{self.name}' open")
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.probes:
+                self.rejected += 1
+                raise CircuitOpen(f"circuit '{self.name}' half-open, probes busy")
+            self._probes_in_flight += 1
+        return self._generation, self.state
+
+    def release(self, token):
+        generation, state = token
+        if generation == self._generation and state == HALF_OPEN:
+            self._probes_in_flight -= 1
+
+    def record(self, token, ok: bool, latency: float):
+        generation, state = token
+        if generation != self._generation:
+            return
+        slow = latency >= self.slow_call_s
+        if state == HALF_OPEN:
+            self._probes_in_flight -= 1
+            if not ok or slow:
+                self._transition(OPEN, "probe " + ("failed" if not ok else f"took {latency:.1f}s"))
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.probes:
+                self._transition(CLOSED)
+            return
+
+        self._calls.append((not ok, slow))
+        n = len(self._calls)
+        if n < self.min_calls:
+            return
+        failed = sum(1 for f, _ in self._calls if f)
+        slowed = sum(1 for _, sl in self._calls if sl)
+        if failed / n >= self.error_rate:
+            self._transition(OPEN, f"{failed}/{n} recent calls failed")
+        elif slowed / n >= self.slow_rate:
+            self._transition(OPEN, f"{slowed}/{n} recent calls slower than {self.slow_call_s}s")
+
+    def stats(self) -> dict:
+        return {"state": self.state, "trips": self.trips, "rejected": self.rejected}
+
+
+class LatencyTracker:
+    """Son ``size`` başarılı çağrının süresi; hedge eşiği için yüzdelik.
+
+    Sıralı kopya her ``refresh`` kayıtta bir yenilenir; okuma ucuzdur.
+    """
+
+    def __init__(self, size: int = 200, min_samples: int = 20, refresh: int = 20):
+        self._samples = deque(maxlen=size)
+        self._sorted = []
+        self._since_sort = 0
+        self.min_samples = min_samples
+        self.refresh = refresh
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        with self._lock:
+            self._samples.append(latency)
+            self._since_sort += 1
+            if self._since_sort >= self.refresh or len(self._sorted) < self.min_samples:
+                self._sorted = sorted(self._samples)
+                self._since_sort = 0
+
+    def quantile(self, q: float):
+        values = self._sorted
+        if len(values) < self.min_samples:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def deadline(self, q: float, floor: float, ceiling: float) -> float:
+        value = self.quantile(q)
+        return min(ceiling, max(floor, value if value is not None else floor))
+
+
+class AIExecutor:
+    def __init__(self, workers: int = 4, max_pending: int = 16,
+                 group_max_pending: int = None, timeout: float = 20.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.group_max_pending = group_max_pending if group_max_pending is not None else max(1, workers // 2)
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini")
+        # Thread'de çalışan + sırada bekleyen iş sayısı (süresi dolmuş ama
+        # hâlâ çalışan işler de dahil, çünkü thread'i meşgul ediyorlar)
+        self._outstanding = 0
+        self.completed = 0
+        self.shed = {PRIVATE: 0, GROUP: 0}
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def outstanding(self) -> int:
+        return self._outstanding
+
+    def _release(self, _future=None):
+        self._outstanding -= 1
+
+    def hedge_started(self):
+        self.hedges += 1
+
+    def hedge_won(self):
+        self.hedge_wins += 1
+
+    async def run(self, fn, priority: str = PRIVATE, timeout: float = None, breaker: CircuitBreaker = None,
+                  answered=None):
+        """``fn``'i Gemini thread'inde çalıştırır ve sonucu devreye bildirir.
+
+        ``answered`` verilirse (akışlar) devreye toplam süre yerine
+        ``answered()``'ın döndürdüğü ana (ilk parça, ``perf_counter``) kadar
+        geçen süre bildirilir; uzun ama hızlı başlayan akış yavaş sayılmaz.
+        """
+        limit = self.max_pending if priority == PRIVATE else self.group_max_pending
+        if self._outstanding >= limit:
+            self.shed[priority] += 1
+            raise Overloaded(f"{self._outstanding} Gemini requests outstanding")
+        token = breaker.acquire() if breaker is not None else None
+
+        loop = asyncio.get_running_loop()
+        self._outstanding += 1
+        future = self._pool.submit(fn)
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._release, f))
+        started = time.perf_counter()
+
+        def latency():
+            at = answered() if answered is not None else None
+            return (at or time.perf_counter()) - started
+
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            future.cancel()
+            if token is not None:
+                breaker.record(token, False, latency())
+            raise
+        except asyncio.CancelledError:
+            # Hedge'i kaybeden istek: sonucu ne başarı ne hata
+            if token is not None:
+                breaker.release(token)
+            raise
+        except Exception:
+            if token is not None:
+                breaker.record(token, False, latency())
+            raise
+        if token is not None:
+            breaker.record(token, True, latency())
+        self.completed += 1
+        return result
+
+    async def run_hedged(self, fn, hedge_fn, hedge_after: float, priority: str = PRIVATE,
+                         timeout: float = None, breaker: CircuitBreaker = None,
+                         hedge_breaker: CircuitBreaker = None, tracker: LatencyTracker = None):
+        """``fn`` ``hedge_after`` saniyede bitmezse ``hedge_fn``'i de başlat.
+
+        Önce biten başarılı sonuç döner, diğeri iptal edilir. İkisi de
+        hata verirse ilk isteğin hatası yükselir. ``tracker`` ilk isteğin
+        sürelerini toplar (sonraki hedge eşikleri için); hedge kazanırsa ilk
+        istek en az o ana kadar sürmüş demektir ve bu süre alt sınır olarak
+        kaydedilir, yoksa yavaş ilk istekler yüzdelikten hiç görünmezdi.
+        """
+        started = time.perf_counter()
+        primary = asyncio.ensure_future(self.run(fn, priority, timeout, breaker))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done or hedge_fn is None:
+            result = await primary
+            if tracker is not None:
+                tracker.record(time.perf_counter() - started)
+            return result
+
+        self.hedge_started()
+        hedge = asyncio.ensure_future(self.run(hedge_fn, priority, timeout, hedge_breaker))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    if task is hedge:
+                        self.hedge_won()
+                    if tracker is not None:
+                        tracker.record(time.perf_counter() - started)
+                    return task.result()
+            if hedge.exception() is not None and not isinstance(hedge.exception(), (Overloaded, CircuitOpen)):
+                logger.warning(f"Hedged Gemini request failed too: {hedge.exception()!r}")
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "outstanding": self._outstanding,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "shed": dict(self.shed),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,116 @@
+"""db.py fonksiyonlarının event loop'u bloklamayan (awaitable) sürümleri.
+
+Tüm yazmalar tek bir writer thread'inde sırayla çalışır; okumalar ayrı
+bir küçük havuzda yürür. WAL modunda okuyucular yazarı beklemez.
+"""
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import metrics
+
+DB_READ_WORKERS = int(os.getenv("DB_READ_WORKERS", "2"))
+
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+_readers = ThreadPoolExecutor(max_workers=DB_READ_WORKERS, thread_name_prefix="db-reader")
+
+# Kuyrukta bekleme ve thread'de çalışma ayrı ölçülür: writer'ın tıkandığı
+# bekleme süresinden, yavaş sorgu çalışma süresinden görünür.
+DB_CALL_SECONDS = metrics.histogram("db_call_seconds", "db.py function run time in the worker thread", ("fn", "pool"))
+DB_WAIT_SECONDS = metrics.histogram("db_queue_wait_seconds", "Time a db call waited for a free thread", ("pool",))
+DB_ERRORS = metrics.counter("db_errors_total", "db.py calls that raised", ("fn",))
+_pending = {"writer": 0, "reader": 0}
+metrics.gauge("db_pending_calls", "db calls queued or running", ("pool",), fn=lambda: dict(_pending))
+
+def _submit(executor, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+def _on(executor, fn, pool: str):
+    run_time = DB_CALL_SECONDS.labels(fn=fn.__name__, pool=pool)
+    wait_time = DB_WAIT_SECONDS.labels(pool=pool)
+    errors = DB_ERRORS.labels(fn=fn.__name__)
+
+    def timed(queued_at, *args, **kwargs):
+        started = time.perf_counter()
+        wait_time.observe(started - queued_at)
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            run_time.observe(time.perf_counter() - started)
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        _pending[pool] += 1
+        try:
+            return await _submit(executor, timed, time.perf_counter(), *args, **kwargs)
+        finally:
+            _pending[pool] -= 1
+    return wrapper
+
+def writer(fn):
+    """Senkron fonksiyonu writer thread'inde çalışan coroutine'e çevir."""
+    return _on(_writer, fn, "writer")
+
+def reader(fn):
+    """Senkron fonksiyonu okuma havuzunda çalışan coroutine'e çevir."""
+    return _on(_readers, fn, "reader")
+
+init_db = writer(db.init_db)
+upsert_user = writer(db.upsert_user)
+set_optout = writer(db.set_optout)
+get_user = reader(db.get_user)
+active_users_by_ids = reader(db.active_users_by_ids)
+user_schedule = reader(db.user_schedule)
+claim_users = writer(db.claim_users)
+release_users = writer(db.release_users)
+upsert_group = writer(db.upsert_group)
+set_group_active = writer(db.set_group_active)
+active_groups_by_ids = reader(db.active_groups_by_ids)
+group_schedule = reader(db.group_schedule)
+claim_groups = writer(db.claim_groups)
+release_groups = writer(db.release_groups)
+get_cached_response = reader(db.get_cached_response)
+put_cached_response = writer(db.put_cached_response)
+prune_cached_responses = writer(db.prune_cached_responses)
+load_cooldowns = reader(db.load_cooldowns)
+save_cooldowns = writer(db.save_cooldowns)
+enqueue_drips = writer(db.enqueue_drips)
+enqueue_outbox = writer(db.enqueue_outbox)
+claim_outbox = writer(db.claim_outbox)
+settle_outbox = writer(db.settle_outbox)
+release_outbox = writer(db.release_outbox)
+prune_outbox = writer(db.prune_outbox)
+outbox_counts = reader(db.outbox_counts)
+create_campaign = writer(db.create_campaign)
+get_campaign = reader(db.get_campaign)
+recent_campaigns = reader(db.recent_campaigns)
+claim_campaign = writer(db.claim_campaign)
+checkpoint_campaign = writer(db.checkpoint_campaign)
+final_checkpoint_campaign = writer(db.final_checkpoint_campaign)
+finish_campaign = writer(db.finish_campaign)
+set_campaign_status = writer(db.set_campaign_status)
+release_campaigns = writer(db.release_campaigns)
+campaign_recipients = reader(db.campaign_recipients)
+get_chat = reader(db.get_chat)
+set_chat_timezone = writer(db.set_chat_timezone)
+set_quiet_hours = writer(db.set_quiet_hours)
+quiet_settings = reader(db.quiet_settings)
+update_quiet_masks = writer(db.update_quiet_masks)
+catalog_snapshot = reader(db.catalog_snapshot)
+catalog_version = reader(db.catalog_version)
+sync_catalog = writer(db.sync_catalog)
+
+async def close_db():
+    """Bekleyen işleri bitir, thread'leri durdur ve bağlantıları kapat."""
+    def _shutdown():
+        _writer.shutdown(wait=True)
+        _readers.shutdown(wait=True)
+        db.close_db()
+    await asyncio.get_running_loop().run_in_executor(None, _shutdown)
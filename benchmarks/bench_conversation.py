@@ -0,0 +1,78 @@
+"""Sohbet bağlamının bellek ve istem boyutu ölçümü.
+
+``--chats`` sohbetin her birine ``--turns`` tur eklenir (kullanıcı/model
+sırayla, 20-200 karakter). Raporlananlar:
+
+- tracemalloc ile ölçülen ve ``ConversationStore.memory_bytes`` ile
+  tahmin edilen sohbet başına bellek,
+- ``contents()`` süresi,
+- konuşma uzadıkça istemin tahmini token sayısı (bütçede düz kalmalı).
+
+Kullanım:
+    python benchmarks/bench_conversation.py [--chats 2000] [--turns 40] [--max-tokens 600]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from conversation import ConversationStore, MODEL, USER  # noqa: E402
+
+WORDS = ("bu akşam maç var mı yarın toplantı kitap film müzik oyun kahve çay hava güzel "
+         "nasıl neden evet hayır belki tamam arkadaşlar selam herkese teşekkürler").split()
+
+
+def sentence(rng, low: int, high: int) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < rng.randint(low, high):
+        words.append(rng.choice(WORDS))
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--max-turns", type=int, default=20)
+    parser.add_argument("--max-tokens", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = time.time()
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    store = ConversationStore(max_turns=args.max_turns, max_tokens=args.max_tokens, max_chats=args.chats)
+    for turn in range(args.turns):
+        role = USER if turn % 2 == 0 else MODEL
+        for chat_id in range(args.chats):
+            text = sentence(rng, 20, 200)
+            store.add(chat_id, role, f"Ali: {text}" if role == USER else text, now)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    traced = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    stats = store.stats()
+    print(f"{stats['chats']} chats, {stats['turns']} turns resident")
+    print(f"memory/chat: tracemalloc={traced / args.chats:.0f}B estimate={stats['bytes_per_chat']}B")
+
+    started = time.perf_counter()
+    for chat_id in range(args.chats):
+        store.contents(chat_id, now)
+    print(f"contents(): {(time.perf_counter() - started) / args.chats * 1e6:.1f}us/call")
+
+    probe = ConversationStore(max_turns=args.max_turns, max_tokens=args.max_tokens)
+    sizes = []
+    for turn in range(1, args.turns + 1):
+        probe.add(0, USER if turn % 2 else MODEL, sentence(rng, 20, 200), now)
+        if turn % 2:
+            sizes.append((turn, probe.prompt_tokens(probe.contents(0, now))))
+    print("prompt tokens by turn: " + " ".join(f"{turn}:{tokens}" for turn, tokens in sizes[::max(1, len(sizes) // 10)]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Uçtan uca yük testi: gerçek bot kodu, sahte Telegram ve sahte Gemini.
+
+Bot, ``build_application`` ile kurulur ve TELEGRAM_BASE_URL üzerinden
+fake_telegram sunucusuna bağlanır; ``bot.model`` fake_gemini.FakeModel
+ile değiştirilir. DB her senaryo için geçici bir dizinde sıfırdan açılır.
+Senaryolar:
+
+- drip: N abone aynı anda due; outbox dispatcher'ın teslim hızı
+- broadcast: N aboneye kampanya
+- storm: özel sohbet ve gruplardan eşzamanlı mesaj yağmuru (AI yanıtları)
+
+Raporlanan değerler: saniyedeki teslimat, gönderim çağrısı ya da update
+işleme gecikmesi (p50/p95/p99), SQLite yazma ifadesi ve commit sayıları,
+event loop gecikmesi (p99/max), sahte sunucunun yanıt sayıları.
+
+Her senaryo ayrı bir süreçte koşar (bot modülü global durum tutar).
+
+Kullanım:
+    python benchmarks/bench_e2e.py [--scenario all|drip|broadcast|storm] [--users 300]
+        [--retry-after-rate 0.01] [--forbidden-every 50] [--timeout-rate 0.0]
+        [--gemini-ms 800] [--gemini-error-rate 0.05]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+from fake_telegram import FakeTelegram  # noqa: E402
+from fake_gemini import FakeModel  # noqa: E402
+
+SCENARIOS = ("drip", "broadcast", "storm")
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def latency_line(values):
+    return (f"n={len(values)} p50={percentile(values, 50) * 1000:.1f}ms "
+            f"p95={percentile(values, 95) * 1000:.1f}ms p99={percentile(values, 99) * 1000:.1f}ms")
+
+
+async def lag_monitor(samples, interval: float = 0.01):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - started - interval)
+
+
+def fake_update(update_id: int, chat_id: int, user_id: int, text: str) -> dict:
+    name = f"U{user_id}"
+    chat = {"id": chat_id, "type": "private", "first_name": name} if chat_id > 0 else \
+        {"id": chat_id, "type": "supergroup", "title": "Grup"}
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()), "chat": chat, "text": text,
+        "from": {"id": user_id, "is_bot": False, "first_name": name},
+    }}
+
+
+async def wait_until(predicate, timeout: float, step: float = 0.1) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if await predicate():
+            return True
+        await asyncio.sleep(step)
+    return False
+
+
+async def run_scenario(name: str, args, server: FakeTelegram) -> dict:
+    import bot
+    import db
+    from telegram import Update
+
+    bot.model = FakeModel(
+        latency_ms=args.gemini_ms, error_rate=args.gemini_error_rate, seed=args.seed,
+    )
+
+    writes = Counter()
+
+    def trace(statement: str):
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        if verb in ("INSERT", "UPDATE", "DELETE", "REPLACE", "COMMIT"):
+            writes[verb] += 1
+
+    connect = db._connect
+
+    def traced_connect():
+        conn = connect()
+        conn.set_trace_callback(trace)
+        return conn
+    db._connect = traced_connect
+
+    send_latency = []
+    outcomes = Counter()
+    send_once = bot.send_message_once
+
+    async def timed_send_once(app, chat_id, text, priority=bot.BULK):
+        started = time.perf_counter()
+        result = await send_once(app, chat_id, text, priority)
+        send_latency.append(time.perf_counter() - started)
+        outcomes[result[0]] += 1
+        return result
+    bot.send_message_once = timed_send_once
+
+    # Kuyruğa konduğu andan handler bitene kadar
+    update_latency = []
+    queued_at = {}
+    process = bot.update_processor.do_process_update
+
+    async def timed_process(update, coroutine):
+        try:
+            await process(update, coroutine)
+        finally:
+            started = queued_at.pop(update.update_id, None)
+            if started is not None:
+                update_latency.append(time.perf_counter() - started)
+    bot.update_processor.do_process_update = timed_process
+
+    # Tohum verisi; zamanlayıcı on_startup'ta yüklenir
+    db.init_db()
+    far = int(time.time()) + 10 * 86400
+    due = 0 if name == "drip" else far
+    conn = db.get_conn()
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (chat_id, username, first_name, last_name, opted_out, next_due_ts) "
+            "VALUES (?, 'u', 'U', '', 0, ?)",
+            [(chat_id, due) for chat_id in range(1, args.users + 1)],
+        )
+        conn.executemany(
+            "INSERT INTO groups (chat_id, title, active, next_due_ts) VALUES (?, 'Grup', 1, ?)",
+            [(-1000 - i, far) for i in range(args.groups)],
+        )
+    writes.clear()
+
+    app = bot.build_application()
+    lag = []
+    await app.initialize()
+    await app.start()
+    await bot.on_startup(app)
+    monitor = asyncio.create_task(lag_monitor(lag))
+    started = time.monotonic()
+    result = {"scenario": name}
+
+    try:
+        if name == "drip":
+            expected = args.users - (args.users // args.forbidden_every if args.forbidden_every else 0)
+
+            async def drained():
+                return server.delivered_count() >= expected
+            done = await wait_until(drained, args.timeout)
+            result["delivered"] = server.delivered_count()
+            result["complete"] = done
+
+        elif name == "broadcast":
+            campaign_id = await bot.create_campaign("📣 <b>Duyuru</b>", "all", 0)
+            bot.campaigns.wake() if bot.campaigns else None
+
+            async def finished():
+                row = await bot.get_campaign(campaign_id)
+                return row["status"] == "done"
+            done = await wait_until(finished, args.timeout)
+            row = await bot.get_campaign(campaign_id)
+            result.update(delivered=row["sent"], failed=row["failed"], total=row["total"], complete=done)
+
+        else:
+            # Metinler sohbete özgü: AI önbelleği yükü gizlemesin
+            updates = []
+            update_id = 0
+            for round_ in range(args.storm_rounds):
+                for user_id in range(1, min(args.users, args.storm_chats) + 1):
+                    update_id += 1
+                    updates.append(fake_update(update_id, user_id, user_id, f"Merhaba, bugün nasılsın? ({user_id}/{round_})"))
+                for i in range(args.groups):
+                    update_id += 1
+                    updates.append(fake_update(update_id, -1000 - i, 5000 + update_id,
+                                               f"Bu akşam maç var mı sizce? ({i}/{round_})"))
+            for data in updates:
+                update = Update.de_json(data, app.bot)
+                queued_at[update.update_id] = time.perf_counter()
+                await app.update_queue.put(update)
+
+            async def processed():
+                return len(update_latency) >= len(updates)
+            done = await wait_until(processed, args.timeout)
+            result.update(updates=len(updates), processed=len(update_latency), complete=done,
+                          gemini_calls=bot.model.calls, gemini_errors=bot.model.errors,
+                          delivered=server.delivered_count())
+
+        elapsed = time.monotonic() - started
+        result["elapsed_s"] = round(elapsed, 2)
+        result["msgs_per_s"] = round(server.delivered_count() / elapsed, 1) if elapsed else 0.0
+    finally:
+        monitor.cancel()
+        await app.stop()
+        await bot.on_stop(app)
+        await app.shutdown()
+        await bot.on_shutdown(app)
+
+    result["send_latency"] = latency_line(send_latency)
+    if update_latency:
+        result["update_latency"] = latency_line(update_latency)
+    result["send_outcomes"] = dict(outcomes)
+    result["db_writes"] = dict(writes)
+    result["loop_lag"] = f"p99={percentile(lag, 99) * 1000:.1f}ms max={max(lag, default=0) * 1000:.1f}ms"
+    result["server"] = dict(server.counts)
+    return result
+
+
+def child(args):
+    server = FakeTelegram(
+        latency_ms=args.telegram_ms, global_per_second=args.global_per_second,
+        retry_after_rate=args.retry_after_rate, forbidden_every=args.forbidden_every,
+        timeout_rate=args.timeout_rate, seed=args.seed,
+    ).start()
+    workdir = tempfile.mkdtemp(prefix="bench-e2e-")
+    os.chdir(workdir)
+    os.environ.update({
+        "BOT_TOKEN": "123456:fake",
+        "GEMINI_API_KEY": "fake",
+        "TELEGRAM_BASE_URL": server.base_url,
+        "PER_MINUTE_LIMIT": str(args.per_minute_limit),
+        "GLOBAL_PER_SECOND_LIMIT": str(args.global_per_second),
+        "AI_RESPONSE_CHANCE": "1",
+        "MIN_MESSAGE_LENGTH": "1",
+        "RESPONSE_COOLDOWN": "0",
+        "AI_CACHE_PERSIST": "0",
+        "OUTBOX_BASE_BACKOFF_S": "1",
+        "RATE_STATS_INTERVAL": "3600",
+    })
+    import logging
+    logging.disable(logging.WARNING if args.quiet else logging.NOTSET)
+    try:
+        result = asyncio.run(run_scenario(args.scenario, args, server))
+    finally:
+        server.stop()
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", choices=("all",) + SCENARIOS, default="all")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--storm-chats", type=int, default=50)
+    parser.add_argument("--storm-rounds", type=int, default=2)
+    parser.add_argument("--telegram-ms", type=float, default=30)
+    parser.add_argument("--global-per-second", type=float, default=30)
+    parser.add_argument("--per-minute-limit", type=float, default=1800)
+    parser.add_argument("--retry-after-rate", type=float, default=0.01)
+    parser.add_argument("--forbidden-every", type=int, default=50)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-ms", type=float, default=800)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--quiet", action="store_true", default=True)
+    parser.add_argument("--verbose", dest="quiet", action="store_false")
+    args = parser.parse_args()
+
+    if args.scenario != "all":
+        child(args)
+        return
+
+    argv = [a for a in sys.argv[1:] if not a.startswith("--scenario")]
+    for name in SCENARIOS:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--scenario", name] + argv,
+            capture_output=True, text=True,
+        )
+        lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+        if out.returncode or not lines:
+            print(f"\n== {name} == failed\n{out.stderr[-2000:]}")
+            continue
+        result = json.loads(lines[-1])
+        print(f"\n== {name} ==")
+        for key, value in result.items():
+            if key != "scenario":
+                print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
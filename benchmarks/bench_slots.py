@@ -0,0 +1,112 @@
+"""next_due_ts ataması: rastgele (random.uniform) ve SlotPlanner karşılaştırması.
+
+Simülasyon Telegram ya da DB gerektirmez. Kısa bir sürede gelen kayıt
+dalgası (viral /start) ve sabit hızlı kayıtlar üretilir; her abone due
+olduğunda "gönderilir" ve sıradaki zamanı seçilen yöntemle atanır.
+Isınma süresinden sonra gönderimler dakikalık kovalarda sayılır ve şunlar
+raporlanır:
+
+- peak/mean: en yoğun dakikanın ortalamaya oranı
+- over_limit: PER_MINUTE_LIMIT'i aşan dakika sayısı (bu dakikalardaki
+  gönderimler gecikir)
+- backlog_max: limitle gönderilseydi biriken en büyük kuyruk
+
+Kullanım: python benchmarks/bench_slots.py [--spike 20000] [--days 14]
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from slots import SlotPlanner  # noqa: E402
+
+DAY = 86400
+
+
+def signups(spike: int, spike_s: float, steady_per_day: float, days: float, rng):
+    """Kayıt zamanları: t=0'da spike_s süren dalga + sabit akış."""
+    times = [rng.uniform(0, spike_s) for _ in range(spike)]
+    t = 0.0
+    while True:
+        t += rng.expovariate(steady_per_day / DAY)
+        if t >= days * DAY:
+            break
+        times.append(t)
+    times.sort()
+    return times
+
+
+def simulate(next_due, start_times, days: float, warmup_days: float):
+    """Her abone due olduğunda gönderilir; dakikalık gönderim sayıları."""
+    # /start'tan sonra ilk mesaj hemen gider (next_due_ts=0)
+    heap = [(t, i) for i, t in enumerate(start_times)]
+    heapq.heapify(heap)
+    end = days * DAY
+    per_minute = {}
+    while heap:
+        t, i = heapq.heappop(heap)
+        if t >= end:
+            break
+        if t >= warmup_days * DAY:
+            minute = int(t // 60)
+            per_minute[minute] = per_minute.get(minute, 0) + 1
+        heapq.heappush(heap, (next_due(int(t)), i))
+    first, last = int(warmup_days * DAY // 60), int(end // 60)
+    return [per_minute.get(m, 0) for m in range(first, last)]
+
+
+def summarize(counts, limit: float):
+    mean = sum(counts) / len(counts)
+    backlog = backlog_max = 0.0
+    for sends in counts:
+        backlog = max(0.0, backlog + sends - limit)
+        backlog_max = max(backlog_max, backlog)
+    return {
+        "peak": max(counts),
+        "mean": round(mean, 2),
+        "peak_to_mean": round(max(counts) / mean, 2) if mean else 0.0,
+        "over_limit": sum(1 for c in counts if c > limit),
+        "backlog_max": int(backlog_max),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spike", type=int, default=20000, help="dalgadaki kayıt sayısı")
+    parser.add_argument("--spike-minutes", type=float, default=60)
+    parser.add_argument("--steady-per-day", type=float, default=2000)
+    parser.add_argument("--days", type=float, default=14)
+    parser.add_argument("--warmup-days", type=float, default=3)
+    parser.add_argument("--min-days", type=float, default=2)
+    parser.add_argument("--max-days", type=float, default=3)
+    parser.add_argument("--slot-s", type=int, default=600)
+    parser.add_argument("--per-minute-limit", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    starts = signups(args.spike, args.spike_minutes * 60, args.steady_per_day, args.days, rng)
+    print(f"{len(starts)} subscribers, {args.days} days simulated, window "
+          f"[{args.min_days}, {args.max_days}] days, limit {args.per_minute_limit}/min")
+
+    def uniform(now, r=random.Random(args.seed)):
+        return now + int(r.uniform(args.min_days, args.max_days) * DAY)
+
+    planner = SlotPlanner(args.slot_s, int(args.max_days * DAY) + args.slot_s, rng=random.Random(args.seed))
+
+    def planned(now):
+        return planner.assign(now, args.min_days * DAY, args.max_days * DAY)
+
+    for name, next_due in (("random.uniform", uniform), (f"SlotPlanner({args.slot_s}s)", planned)):
+        started = time.perf_counter()
+        counts = simulate(next_due, starts, args.days, args.warmup_days)
+        elapsed = time.perf_counter() - started
+        print(f"  {name:22s} {summarize(counts, args.per_minute_limit)}  ({elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Soğuk başlangıç ölçümü: import süreleri ve ilk yanıta kadar geçen süre.
+
+İki adım, her biri temiz bir süreçte:
+
+1. ``python -X importtime -c "import bot"``: modül bazında import
+   süreleri. En pahalı ``--top`` modül (kümülatif) ve toplam raporlanır.
+2. Polling kipinde gerçek açılış: fake_telegram'a bir /start update'i
+   konur, bot ``build_application().run_polling()`` ile başlatılır.
+   Süreç başlangıcından (spawn) ilk ``sendMessage``'a kadar geçen süre ve
+   ``startup.phases()`` (imports, module, app_built, ready, first_update,
+   ai_ready) raporlanır.
+
+``--json`` sonucu tek satır JSON olarak yazar; sürümler arasında
+karşılaştırmak için saklanabilir.
+
+Kullanım:
+    python benchmarks/bench_startup.py [--top 15] [--runs 3] [--no-preload] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def bot_env(extra: dict = None) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "BOT_TOKEN": "123456:fake",
+        "GEMINI_API_KEY": "fake",
+        "PYTHONPATH": ROOT,
+        "METRICS_PORT": "0",
+        "WEBHOOK_URL": "",
+        "AI_CACHE_PERSIST": "0",
+        "CATALOG_PATH": os.path.join(ROOT, "messages.json"),
+    })
+    env.update(extra or {})
+    return env
+
+
+def import_times(workdir: str):
+    """``-X importtime`` çıktısı: [(modül, self_us, kümülatif_us, derinlik)]."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import bot"],
+        cwd=workdir, env=bot_env(), capture_output=True, text=True,
+    )
+    if out.returncode:
+        raise RuntimeError(f"import bot failed:\n{out.stderr[-2000:]}")
+    rows = []
+    for line in out.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            rows.append((name, int(own), int(cumulative), len(indent) // 2))
+    return rows
+
+
+def first_reply(workdir: str, preload: bool) -> dict:
+    spawned = time.time()
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        cwd=workdir, capture_output=True, text=True,
+        env=bot_env({"BENCH_SPAWN_TS": repr(spawned), "AI_PRELOAD": "1" if preload else "0"}),
+    )
+    lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+    if out.returncode or not lines:
+        raise RuntimeError(f"startup run failed:\n{out.stderr[-2000:]}")
+    return json.loads(lines[-1])
+
+
+def child():
+    """Botu polling kipinde başlatır, ilk yanıttan sonra durdurur."""
+    spawned = float(os.environ["BENCH_SPAWN_TS"])
+    interpreter = time.time() - spawned
+    sys.path.insert(0, HERE)
+    from fake_telegram import FakeTelegram
+
+    server = FakeTelegram(latency_ms=5).start()
+    os.environ["TELEGRAM_BASE_URL"] = server.base_url
+    server.push_update({"update_id": 1, "message": {
+        "message_id": 1, "date": int(time.time()), "text": "/start",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        "chat": {"id": 42, "type": "private", "first_name": "U42"},
+        "from": {"id": 42, "is_bot": False, "first_name": "U42", "language_code": "tr"},
+    }})
+
+    import logging
+    logging.disable(logging.WARNING)
+    import bot
+    import startup
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    app = bot.build_application()
+    result = {}
+
+    def watch():
+        while server.delivered_count() < 1:
+            time.sleep(0.002)
+        result["first_reply_s"] = time.time() - spawned
+        # AI modeli arka planda yükleniyorsa onu da bekle (en fazla 10 sn)
+        deadline = time.monotonic() + 10
+        while bot.AI_PRELOAD and "ai_ready" not in startup.phases() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        loop.call_soon_threadsafe(app.stop_running)
+    threading.Thread(target=watch, daemon=True).start()
+
+    try:
+        app.run_polling(close_loop=False)
+    finally:
+        server.stop()
+    result["interpreter_s"] = interpreter
+    result["phases"] = startup.phases()
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--no-preload", dest="preload", action="store_false")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    rows = import_times(workdir)
+    total = next((cumulative for name, _, cumulative, _ in rows if name == "bot"), 0)
+    top = sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]
+
+    runs = []
+    for i in range(args.runs):
+        rundir = os.path.join(workdir, f"run{i}")
+        os.mkdir(rundir)
+        runs.append(first_reply(rundir, args.preload))
+    first = [run["first_reply_s"] for run in runs]
+    phases = {
+        phase: round(statistics.median(run["phases"][phase] for run in runs if phase in run["phases"]), 4)
+        for phase in runs[-1]["phases"]
+    }
+    result = {
+        "python": sys.version.split()[0],
+        "preload": args.preload,
+        "import_bot_s": round(total / 1e6, 4),
+        "genai_imported": any(name.startswith("google.generativeai") for name, *_ in rows),
+        "top_imports": [(name, round(cumulative / 1e6, 4)) for name, _, cumulative, _ in top],
+        "first_reply_s": round(statistics.median(first), 4),
+        "first_reply_max_s": round(max(first), 4),
+        "interpreter_s": round(statistics.median(run["interpreter_s"] for run in runs), 4),
+        "phases": phases,
+    }
+
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"import bot: {result['import_bot_s'] * 1000:.0f}ms "
+          f"(google.generativeai imported: {result['genai_imported']})")
+    print(f"top {args.top} imports by cumulative time:")
+    for name, seconds in result["top_imports"]:
+        print(f"  {seconds * 1000:8.1f}ms  {name}")
+    print(f"spawn -> first reply: median={result['first_reply_s'] * 1000:.0f}ms "
+          f"max={result['first_reply_max_s'] * 1000:.0f}ms over {args.runs} runs "
+          f"(interpreter {result['interpreter_s'] * 1000:.0f}ms)")
+    print("phases since `import startup`: " + " ".join(
+        f"{phase}={seconds * 1000:.0f}ms" for phase, seconds in phases.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Karışık yük altında update işleme gecikmesi (p50/p95/p99).
+
+Varsayılan sıralı işlemeyi (PTB SimpleUpdateProcessor, concurrency=1)
+PerChatUpdateProcessor ile karşılaştırır. Ağ ya da Telegram gerekmez;
+handler'lar asyncio.sleep ile taklit edilir:
+
+- komut: özel sohbetlerde hızlı handler (/start, /status gibi)
+- ai: özel sohbetlerde yavaş Gemini yanıtı
+- flood: tek bir gruptan sürekli mesaj
+
+Kullanım: python benchmarks/bench_updates.py [--duration 5] [--concurrency 16]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from telegram.ext import SimpleUpdateProcessor  # noqa: E402
+
+from update_processor import PerChatUpdateProcessor  # noqa: E402
+
+
+class FakeChat:
+    __slots__ = ("id",)
+
+    def __init__(self, chat_id):
+        self.id = chat_id
+
+
+class FakeUpdate:
+    __slots__ = ("effective_chat", "kind", "cost", "arrived", "seq")
+
+    def __init__(self, chat_id, kind, cost, seq):
+        self.effective_chat = FakeChat(chat_id)
+        self.kind = kind
+        self.cost = cost
+        self.seq = seq
+        self.arrived = 0.0
+
+
+def workload(duration: float, seed: int = 1):
+    """(varış_saniyesi, update) listesi üret."""
+    rng = random.Random(seed)
+    streams = (
+        # tür, saniyedeki update, sohbet id'leri, handler süresi
+        ("command", 20.0, lambda: rng.randint(1, 500), lambda: 0.005),
+        ("ai", 3.0, lambda: rng.randint(1000, 1100), lambda: rng.uniform(0.4, 1.5)),
+        ("flood", 30.0, lambda: -100, lambda: 0.15),
+    )
+    events = []
+    seq = 0
+    for kind, rate, chat, cost in streams:
+        t = 0.0
+        while True:
+            t += rng.expovariate(rate)
+            if t >= duration:
+                break
+            seq += 1
+            events.append((t, FakeUpdate(chat(), kind, cost(), seq)))
+    events.sort(key=lambda e: e[0])
+    return events
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+async def run(processor, events, drain_timeout: float):
+    latencies = {}
+    order_violations = 0
+    last_seq = {}
+
+    async def handle(update):
+        nonlocal order_violations
+        chat_id = update.effective_chat.id
+        if last_seq.get(chat_id, 0) > update.seq:
+            order_violations += 1
+        last_seq[chat_id] = update.seq
+        await asyncio.sleep(update.cost)
+        latencies.setdefault(update.kind, []).append(time.perf_counter() - update.arrived)
+
+    queue = asyncio.Queue()
+    tasks = set()
+
+    async def fetcher():
+        # Application._update_fetcher'ın davranışı
+        while True:
+            update = await queue.get()
+            coroutine = handle(update)
+            if processor.max_concurrent_updates > 1:
+                task = asyncio.create_task(processor.process_update(update, coroutine))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            else:
+                await processor.process_update(update, coroutine)
+            queue.task_done()
+
+    fetch_task = asyncio.create_task(fetcher())
+    start = time.perf_counter()
+    for at, update in events:
+        delay = start + at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        update.arrived = time.perf_counter()
+        queue.put_nowait(update)
+
+    try:
+        await asyncio.wait_for(queue.join(), drain_timeout)
+        if tasks:
+            await asyncio.wait(set(tasks), timeout=drain_timeout)
+    except asyncio.TimeoutError:
+        pass
+    fetch_task.cancel()
+    for task in tasks:
+        task.cancel()
+    unfinished = len(events) - sum(len(v) for v in latencies.values())
+    return latencies, unfinished, order_violations
+
+
+def report(name, latencies, unfinished, order_violations, extra=""):
+    print(f"\n== {name} ==")
+    for kind in ("command", "ai", "flood"):
+        values = latencies.get(kind, [])
+        print(
+            f"  {kind:8s} n={len(values):5d}  p50={percentile(values, 50) * 1000:8.1f}ms"
+            f"  p95={percentile(values, 95) * 1000:8.1f}ms  p99={percentile(values, 99) * 1000:8.1f}ms"
+        )
+    print(f"  unfinished/dropped={unfinished}  order_violations={order_violations} {extra}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--per-chat-limit", type=int, default=20)
+    parser.add_argument("--drain-timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    events = workload(args.duration)
+    print(f"{len(events)} updates over {args.duration}s")
+
+    sequential = SimpleUpdateProcessor(1)
+    report("sequential (default)", *await run(sequential, workload(args.duration), args.drain_timeout))
+
+    per_chat = PerChatUpdateProcessor(concurrency=args.concurrency, per_chat_limit=args.per_chat_limit)
+    result = await run(per_chat, workload(args.duration), args.drain_timeout)
+    report(f"per-chat concurrency={args.concurrency}", *result, extra=str(per_chat.stats()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
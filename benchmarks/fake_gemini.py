@@ -0,0 +1,59 @@
+"""genai.GenerativeModel yerine kullanılan sahte model.
+
+``generate_content`` gerçek istemci gibi bloklar (thread'de çalışır);
+gecikme log-normal dağılımdan, hatalar ``error_rate`` olasılıkla gelir.
+``stream=True`` ile ilk parça ``latency`` sonra, kalanlar ``chunk_ms``
+aralıklarla üretilir.
+"""
+import random
+import threading
+import time
+
+
+class FakeResponse:
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    def __init__(self, latency_ms: float = 800.0, sigma: float = 0.5, error_rate: float = 0.0,
+                 chunk_ms: float = 120.0, chunks: int = 4, seed: int = 1):
+        self.latency = latency_ms / 1000.0
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.chunk = chunk_ms / 1000.0
+        self.chunks = chunks
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def _roll(self):
+        with self._lock:
+            self.calls += 1
+            delay = self._rng.lognormvariate(0, self.sigma) * self.latency
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        return delay, failed
+
+    def generate_content(self, prompt, stream: bool = False, **kwargs):
+        delay, failed = self._roll()
+        text = f"Sahte yanıt ({len(str(prompt))} karakterlik isteme) 🙂"
+        if not stream:
+            time.sleep(delay)
+            if failed:
+                raise RuntimeError("503 fake Gemini error")
+            return FakeResponse(text)
+        return self._stream(text, delay, failed)
+
+    def _stream(self, text: str, delay: float, failed: bool):
+        time.sleep(delay)
+        if failed:
+            raise RuntimeError("503 fake Gemini error")
+        step = max(1, len(text) // self.chunks)
+        for start in range(0, len(text), step):
+            yield FakeResponse(text[start:start + step])
+            time.sleep(self.chunk)
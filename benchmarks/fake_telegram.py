@@ -0,0 +1,236 @@
+"""Yerel, sahte Telegram Bot API sunucusu.
+
+Bot ``base_url`` ile buraya yönlendirilir (TELEGRAM_BASE_URL=
+http://127.0.0.1:<port>/bot). Sadece botun kullandığı metotlar vardır:
+getMe, sendMessage, editMessageText, getUpdates, deleteWebhook/setWebhook
+ve benzerleri. Gerçek servisteki limitler uygulanır, aşılırsa 429 +
+retry_after döner:
+
+- global: saniyede ``global_per_second`` mesaj
+- özel sohbet: sohbet başına saniyede 1
+- grup: grup başına dakikada 20
+
+Hata enjeksiyonu: ``retry_after_rate`` (rastgele 429), ``forbidden_every``
+(chat_id'si bu sayıya bölünen sohbetler botu engellemiş sayılır, 403) ve
+``timeout_rate`` (yanıt ``timeout_delay`` saniye geciktirilir; PTB'nin
+okuma süresi aşılır).
+
+``push_update`` ile eklenen update'ler getUpdates'te ``offset``'e göre
+verilir; bot polling kipinde de sürülebilir.
+
+Sunucu kendi thread'inde ve event loop'unda çalışır; botun event loop
+gecikmesi ölçümlerine karışmaz. Kullanım::
+
+    server = FakeTelegram(latency_ms=30).start()
+    ...  # http://127.0.0.1:{server.port}/bot
+    server.stop()
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from urllib.parse import parse_qs
+
+
+class FakeTelegram:
+    def __init__(self, latency_ms: float = 30.0, global_per_second: float = 30.0,
+                 private_per_second: float = 1.0, group_per_minute: int = 20,
+                 retry_after_rate: float = 0.0, retry_after_s: int = 1,
+                 forbidden_every: int = 0, timeout_rate: float = 0.0,
+                 timeout_delay: float = 6.0, seed: int = 1):
+        self.latency = latency_ms / 1000.0
+        self.global_per_second = global_per_second
+        self.private_interval = 1.0 / private_per_second
+        self.group_per_minute = group_per_minute
+        self.retry_after_rate = retry_after_rate
+        self.retry_after_s = retry_after_s
+        self.forbidden_every = forbidden_every
+        self.timeout_rate = timeout_rate
+        self.timeout_delay = timeout_delay
+        self._rng = random.Random(seed)
+        self._global = deque()
+        self._private = {}
+        self._groups = {}
+        self._message_id = 0
+        self._lock = threading.Lock()
+        self.counts = Counter()
+        # (monotonic, chat_id, text) başarılı her sendMessage için
+        self.delivered = []
+        # getUpdates ile verilecek update'ler (push_update)
+        self._updates = []
+        self.port = None
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    # -- yaşam döngüsü -----------------------------------------------------
+    def start(self, port: int = 0):
+        self._thread = threading.Thread(target=self._serve, args=(port,), name="fake-telegram", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _serve(self, port: int):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", port)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    def stop(self):
+        if self._loop is None:
+            return
+        def _close():
+            self._server.close()
+            self._loop.stop()
+        self._loop.call_soon_threadsafe(_close)
+        self._thread.join(timeout=5)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    def delivered_count(self) -> int:
+        with self._lock:
+            return len(self.delivered)
+
+    def push_update(self, update: dict):
+        """Bir sonraki getUpdates yanıtına eklenecek update."""
+        with self._lock:
+            self._updates.append(update)
+
+    # -- HTTP --------------------------------------------------------------
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0") or 0))
+                status, payload = await self._dispatch(path, headers.get("content-type", ""), body)
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\nConnection: keep-alive\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _params(content_type: str, body: bytes) -> dict:
+        if not body:
+            return {}
+        if "json" in content_type:
+            return json.loads(body)
+        params = {}
+        for key, values in parse_qs(body.decode("utf-8"), keep_blank_values=True).items():
+            value = values[0]
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+        return params
+
+    async def _dispatch(self, path: str, content_type: str, body: bytes):
+        method = path.rsplit("/", 1)[-1]
+        params = self._params(content_type, body)
+        self.counts[method] += 1
+        await asyncio.sleep(self._rng.lognormvariate(0, 0.3) * self.latency)
+
+        if method == "getMe":
+            return 200, {"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot",
+                "can_join_groups": True, "can_read_all_group_messages": True,
+                "supports_inline_queries": False,
+            }}
+        if method == "getUpdates":
+            offset = int(params.get("offset", 0) or 0)
+            with self._lock:
+                self._updates = [u for u in self._updates if u["update_id"] >= offset]
+                pending = list(self._updates)
+            if not pending:
+                await asyncio.sleep(min(float(params.get("timeout", 0) or 0), 1.0))
+            return 200, {"ok": True, "result": pending}
+        if method not in ("sendMessage", "editMessageText"):
+            return 200, {"ok": True, "result": True}
+
+        chat_id = int(params.get("chat_id", 0))
+        error = self._fault(chat_id)
+        if error is None:
+            error = self._limit(chat_id, time.monotonic())
+        if error is not None:
+            if error == "timeout":
+                self.counts["timeout"] += 1
+                await asyncio.sleep(self.timeout_delay)
+                return 200, {"ok": True, "result": True}
+            status, payload = error
+            self.counts[status] += 1
+            return status, payload
+
+        self.counts["ok"] += 1
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+            if method == "sendMessage":
+                self.delivered.append((time.monotonic(), chat_id, params.get("text", "")))
+        return 200, {"ok": True, "result": {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup", "title": "g"},
+            "text": params.get("text", ""),
+        }}
+
+    def _fault(self, chat_id: int):
+        if self.forbidden_every and chat_id % self.forbidden_every == 0:
+            return 403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+        roll = self._rng.random()
+        if roll < self.retry_after_rate:
+            return self._retry_after(self.retry_after_s)
+        if roll < self.retry_after_rate + self.timeout_rate:
+            return "timeout"
+        return None
+
+    @staticmethod
+    def _retry_after(seconds: int):
+        return 429, {
+            "ok": False, "error_code": 429,
+            "description": f"Too Many Requests: retry after {seconds}",
+            "parameters": {"retry_after": seconds},
+        }
+
+    def _limit(self, chat_id: int, now: float):
+        while self._global and now - self._global[0] > 1.0:
+            self._global.popleft()
+        if len(self._global) >= self.global_per_second:
+            return self._retry_after(1)
+        if chat_id < 0:
+            sent = self._groups.setdefault(chat_id, deque())
+            while sent and now - sent[0] > 60.0:
+                sent.popleft()
+            if len(sent) >= self.group_per_minute:
+                return self._retry_after(int(60 - (now - sent[0])) + 1)
+            sent.append(now)
+        else:
+            last = self._private.get(chat_id)
+            if last is not None and now - last < self.private_interval:
+                return self._retry_after(1)
+            self._private[chat_id] = now
+        self._global.append(now)
+        return None
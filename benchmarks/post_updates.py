@@ -0,0 +1,104 @@
+"""Webhook'a kayıtlı (ya da üretilmiş) update'leri POST eder.
+
+Dosya, satır başına bir update JSON'u (JSONL) ya da bir JSON dizisi
+olabilir; verilmezse ``--count`` kadar özel sohbet mesajı üretilir.
+Yanıt süreleri (p50/p95/p99) ve durum kodları raporlanır; 200 dışında
+bir kod hata sayılır.
+
+Kullanım:
+    python benchmarks/post_updates.py --url http://127.0.0.1:8443/telegram \\
+        --secret "$WEBHOOK_SECRET" [--file updates.jsonl] [--count 500] [--concurrency 20]
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from urllib.parse import urlparse
+
+
+def load_updates(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def synthetic_updates(count: int, chats: int, start_id: int = 1):
+    now = int(time.time())
+    return [{
+        "update_id": start_id + i,
+        "message": {
+            "message_id": start_id + i, "date": now,
+            "chat": {"id": 1 + i % chats, "type": "private", "first_name": f"U{1 + i % chats}"},
+            "from": {"id": 1 + i % chats, "is_bot": False, "first_name": f"U{1 + i % chats}"},
+            "text": f"Merhaba, bugün hava nasıl? #{i}",
+        },
+    } for i in range(count)]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))] if values else float("nan")
+
+
+async def post_all(url: str, secret: str, updates, concurrency: int):
+    parsed = urlparse(url)
+    queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(json.dumps(update).encode("utf-8"))
+    latencies = []
+    statuses = Counter()
+
+    async def client():
+        reader, writer = await asyncio.open_connection(parsed.hostname, parsed.port or 80)
+        try:
+            while not queue.empty():
+                body = queue.get_nowait()
+                started = time.perf_counter()
+                writer.write(
+                    f"POST {parsed.path or '/'} HTTP/1.1\r\nHost: {parsed.netloc}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                    f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n\r\n".encode("latin-1") + body
+                )
+                await writer.drain()
+                status = int((await reader.readline()).split()[1])
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                await reader.readexactly(length)
+                latencies.append(time.perf_counter() - started)
+                statuses[status] += 1
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", required=True)
+    parser.add_argument("--file")
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    updates = load_updates(args.file) if args.file else synthetic_updates(args.count, args.chats)
+    latencies, statuses, elapsed = asyncio.run(post_all(args.url, args.secret, updates, args.concurrency))
+    print(f"{len(latencies)} requests in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} req/s), "
+          f"status={dict(statuses)}")
+    print(f"latency p50={percentile(latencies, 50) * 1000:.2f}ms p95={percentile(latencies, 95) * 1000:.2f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
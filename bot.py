@@ -1,19 +1,21 @@
+import startup  # ilk import: başlangıç süreleri buradan ölçülür
 import asyncio
-import json
+import functools
+import html
 import os
 import random
 import time
 import logging
+import socket
+import threading
 from datetime import datetime, timezone
+from urllib.parse import urlparse
 from telegram.ext import ContextTypes, MessageHandler, filters
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.constants import ParseMode
 from telegram.error import RetryAfter, TimedOut, NetworkError, Forbidden, BadRequest
 from telegram.ext import Application, CommandHandler, ContextTypes
-import google.generativeai as genai
-
-import pytz
 
 # Logging ayarları
 logging.basicConfig(
@@ -22,11 +24,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-from db import (
-    init_db,
-    upsert_user, set_optout, get_user, due_users, mark_sent,
-    upsert_group, set_group_active, due_groups, mark_group_sent
+from async_db import (
+    init_db, close_db,
+    upsert_user, set_optout, get_user, active_users_by_ids, user_schedule,
+    claim_users, release_users,
+    upsert_group, set_group_active, active_groups_by_ids, group_schedule,
+    claim_groups, release_groups,
+    enqueue_drips, enqueue_outbox, claim_outbox, settle_outbox, release_outbox,
+    prune_outbox, outbox_counts,
+    create_campaign, get_campaign, recent_campaigns, claim_campaign, checkpoint_campaign,
+    final_checkpoint_campaign, finish_campaign, set_campaign_status, release_campaigns,
+    campaign_recipients,
+    get_chat, set_chat_timezone, set_quiet_hours, quiet_settings, update_quiet_masks,
+    get_cached_response, put_cached_response, prune_cached_responses,
+    load_cooldowns, save_cooldowns,
+)
+from scheduler import DueScheduler
+from ratelimit import TelegramRateLimiter, INTERACTIVE, BULK, BROADCAST
+from sender import SENT, RETRY, FAILED
+from outbox import OutboxDispatcher, USER_DRIP, GROUP_DRIP, REPLY
+from campaign import CampaignRunner
+from slots import SlotPlanner
+from quiet import get_tz, is_valid_tz, quiet_mask, is_quiet, next_open_ts
+from ai_cache import ResponseCache
+from ai_client import (
+    AIExecutor, CircuitBreaker, CircuitOpen, LatencyTracker, LazyModel, Overloaded, PRIVATE, GROUP, CLOSED,
+    HALF_OPEN,
 )
+from update_processor import PerChatUpdateProcessor
+from cooldown import CooldownStore
+from prefilter import GroupPrefilter, sketch
+from conversation import ConversationStore, USER, MODEL
+from catalog import Catalog
+from webhook import WebhookServer, derive_secret, serve
+import metrics
+
+startup.mark("imports")
 
 # -----------------------------------------------------------------------------
 # ENV & AYARLAR
@@ -34,6 +67,7 @@ from db import (
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN", "").strip()
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "").strip()  # boş: api.telegram.org
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "").strip()
 
 if not BOT_TOKEN:
@@ -41,79 +75,517 @@ if not BOT_TOKEN:
 if not GEMINI_API_KEY:
     raise RuntimeError("Missing GEMINI_API_KEY in environment. Set it in .env")
 
-# Gemini AI'ı yapılandır
-genai.configure(api_key=GEMINI_API_KEY)
+# Sabit talimat: modele bir kez verilir, her istekte tekrar gönderilmez
+SYSTEM_INSTRUCTION = """Sen Türkçe konuşan, dostane ve yardımsever bir Telegram bot asistanısın.
+Kullanıcı mesajları "İsim: mesaj" biçiminde gelir; gruplarda birden fazla kişi konuşabilir.
+
+Kurallar:
+- Kısa ve doğal yanıtlar ver (max 200 karakter)
+- Türkçe yanıtla
+- Dostane ve samimi ol
+- Gereksiz teknik detay verme
+- Emoji kullanabilirsin ama fazla abartma
+- Eğer soru sorulursa yardımcı olmaya çalış
+- Eğer sohbet ediyorlarsa sohbete katıl
+- Yanıtına isim öneki ekleme"""
+
+# Gemini AI; google.generativeai ilk ihtiyaçta ya da başlangıçtan sonra
+# arka planda yüklenir (AI_PRELOAD), bot update almaya beklemeden başlar.
 # Yeni model adı: gemini-1.5-flash (daha hızlı ve ücretsiz)
 # Alternatif: gemini-1.5-pro (daha güçlü ama limitli)
-model = genai.GenerativeModel('gemini-1.5-flash')
+model = LazyModel('gemini-1.5-flash', GEMINI_API_KEY, SYSTEM_INSTRUCTION)
+# Ana model geciktiğinde paralel (hedge) istek atılacak model; boşsa kapalı
+AI_HEDGE_MODEL = os.getenv("AI_HEDGE_MODEL", "").strip()
+hedge_model = LazyModel(AI_HEDGE_MODEL, GEMINI_API_KEY, SYSTEM_INSTRUCTION) if AI_HEDGE_MODEL else None
+AI_PRELOAD = os.getenv("AI_PRELOAD", "1") == "1"  # 0: ilk AI isteğinde yükle
 
 MIN_DAYS = float(os.getenv("MIN_DAYS", "2"))
 MAX_DAYS = float(os.getenv("MAX_DAYS", "3"))
 PER_MINUTE_LIMIT = int(os.getenv("PER_MINUTE_LIMIT", "20"))
-SLEEP_MS = int(os.getenv("SLEEP_BETWEEN_SENDS_MS", "100"))
 TZ = os.getenv("TZ", "UTC")
+DRIP_RETRY_S = int(os.getenv("DRIP_RETRY_S", "60"))
+SCHEDULER_RESOLUTION_S = int(os.getenv("SCHEDULER_RESOLUTION_S", "1"))
+DRIP_SLOT_S = int(os.getenv("DRIP_SLOT_S", "600"))  # 0: eski rastgele atama
+
+# Çoklu süreç: her drip worker satırları kendi adına kiralar
+DRIP_WORKER_ID = os.getenv("DRIP_WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+DRIP_LEASE_S = int(os.getenv("DRIP_LEASE_S", "600"))  # abone satırı; sadece kiralama ile outbox'a yazma arası
+DRIP_CLAIM_BATCH = int(os.getenv("DRIP_CLAIM_BATCH", "100"))
+DRIP_SHARDS = int(os.getenv("DRIP_SHARDS", "1"))  # >1 ise abs(chat_id) % DRIP_SHARDS
+DRIP_SHARD = int(os.getenv("DRIP_SHARD", "0"))
+DRIP_RESYNC_S = int(os.getenv("DRIP_RESYNC_S", "0"))  # >0: diğer süreçlerin eklediklerini periyodik yükle
+DRIP_SHARD_SPEC = (DRIP_SHARD, DRIP_SHARDS) if DRIP_SHARDS > 1 else None
+GLOBAL_PER_SECOND_LIMIT = float(os.getenv("GLOBAL_PER_SECOND_LIMIT", "30"))
+GROUP_PER_MINUTE_LIMIT = float(os.getenv("GROUP_PER_MINUTE_LIMIT", "20"))
+RATE_STATS_INTERVAL = int(os.getenv("RATE_STATS_INTERVAL", "60"))
+SEND_CONCURRENCY = int(os.getenv("SEND_CONCURRENCY", "8"))
+SEND_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", "200"))
+SEND_INLINE_RETRY_S = float(os.getenv("SEND_INLINE_RETRY_S", "3"))  # daha uzun beklemeler outbox'a
+# Kiralanan outbox satırları yerelde gönderim sırası bekler. Kira dolu bir
+# partinin drip bütçesiyle boşalma süresinden kısa olursa başka bir süreç
+# satırı yeniden kiralar ve mesaj iki kez gider; varsayılan bu sürenin 2 katı + 60 sn.
+OUTBOX_DRAIN_S = SEND_QUEUE_SIZE * 60 / max(PER_MINUTE_LIMIT, 1)
+OUTBOX_LEASE_S = int(os.getenv("OUTBOX_LEASE_S") or 0) or int(OUTBOX_DRAIN_S * 2) + 60
+if OUTBOX_LEASE_S < OUTBOX_DRAIN_S * 1.5:
+    logger.warning(
+        f"OUTBOX_LEASE_S={OUTBOX_LEASE_S} is close to the {OUTBOX_DRAIN_S:.0f}s it takes to drain "
+        f"SEND_QUEUE_SIZE={SEND_QUEUE_SIZE} at PER_MINUTE_LIMIT={PER_MINUTE_LIMIT}; rows may be sent twice"
+    )
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BASE_BACKOFF_S = float(os.getenv("OUTBOX_BASE_BACKOFF_S", "5"))
+OUTBOX_MAX_BACKOFF_S = float(os.getenv("OUTBOX_MAX_BACKOFF_S", "3600"))
+OUTBOX_DEAD_TTL_DAYS = float(os.getenv("OUTBOX_DEAD_TTL_DAYS", "7"))
+
+# Kampanya (toplu duyuru) ayarları
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x}
+CAMPAIGN_CONCURRENCY = int(os.getenv("CAMPAIGN_CONCURRENCY", "16"))
+CAMPAIGN_PAGE_SIZE = int(os.getenv("CAMPAIGN_PAGE_SIZE", "500"))
+CAMPAIGN_CHECKPOINT_S = float(os.getenv("CAMPAIGN_CHECKPOINT_S", "5"))
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "16"))
+PER_CHAT_QUEUE_LIMIT = int(os.getenv("PER_CHAT_QUEUE_LIMIT", "20"))
+
+# Metrikler: METRICS_PORT > 0 ise Prometheus /metrics; admin /stats her zaman açık
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Webhook modu: WEBHOOK_URL boşsa run_polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip()  # Telegram'ın erişeceği https adresi
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "").strip() or urlparse(WEBHOOK_URL).path or "/telegram"
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "").strip() or derive_secret(BOT_TOKEN)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_DRAIN_S = float(os.getenv("WEBHOOK_DRAIN_S", "10"))
+
+# Drip mesaj kataloğu; dosya değişince yeniden başlatmadan yüklenir
+CATALOG_PATH = os.getenv("CATALOG_PATH", "messages.json")
+CATALOG_DEFAULT_LANG = os.getenv("CATALOG_DEFAULT_LANG", "tr")
+CATALOG_POLL_S = float(os.getenv("CATALOG_POLL_S", "5"))
 
 # AI yanıt ayarları
 AI_RESPONSE_CHANCE = float(os.getenv("AI_RESPONSE_CHANCE", "0.3"))  # %30 ihtimal
 MIN_MESSAGE_LENGTH = int(os.getenv("MIN_MESSAGE_LENGTH", "10"))  # En az 10 karakter
 RESPONSE_COOLDOWN = int(os.getenv("RESPONSE_COOLDOWN", "300"))  # 5 dakika cooldown
+COOLDOWN_MAX_CHATS = int(os.getenv("COOLDOWN_MAX_CHATS", "10000"))
+COOLDOWN_CHECKPOINT_S = int(os.getenv("COOLDOWN_CHECKPOINT_S", "30"))
+
+# Grup ön elemesi: yakın kopyalar ve soru olmayan mesajlar Gemini'ye gitmez
+PREFILTER_MIN_SCORE = float(os.getenv("PREFILTER_MIN_SCORE", "0.3"))  # altı hiç yanıtlanmaz
+PREFILTER_SIMILARITY = float(os.getenv("PREFILTER_SIMILARITY", "0.7"))  # bu benzerlikte tekrar sayılır
+PREFILTER_WINDOW_S = int(os.getenv("PREFILTER_WINDOW_S", "3600"))
+PREFILTER_PER_CHAT = int(os.getenv("PREFILTER_PER_CHAT", "64"))
+PREFILTER_MAX_CHATS = int(os.getenv("PREFILTER_MAX_CHATS", "2000"))  # dolu sohbet ~35 KB
+
+# Sohbet bağlamı: sohbet başına son turlar, token bütçesiyle kırpılır
+CONTEXT_MAX_TURNS = int(os.getenv("CONTEXT_MAX_TURNS", "20"))
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "600"))
+CONTEXT_MAX_CHATS = int(os.getenv("CONTEXT_MAX_CHATS", "2000"))
+CONTEXT_TTL_S = int(os.getenv("CONTEXT_TTL_S", "21600"))
 
-# Son yanıt zamanlarını takip et (grup bazında)
-last_response_times = {}
+# AI yanıt önbelleği
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "1000"))
+AI_CACHE_MAX_BYTES = int(os.getenv("AI_CACHE_MAX_BYTES", "2000000"))
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", "3600"))
+AI_CACHE_PERSIST = os.getenv("AI_CACHE_PERSIST", "1") == "1"
+AI_CACHE_PER_USER = os.getenv("AI_CACHE_PER_USER", "0") == "1"
 
-# Mesajları güvenli yükleme
-try:
-    with open("messages.json", "r", encoding="utf-8") as f:
-        MESSAGES = json.load(f)
-    if not isinstance(MESSAGES, list) or not MESSAGES:
-        raise ValueError("messages.json must be a non-empty JSON array of strings")
-except FileNotFoundError:
-    MESSAGES = ["👋 Merhaba! Bot aktif çalışıyor."]
-    logger.warning("messages.json bulunamadı, varsayılan mesaj kullanılıyor")
+# Gemini executor ayarları
+AI_WORKERS = int(os.getenv("AI_WORKERS", "4"))
+AI_MAX_PENDING = int(os.getenv("AI_MAX_PENDING", "16"))  # özel mesajlar için
+AI_GROUP_MAX_PENDING = int(os.getenv("AI_GROUP_MAX_PENDING", str(max(1, AI_WORKERS // 2))))  # gruplar önce düşer
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", "20"))
+AI_STREAMING = os.getenv("AI_STREAMING", "1") == "1"  # özel sohbetlerde akışlı yanıt
+AI_STREAM_EDIT_INTERVAL = float(os.getenv("AI_STREAM_EDIT_INTERVAL", "1.0"))
+AI_HEDGE_QUANTILE = float(os.getenv("AI_HEDGE_QUANTILE", "0.95"))  # bu yüzdelik aşılınca hedge
+AI_HEDGE_MIN_S = float(os.getenv("AI_HEDGE_MIN_S", "2"))
+
+# Gemini devre kesici: son AI_BREAKER_WINDOW çağrının hata/yavaşlık oranı
+AI_BREAKER_WINDOW = int(os.getenv("AI_BREAKER_WINDOW", "20"))
+AI_BREAKER_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", "10"))
+AI_BREAKER_ERROR_RATE = float(os.getenv("AI_BREAKER_ERROR_RATE", "0.5"))
+AI_BREAKER_SLOW_S = float(os.getenv("AI_BREAKER_SLOW_S", "10"))
+AI_BREAKER_SLOW_RATE = float(os.getenv("AI_BREAKER_SLOW_RATE", "0.5"))
+AI_BREAKER_OPEN_S = float(os.getenv("AI_BREAKER_OPEN_S", "30"))
+AI_BREAKER_PROBES = int(os.getenv("AI_BREAKER_PROBES", "2"))
+
+# Son yanıt zamanlarını takip et (grup bazında); SQLite'a checkpoint edilir
+cooldowns = CooldownStore(RESPONSE_COOLDOWN, max_entries=COOLDOWN_MAX_CHATS)
+conversations = ConversationStore(
+    max_turns=CONTEXT_MAX_TURNS,
+    max_tokens=CONTEXT_MAX_TOKENS,
+    max_chats=CONTEXT_MAX_CHATS,
+    ttl_s=CONTEXT_TTL_S,
+)
+prefilter = GroupPrefilter(
+    AI_RESPONSE_CHANCE,
+    min_score=PREFILTER_MIN_SCORE,
+    per_chat=PREFILTER_PER_CHAT,
+    max_chats=PREFILTER_MAX_CHATS,
+    window_s=PREFILTER_WINDOW_S,
+    min_similarity=PREFILTER_SIMILARITY,
+)
+
+# Arka plan drip worker'ları; gönderimi outbox dispatcher'ı yapar
+worker_tasks = []
+outbox = None
+campaigns = None
+metrics_server = None
+
+# Tüm gönderimlerin geçtiği ortak hız sınırlayıcı
+rate_limiter = TelegramRateLimiter(
+    global_per_second=GLOBAL_PER_SECOND_LIMIT,
+    group_per_minute=GROUP_PER_MINUTE_LIMIT,
+    bulk_per_minute=PER_MINUTE_LIMIT,
+)
+
+ai_cache = ResponseCache(
+    max_entries=AI_CACHE_SIZE,
+    max_bytes=AI_CACHE_MAX_BYTES,
+    ttl=AI_CACHE_TTL,
+    load=get_cached_response if AI_CACHE_PERSIST else None,
+    save=put_cached_response if AI_CACHE_PERSIST else None,
+    per_user=AI_CACHE_PER_USER,
+)
+
+ai_executor = AIExecutor(
+    workers=AI_WORKERS,
+    max_pending=AI_MAX_PENDING,
+    group_max_pending=AI_GROUP_MAX_PENDING,
+    timeout=AI_TIMEOUT,
+)
+
+def make_breaker(name: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        window=AI_BREAKER_WINDOW,
+        min_calls=AI_BREAKER_MIN_CALLS,
+        error_rate=AI_BREAKER_ERROR_RATE,
+        slow_call_s=AI_BREAKER_SLOW_S,
+        slow_rate=AI_BREAKER_SLOW_RATE,
+        open_s=AI_BREAKER_OPEN_S,
+        probes=AI_BREAKER_PROBES,
+    )
+
+ai_breaker = make_breaker("primary")
+hedge_breaker = make_breaker("hedge")
+# Hedge eşikleri: tam yanıt (generate) ve akışta ilk parça süreleri ayrı
+response_latency = LatencyTracker()
+first_token_latency = LatencyTracker()
+
+# Update'ler eşzamanlı işlenir, aynı sohbetin update'leri sırayla
+update_processor = PerChatUpdateProcessor(
+    concurrency=UPDATE_CONCURRENCY,
+    per_chat_limit=PER_CHAT_QUEUE_LIMIT,
+)
+
+# Bellek içi due kuyrukları; başlangıçta DB'den yüklenir
+user_queue = DueScheduler(SCHEDULER_RESOLUTION_S)
+group_queue = DueScheduler(SCHEDULER_RESOLUTION_S)
+
+# Kullanıcı ve grup drip'leri aynı BULK bütçesini paylaştığı için tek histogram
+# Ufuk bir gün uzun: sessiz saatlere denk gelip en fazla 24 saat kayan zamanlar da sayılır
+slot_planner = SlotPlanner(DRIP_SLOT_S, int(MAX_DAYS * 86400) + 86400 + DRIP_SLOT_S) if DRIP_SLOT_S > 0 else None
+
+# Sıcak yol metrikleri; kuyruk derinlikleri toplanma anında okunur
+AI_SECONDS = metrics.histogram("ai_response_seconds", "Gemini reply latency", ("chat_type", "result"))
+AI_FIRST_TOKEN_SECONDS = metrics.histogram("ai_first_token_seconds", "Streamed reply time to first chunk")
+AI_PROMPT_TOKENS = metrics.histogram("ai_prompt_tokens", "Estimated tokens per Gemini request", ("chat_type",),
+                                     buckets=(50, 100, 200, 400, 600, 800, 1000, 1500, 2000, 4000))
+SEND_SECONDS = metrics.histogram("telegram_send_seconds", "sendMessage latency", ("priority", "outcome"))
+DRIP_BATCH = metrics.histogram("drip_batch_size", "Rows enqueued per drip batch", ("kind",), buckets=metrics.SIZE_BUCKETS)
+metrics.gauge("drip_scheduled", "Entries in the in-memory due queues (stale ones included)", ("kind",),
+              fn=lambda: {USER_DRIP: len(user_queue), GROUP_DRIP: len(group_queue)})
+metrics.gauge("outbox_in_flight", "Outbox sends handed to the sender",
+              fn=lambda: outbox.stats()["in_flight"] if outbox is not None else 0)
+metrics.gauge("ai_outstanding", "Gemini calls running or waiting for a worker", fn=lambda: ai_executor.outstanding)
+metrics.gauge("updates_in_progress", "Updates being handled or queued per chat", ("state",),
+              fn=lambda: {k: v for k, v in update_processor.stats().items() if k in ("running", "queued")})
+metrics.gauge("rate_limiter_interactive_waiting", "Interactive sends waiting for a token",
+              fn=lambda: rate_limiter.stats()["interactive_waiting"])
+metrics.gauge("ai_circuit_state", "Gemini circuit: 0 closed, 1 half-open, 2 open", ("model",),
+              fn=lambda: {b.name: 0 if b.state == CLOSED else 1 if b.state == HALF_OPEN else 2
+                          for b in (ai_breaker, hedge_breaker)})
+metrics.gauge("ai_hedges", "Hedged Gemini requests since start", ("outcome",),
+              fn=lambda: {"started": ai_executor.hedges, "won": ai_executor.hedge_wins})
+metrics.gauge("prefilter_decisions", "Group messages by pre-filter decision", ("decision",),
+              fn=lambda: {k: v for k, v in prefilter.counts.items() if k != "checked"})
+metrics.gauge("prefilter_gemini_calls_saved",
+              "Net Gemini calls avoided versus the plain coin flip (negative when scoring answers more)",
+              fn=prefilter.saved_calls)
+metrics.gauge("prefilter_bytes", "Approximate memory held by pre-filter sketches", fn=prefilter.memory_bytes)
+metrics.gauge("conversation_chats", "Chats with in-memory context", fn=lambda: conversations.stats()["chats"])
+metrics.gauge("conversation_bytes", "Approximate memory held by conversation context",
+              fn=conversations.memory_bytes)
+metrics.gauge("catalog_messages", "Active drip messages in the loaded catalog", fn=lambda: len(catalog.snapshot))
+metrics.gauge("catalog_version", "Loaded catalog version", fn=lambda: catalog.snapshot.version)
+metrics.gauge("startup_seconds", "Seconds from bot import to each startup phase", ("phase",), fn=startup.phases)
+metrics.gauge("ai_cache_entries", "In-memory AI cache entries", fn=lambda: ai_cache.stats()["entries"])
+
+# Drip mesajları; on_startup'ta yüklenir, worker'lar catalog.snapshot'tan okur
+catalog = Catalog(CATALOG_PATH, CATALOG_DEFAULT_LANG)
 
 # -----------------------------------------------------------------------------
 # GEMINI AI FONKSİYONLARI
 # -----------------------------------------------------------------------------
-async def generate_ai_response(message_text: str, chat_title: str = "", user_name: str = "") -> str:
-    """Gemini AI ile mesaja yanıt üret"""
-    try:
-        # Prompt oluştur
-        context = f"""Sen Türkçe konuşan, dostane ve yardımsever bir Telegram bot asistanısın.
+def user_turn(user_name: str, message_text: str) -> str:
+    return f"{user_name}: {message_text}"
 
-Grup: {chat_title}
-Kullanıcı: {user_name}
-Mesaj: "{message_text}"
+def build_contents(chat_id: int, chat_type: str) -> list:
+    """Sohbet bağlamından istek içeriği; kullanıcı turu önceden eklenmiş olmalı."""
+    contents = conversations.contents(chat_id)
+    AI_PROMPT_TOKENS.observe(conversations.prompt_tokens(contents), chat_type=chat_type)
+    return contents
 
-Kurallat:
-- Kısa ve doğal yanıtlar ver (max 200 karakter)
-- Türkçe yanıtla
-- Dostane ve samimi ol
-- Gereksiz teknik detay verme
-- Emoji kullanabilirsin ama fazla abartma
-- Eğer soru sorulursa yardımcı olmaya çalış
-- Eğer sohbet ediyorlarsa sohbete katıl
+def context_free_key(chat_id: int, message_text: str, chat_type: str, user_name: str) -> str:
+    """Önbellek anahtarı; istekte önceki turlar da varsa "" (önbellek atlanır).
+
+    Bağlama dayanan yanıt ("evet", "neden?") başka sohbete uymaz; anahtara
+    bağlamın hash'ini katmak da neredeyse hiç isabet bırakmazdı.
+    """
+    if conversations.turn_count(chat_id) > 1:
+        return ""
+    return ai_cache.key(message_text, chat_type, user_name)
+
+def trim_reply(text: str) -> str:
+    """Yanıtı temizle ve 200 karaktere kısalt"""
+    text = text.strip()
+    if len(text) > 200:
+        text = text[:197] + "..."
+    return text
 
-Yanıt:"""
+async def generate_ai_response(message_text: str, chat_id: int, user_name: str = "",
+                               chat_type: str = "group") -> str:
+    """Gemini AI ile mesaja yanıt üret.
 
-        response = await asyncio.get_event_loop().run_in_executor(
-            None, 
-            lambda: model.generate_content(context)
+    Mesaj ``conversations``'a önceden kullanıcı turu olarak eklenmiş
+    olmalı; başarılı yanıt model turu olarak eklenir.
+    """
+    started = time.perf_counter()
+    result = "error"
+    try:
+        cache_key = context_free_key(chat_id, message_text, chat_type, user_name)
+        cached = await ai_cache.get(cache_key) if cache_key else None
+        if cached:
+            result = "cached"
+            conversations.add(chat_id, MODEL, cached)
+            return cached
+
+        contents = build_contents(chat_id, chat_type)
+        # Hedge sadece özel sohbetlerde; gruplar zaten ilk düşürülenler
+        hedge = hedge_model if chat_type == "private" else None
+        response = await ai_executor.run_hedged(
+            lambda: model.generate_content(contents),
+            (lambda: hedge.generate_content(contents)) if hedge is not None else None,
+            response_latency.deadline(AI_HEDGE_QUANTILE, AI_HEDGE_MIN_S, AI_TIMEOUT),
+            priority=PRIVATE if chat_type == "private" else GROUP,
+            breaker=ai_breaker,
+            hedge_breaker=hedge_breaker,
+            tracker=response_latency,
         )
         
         if response.text:
-            # Yanıtı temizle ve kısalt
-            ai_text = response.text.strip()
-            if len(ai_text) > 200:
-                ai_text = ai_text[:197] + "..."
+            result = "ok"
+            ai_text = trim_reply(response.text)
+            conversations.add(chat_id, MODEL, ai_text)
+            if cache_key:
+                await ai_cache.put(cache_key, ai_text)
             return ai_text
         else:
+            result = "empty"
             return ""
             
+    except CircuitOpen as e:
+        # Devre açık: beklemeden hazır yanıta düş
+        result = "circuit_open"
+        logger.debug(f"Gemini request rejected ({chat_type}): {e}")
+        return ""
+    except Overloaded as e:
+        result = "shed"
+        logger.warning(f"Gemini request shed ({chat_type}): {e}")
+        return ""
+    except asyncio.TimeoutError:
+        result = "timeout"
+        logger.warning(f"Gemini request timed out after {AI_TIMEOUT}s ({chat_type})")
+        return ""
     except Exception as e:
         logger.error(f"Gemini AI error: {e}")
         return ""
+    finally:
+        AI_SECONDS.observe(time.perf_counter() - started, chat_type=chat_type, result=result)
+
+async def stream_ai_response(app: Application, chat_id: int, message_text: str, user_name: str) -> str:
+    """Özel sohbette yanıtı parça parça gönder.
+
+    İlk parça gelir gelmez bir mesaj atılır, sonra en fazla
+    AI_STREAM_EDIT_INTERVAL saniyede bir düzenlenir. Yarım HTML etiketleri
+    bozulmasın diye akış düz metin gönderilir; send_message_safely ile
+    giden (HTML) yedek gönderimlerde metin kaçışlanır. Gönderilen son
+    metni döndürür; hiç parça gelmezse "". Yarıda kesilen ya da
+    iletilemeyen yanıt sohbet bağlamına ve önbelleğe yazılmaz.
+
+    AI_HEDGE_MODEL varsa ve ilk parça son akışların p95'inden (en az
+    AI_HEDGE_MIN_S) geç kalırsa ikinci model de başlatılır; ilk parçayı
+    hangisi üretirse akış ondan sürer.
+    """
+    cache_key = context_free_key(chat_id, message_text, "private", user_name)
+    cached = await ai_cache.get(cache_key) if cache_key else None
+    if cached:
+        AI_SECONDS.observe(0.0, chat_type="private", result="cached")
+        if await send_message_safely(app, chat_id, html.escape(cached, quote=False), INTERACTIVE):
+            conversations.add(chat_id, MODEL, cached)
+        return cached
+
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+    stop = threading.Event()
+    contents = build_contents(chat_id, "private")
+
+    # İlk parçayı üreten model kazanır; diğerinin parçaları atılır
+    winner = []
+    winner_lock = threading.Lock()
+    producers = {}
+    errors = {}  # kaynak -> akışı kesen hata
+    first_chunk_at = {}  # kaynak -> ilk parçanın perf_counter'ı (devre bunu ölçer)
+
+    def pump_for(source: str, model_):
+        def pump():
+            # Gemini thread'inde çalışır; parçaları event loop'a aktarır
+            for chunk in model_.generate_content(contents, stream=True):
+                first_chunk_at.setdefault(source, time.perf_counter())
+                if stop.is_set():
+                    break
+                with winner_lock:
+                    if not winner:
+                        winner.append(source)
+                    elif winner[0] != source:
+                        break
+                loop.call_soon_threadsafe(chunks.put_nowait, chunk.text)
+        return pump
+
+    started = time.perf_counter()
+    def on_producer_done(source: str, future):
+        if not future.cancelled() and future.exception() is not None:
+            error = errors[source] = future.exception()
+            if isinstance(error, CircuitOpen):
+                logger.debug(f"Gemini stream rejected for {chat_id}: {error}")
+            else:
+                logger.warning(f"Gemini stream ended early for {chat_id} ({source}): {error!r}")
+        # Kazanan bitti ya da hiçbiri parça üretmeden hepsi bitti: akış sonu
+        if (winner and winner[0] == source) or (not winner and all(p.done() for p in producers.values())):
+            chunks.put_nowait(None)
+
+    def start_producer(source: str, model_, breaker: CircuitBreaker):
+        producer = asyncio.ensure_future(ai_executor.run(
+            pump_for(source, model_), priority=PRIVATE, breaker=breaker,
+            answered=functools.partial(first_chunk_at.get, source),
+        ))
+        producers[source] = producer
+        producer.add_done_callback(functools.partial(on_producer_done, source))
+
+    def maybe_hedge():
+        if not winner and not producers["primary"].done():
+            ai_executor.hedge_started()
+            start_producer("hedge", hedge_model, hedge_breaker)
+
+    start_producer("primary", model, ai_breaker)
+    hedge_timer = None
+    if hedge_model is not None:
+        hedge_timer = loop.call_later(
+            first_token_latency.deadline(AI_HEDGE_QUANTILE, AI_HEDGE_MIN_S, AI_TIMEOUT), maybe_hedge,
+        )
+
+    text = ""
+    shown = ""
+    message = None
+    send_failed = False
+    first_token_at = None
+    last_edit = 0.0
+    try:
+        while True:
+            piece = await chunks.get()
+            if piece is None:
+                break
+            text += piece
+            if len(text.strip()) > 200:
+                stop.set()
+                break
+            now = time.perf_counter()
+            if message is None:
+                if send_failed or not text.strip():
+                    continue
+                first_token_at = now
+                # Hedge kazandıysa ana model en az bu kadar gecikmişti; alt sınır
+                # olarak kaydedilir ki yavaş ana model yüzdeliği düşürmesin
+                first_token_latency.record(now - started)
+                if winner[0] != "primary":
+                    ai_executor.hedge_won()
+                shown = text.strip()
+                try:
+                    message = await app.bot.send_message(
+                        chat_id=chat_id, text=shown, rate_limit_args=INTERACTIVE,
+                    )
+                except (RetryAfter, Forbidden, BadRequest, NetworkError) as e:
+                    # Akış bitince tam yanıt send_message_safely ile gider
+                    # (kısa RetryAfter'da yeniden dener, uzununda outbox)
+                    logger.warning(f"Stream start failed for {chat_id}, sending the full reply instead: {e}")
+                    send_failed = True
+                    continue
+                last_edit = now
+            elif now - last_edit >= AI_STREAM_EDIT_INTERVAL and text.strip() != shown:
+                shown = text.strip()
+                last_edit = now
+                try:
+                    await app.bot.edit_message_text(
+                        shown, chat_id=chat_id, message_id=message.message_id,
+                        rate_limit_args=INTERACTIVE,
+                    )
+                except (RetryAfter, BadRequest, NetworkError) as e:
+                    logger.debug(f"Stream edit skipped for {chat_id}: {e}")
+    finally:
+        stop.set()
+        if hedge_timer is not None:
+            hedge_timer.cancel()
+
+    final = trim_reply(text)
+    # Kazanan hatayla bittiyse metin yarımdır: ekranda kalır ama kaydedilmez
+    failed = bool(winner) and winner[0] in errors
+    delivered = message is not None
+    if message is None:
+        if final and not failed:
+            delivered = await send_message_safely(app, chat_id, html.escape(final, quote=False), INTERACTIVE)
+            first_token_at = first_token_at or time.perf_counter()
+        else:
+            primary = producers["primary"]
+            rejected = primary.done() and not primary.cancelled() and isinstance(primary.exception(), CircuitOpen)
+            AI_SECONDS.observe(
+                time.perf_counter() - started, chat_type="private", result="circuit_open" if rejected else "error",
+            )
+            return ""
+    elif final != shown:
+        try:
+            await app.bot.edit_message_text(
+                final, chat_id=chat_id, message_id=message.message_id,
+                rate_limit_args=INTERACTIVE,
+            )
+        except (RetryAfter, BadRequest, NetworkError) as e:
+            logger.warning(f"Final stream edit failed for {chat_id}: {e}")
 
-def should_respond_to_message(message_text: str, chat_id: int) -> bool:
+    total = time.perf_counter() - started
+    AI_SECONDS.observe(total, chat_type="private", result="error" if failed else "ok")
+    AI_FIRST_TOKEN_SECONDS.observe(first_token_at - started)
+    logger.info(
+        f"AI stream to {chat_id}: first_token={first_token_at - started:.2f}s "
+        f"total={total:.2f}s chars={len(final)}" + (" (cut off)" if failed else "")
+    )
+    if failed or not delivered:
+        return final
+    conversations.add(chat_id, MODEL, final)
+    if cache_key:
+        await ai_cache.put(cache_key, final)
+    return final
+
+def should_respond_to_message(message_text: str, chat_id: int, forwarded: bool = False,
+                              reply_to_bot: bool = False) -> bool:
     """Mesaja yanıt verilip verilmeyeceğini belirle"""
     # Çok kısa mesajları ignore et
     if len(message_text.strip()) < MIN_MESSAGE_LENGTH:
@@ -123,14 +595,13 @@ def should_respond_to_message(message_text: str, chat_id: int) -> bool:
     if message_text.startswith('/'):
         return False
     
-    # Cooldown kontrolü
-    now = time.time()
-    if chat_id in last_response_times:
-        if now - last_response_times[chat_id] < RESPONSE_COOLDOWN:
-            return False
+    # Cooldown kontrolü; taslak yine kaydedilir ki sonra gelen kopyalar yakalansın
+    if cooldowns.active(chat_id):
+        prefilter.seen_recently(chat_id, sketch(message_text), time.time())
+        return False
     
-    # Rastgele yanıt ihtimali
-    return random.random() < AI_RESPONSE_CHANCE
+    # Yakın kopya, soru skoru ve skora göre artan yanıt ihtimali
+    return prefilter.check(chat_id, message_text, forwarded, reply_to_bot) == "passed"
 
 # -----------------------------------------------------------------------------
 # YARDIMCI FONKSİYONLAR
@@ -139,52 +610,94 @@ def seconds_between_days(min_days: float, max_days: float) -> int:
     delta_days = random.uniform(min_days, max_days)
     return int(delta_days * 24 * 3600)
 
-def format_ts(ts: int) -> str:
+def next_due_after(now: int, mask: int = 0) -> int:
+    """Sıradaki gönderim zamanı; planlayıcı varsa en az dolu slota.
+
+    Sessiz saate düşen zaman ilk açık saate kaydırılır; planlayıcıya
+    kaydırılmış zaman yazılır.
+    """
+    if slot_planner is None:
+        return next_open_ts(mask, now + seconds_between_days(MIN_DAYS, MAX_DAYS))
+    due = next_open_ts(mask, slot_planner.pick(now, MIN_DAYS * 86400, MAX_DAYS * 86400))
+    slot_planner.book(due, now)
+    return due
+
+def book_slot(next_due):
+    """Yeniden etkinleşen aboneliğin bekleyen gönderimini planlayıcıya yaz."""
+    if slot_planner is not None and next_due:
+        slot_planner.book(next_due, time.time())
+
+def free_slot(next_due):
+    """Gerçekleşmeyecek gönderimin slotunu boşalt (iptal, pasif grup)."""
+    if slot_planner is not None and next_due:
+        slot_planner.release(next_due, time.time())
+
+def format_ts(ts: int, tz_name: str = None) -> str:
     if not ts:
         return "—"
     try:
-        tz = pytz.timezone(TZ)
+        tz = get_tz(tz_name or TZ)
         dt = datetime.fromtimestamp(ts, tz=timezone.utc).astimezone(tz)
         return dt.strftime("%Y-%m-%d %H:%M:%S %Z")
     except Exception as e:
         logger.error(f"Tarih formatlama hatası: {e}")
         return "Hata"
 
-async def send_message_safely(app: Application, chat_id: int, text: str):
-    """Rate limit ve geçici hatalara dayanıklı gönderim."""
-    max_retries = 3
-    retry_count = 0
-    
-    while retry_count < max_retries:
-        try:
-            await app.bot.send_message(
-                chat_id=chat_id,
-                text=text,
-                parse_mode=ParseMode.HTML,
-                disable_web_page_preview=True,
-            )
-            return True
-        except RetryAfter as e:
-            logger.warning(f"Rate limit hit for {chat_id}, waiting {e.retry_after}s")
-            await asyncio.sleep(e.retry_after + 1)
-            retry_count += 1
-        except Forbidden:
-            logger.info(f"Bot blocked by user/group {chat_id}")
-            set_optout(chat_id, True)  # User için
-            set_group_active(chat_id, False)  # Group için
-            return False
-        except BadRequest as e:
-            logger.error(f"Bad request for {chat_id}: {e}")
-            return False
-        except (TimedOut, NetworkError) as e:
-            logger.warning(f"Network error for {chat_id}: {e}")
-            await asyncio.sleep(2)
-            retry_count += 1
-        except Exception as e:
-            logger.error(f"Unexpected error for {chat_id}: {e}")
-            return False
-    
-    return False
+async def send_message_once(app: Application, chat_id: int, text: str, priority: str = BULK):
+    """Tek gönderim denemesi; (SENT | RETRY | FAILED, beklenecek_saniye, hata) döndürür."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        await app.bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            parse_mode=ParseMode.HTML,
+            disable_web_page_preview=True,
+            rate_limit_args=priority,
+        )
+        outcome = "success"
+        return SENT, 0, None
+    except RetryAfter as e:
+        outcome = "retry_after"
+        logger.warning(f"Rate limit hit for {chat_id}, waiting {e.retry_after}s")
+        return RETRY, e.retry_after, f"RetryAfter {e.retry_after}s"
+    except Forbidden as e:
+        outcome = "forbidden"
+        logger.info(f"Bot blocked by user/group {chat_id}")
+        free_slot(await set_optout(chat_id, True))  # User için
+        free_slot(await set_group_active(chat_id, False))  # Group için
+        return FAILED, 0, f"Forbidden: {e}"
+    except BadRequest as e:
+        outcome = "bad_request"
+        logger.error(f"Bad request for {chat_id}: {e}")
+        return FAILED, 0, f"BadRequest: {e}"
+    except (TimedOut, NetworkError) as e:
+        outcome = "network"
+        logger.warning(f"Network error for {chat_id}: {e}")
+        return RETRY, 0, f"{type(e).__name__}: {e}"
+    except Exception as e:
+        logger.error(f"Unexpected error for {chat_id}: {e}")
+        return FAILED, 0, repr(e)
+    finally:
+        SEND_SECONDS.observe(time.perf_counter() - started, priority=priority, outcome=outcome)
+
+async def send_message_safely(app: Application, chat_id: int, text: str, priority: str = BULK):
+    """Handler'lardan gönderim; gönderildiyse True.
+
+    Kısa bir bekleme (SEND_INLINE_RETRY_S) ile bir kez daha denenir. Daha
+    uzun RetryAfter'lar ve tekrarlayan ağ hataları handler'ı bekletmez:
+    mesaj outbox'a yazılır, dispatcher backoff ile göndermeyi sürdürür.
+    """
+    outcome, delay, error = await send_message_once(app, chat_id, text, priority)
+    if outcome == RETRY and delay <= SEND_INLINE_RETRY_S:
+        await asyncio.sleep(delay or 1)
+        outcome, delay, error = await send_message_once(app, chat_id, text, priority)
+    if outcome == RETRY:
+        await enqueue_outbox(REPLY, chat_id, text, int(time.time() + delay), attempts=1, last_error=error)
+        if outbox is not None:
+            outbox.wake()
+        logger.info(f"Message to {chat_id} deferred to outbox: {error}")
+    return outcome == SENT
 
 # -----------------------------------------------------------------------------
 # MESAJ HANDLERs
@@ -208,25 +721,31 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
         if not message_text:
             return
             
+        # Yanıt verilmese de bağlam için kaydet
+        user_name = user.first_name or user.username or "Anonim"
+        if not message_text.startswith('/'):
+            conversations.add(chat.id, USER, user_turn(user_name, message_text))
+            
         # Yanıt verilip verilmeyeceğini kontrol et
-        if not should_respond_to_message(message_text, chat.id):
+        reply_to = message.reply_to_message
+        reply_to_bot = bool(reply_to and reply_to.from_user and reply_to.from_user.id == context.bot.id)
+        forwarded = message.forward_date is not None
+        if not should_respond_to_message(message_text, chat.id, forwarded, reply_to_bot):
             return
             
         # AI yanıtı üret
-        user_name = user.first_name or user.username or "Anonim"
-        chat_title = chat.title or "Grup"
-        
         ai_response = await generate_ai_response(
             message_text=message_text,
-            chat_title=chat_title,
-            user_name=user_name
+            chat_id=chat.id,
+            user_name=user_name,
+            chat_type=chat.type,
         )
         
         if ai_response:
             # Yanıt gönder
-            success = await send_message_safely(context.application, chat.id, ai_response)
+            success = await send_message_safely(context.application, chat.id, ai_response, INTERACTIVE)
             if success:
-                last_response_times[chat.id] = time.time()
+                cooldowns.touch(chat.id)
                 logger.info(f"AI response sent to group {chat.id}: {ai_response[:50]}...")
                 
     except Exception as e:
@@ -253,21 +772,31 @@ async def handle_private_message(update: Update, context: ContextTypes.DEFAULT_T
             
         # AI yanıtı üret
         user_name = user.first_name or user.username or "Anonim"
+        conversations.add(chat.id, USER, user_turn(user_name, message_text))
         
-        ai_response = await generate_ai_response(
-            message_text=message_text,
-            chat_title="Özel Mesaj",
-            user_name=user_name
-        )
+        if AI_STREAMING:
+            ai_response = await stream_ai_response(
+                context.application, chat.id, message_text, user_name
+            )
+        else:
+            ai_response = await generate_ai_response(
+                message_text=message_text,
+                chat_id=chat.id,
+                user_name=user_name,
+                chat_type="private",
+            )
+            if ai_response:
+                await send_message_safely(context.application, chat.id, ai_response, INTERACTIVE)
         
         if ai_response:
-            await send_message_safely(context.application, chat.id, ai_response)
             logger.info(f"AI response sent to user {user.id}: {ai_response[:50]}...")
         else:
             # AI yanıt üretemezse varsayılan mesaj
-            await update.message.reply_text(
+            await send_message_safely(
+                context.application, chat.id,
                 "🤖 Anlayamadım, daha detaylı yazabilir misin? "
-                "Yardım için /help yazabilirsin."
+                "Yardım için /help yazabilirsin.",
+                INTERACTIVE,
             )
                 
     except Exception as e:
@@ -279,12 +808,17 @@ async def handle_private_message(update: Update, context: ContextTypes.DEFAULT_T
 async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         u = update.effective_user
-        upsert_user(
+        # Var olan abone kendi zamanında planlanır; tekrar /start kayıt çoğaltmaz
+        next_due, resumed = await upsert_user(
             chat_id=u.id,
             username=u.username or "",
             first=u.first_name or "",
             last=u.last_name or "",
+            lang=(u.language_code or "").split("-")[0] or None,
         )
+        if resumed:
+            book_slot(next_due)
+        user_queue.schedule(u.id, next_due)
         await update.message.reply_text(
             "✅ Hoş geldin! Ben AI destekli bir botum.\n\n"
             "🤖 Benimle sohbet edebilir, sorular sorabilirsin\n"
@@ -303,7 +837,7 @@ async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def stop_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         u = update.effective_user
-        set_optout(u.id, True)
+        free_slot(await set_optout(u.id, True))
         await update.message.reply_text(
             "🛑 Düzenli güncellemeler durduruldu.\n\n"
             "💬 Yine de benimle sohbet edebilirsin!\n"
@@ -316,7 +850,7 @@ async def stop_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def status_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        user_data = get_user(update.effective_user.id)
+        user_data = await get_user(update.effective_user.id)
         if not user_data:
             await update.message.reply_text(
                 "📝 Henüz kayıtlı değilsin.\n"
@@ -327,9 +861,11 @@ async def status_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         msg = (
             f"📊 **Durum Raporu**\n\n"
             f"🟢 Güncelleme Durumu: {'Aktif' if user_data['opted_out']==0 else 'Durduruldu'}\n"
-            f"📅 Son Gönderim: {format_ts(user_data['last_sent_ts'] or 0)}\n"
-            f"⏰ Sıradaki Gönderim: {format_ts(user_data['next_due_ts'] or 0)}\n"
-            f"📈 Mesaj Sayısı: {user_data['msg_index'] or 0}\n\n"
+            f"📅 Son Gönderim: {format_ts(user_data['last_sent_ts'] or 0, user_data['tz'])}\n"
+            f"⏰ Sıradaki Gönderim: {format_ts(user_data['next_due_ts'] or 0, user_data['tz'])}\n"
+            f"📈 Mesaj Sayısı: {user_data['msg_index'] or 0}\n"
+            f"🌍 Saat Dilimi: {user_data['tz'] or TZ}\n"
+            f"🌙 Sessiz Saatler: {format_quiet(user_data['quiet_start'], user_data['quiet_end'])}\n\n"
             f"🤖 AI Sohbet: Aktif\n"
             f"💬 Benimle istediğin zaman sohbet edebilirsin!"
         )
@@ -338,6 +874,74 @@ async def status_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error in status_cmd: {e}")
         await update.message.reply_text("❌ Durum bilgisi alınamadı.")
 
+def format_quiet(start, end) -> str:
+    if start is None or end is None:
+        return "Kapalı"
+    return f"{start:02d}:00 - {end:02d}:00"
+
+def chat_kind(chat) -> str:
+    return "user" if chat.type == "private" else "group"
+
+async def timezone_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/timezone Europe/Istanbul: sohbetin saat dilimini ayarla."""
+    try:
+        chat = update.effective_chat
+        kind = chat_kind(chat)
+        row = await get_chat(kind, chat.id)
+        if row is None:
+            await update.message.reply_text("Önce /start (grupta /groupstart) ile abone olun.")
+            return
+        if not context.args:
+            await update.message.reply_text(
+                f"🌍 Saat dilimi: {row['tz'] or TZ}\n"
+                "Değiştirmek için: /timezone Europe/Istanbul"
+            )
+            return
+        name = context.args[0]
+        if not is_valid_tz(name):
+            await update.message.reply_text("❌ Bilinmeyen saat dilimi. Örnek: Europe/Istanbul, America/New_York")
+            return
+        mask = 0
+        if row["quiet_start"] is not None:
+            mask = quiet_mask(name, row["quiet_start"], row["quiet_end"])
+        await set_chat_timezone(kind, chat.id, name, mask)
+        await update.message.reply_text(f"✅ Saat dilimi {name} olarak ayarlandı.")
+    except Exception as e:
+        logger.error(f"Error in timezone_cmd: {e}")
+        await update.message.reply_text("❌ Saat dilimi ayarlanamadı.")
+
+async def quiet_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/quiet 22-8 ya da /quiet off: yerel saatle sessiz saatler."""
+    try:
+        chat = update.effective_chat
+        kind = chat_kind(chat)
+        row = await get_chat(kind, chat.id)
+        if row is None:
+            await update.message.reply_text("Önce /start (grupta /groupstart) ile abone olun.")
+            return
+        arg = context.args[0] if context.args else ""
+        if arg == "off":
+            await set_quiet_hours(kind, chat.id, None, None, 0)
+            await update.message.reply_text("✅ Sessiz saatler kapatıldı.")
+            return
+        try:
+            start, end = (int(part) for part in arg.split("-"))
+            if not (0 <= start < 24 and 0 <= end < 24) or start == end:
+                raise ValueError(arg)
+        except ValueError:
+            await update.message.reply_text(
+                f"🌙 Sessiz saatler: {format_quiet(row['quiet_start'], row['quiet_end'])}\n"
+                "Ayarlamak için: /quiet 22-8 (yerel saat), kapatmak için: /quiet off"
+            )
+            return
+        await set_quiet_hours(kind, chat.id, start, end, quiet_mask(row["tz"] or TZ, start, end))
+        await update.message.reply_text(
+            f"✅ {start:02d}:00 - {end:02d}:00 ({row['tz'] or TZ}) arası güncelleme gönderilmeyecek."
+        )
+    except Exception as e:
+        logger.error(f"Error in quiet_cmd: {e}")
+        await update.message.reply_text("❌ Sessiz saatler ayarlanamadı.")
+
 async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     help_text = """
 🤖 **AI Bot Yardım**
@@ -352,6 +956,8 @@ async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /start - Botu başlat ve abone ol
 /stop - Güncellemeleri durdur
 /status - Durum bilgin
+/timezone - Saat dilimini ayarla
+/quiet - Sessiz saatleri ayarla (ör. /quiet 22-8)
 /help - Bu yardım mesajı
 
 **Grup Komutları:**
@@ -361,13 +967,99 @@ async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 **Nasıl Çalışır:**
 • Özel mesajlarında her şeye yanıt veririm
-• Gruplarda %30 ihtimalle konuşmalara katılırım
+• Gruplarda ara sıra konuşmalara katılırım; sorulara ve bana verilen yanıtlara daha sık
 • Düzenli olarak güncellemeler gönderirim
 
 Soru/sorun için @your_username ile iletişime geç!
 """
     await update.message.reply_text(help_text, parse_mode=ParseMode.MARKDOWN)
 
+# Yönetici komutları
+def is_admin(update: Update) -> bool:
+    return update.effective_user is not None and update.effective_user.id in ADMIN_IDS
+
+def format_campaign(row, live: dict = None) -> str:
+    sent, failed = (live["sent"], live["failed"]) if live else (row["sent"], row["failed"])
+    line = f"#{row['id']} [{row['status']}] {row['target']}: {sent + failed}/{row['total']} (✅ {sent}, ❌ {failed})"
+    if live:
+        eta = f"{live['eta_s'] // 60} dk" if live["eta_s"] is not None else "—"
+        line += f"\n   ⚡ {live['rate_per_s']} mesaj/sn, kalan süre: {eta}"
+    return line
+
+async def broadcast_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/broadcast [users|groups] <metin>: tüm aktif alıcılara duyuru."""
+    if not is_admin(update):
+        return
+    try:
+        # HTML hali biçimlendirmeyi korur; ilk kelime komutun kendisi
+        parts = (update.message.text_html or "").split(None, 1)
+        text = parts[1].strip() if len(parts) > 1 else ""
+        target = "all"
+        first = text.split(None, 1)
+        if first and first[0] in ("users", "groups"):
+            target, text = first[0], (first[1].strip() if len(first) > 1 else "")
+        if not text:
+            await update.message.reply_text("Kullanım: /broadcast [users|groups] <mesaj>")
+            return
+        campaign_id = await create_campaign(text, target, update.effective_user.id)
+        row = await get_campaign(campaign_id)
+        if campaigns is not None:
+            campaigns.wake()
+        await update.message.reply_text(
+            f"📣 Kampanya #{campaign_id} oluşturuldu: {row['total']} alıcı.\n"
+            f"İlerleme için /campaign yazın."
+        )
+        logger.info(f"Campaign {campaign_id} created by {update.effective_user.id} for {row['total']} recipients")
+    except Exception as e:
+        logger.error(f"Error in broadcast_cmd: {e}")
+        await update.message.reply_text("❌ Kampanya oluşturulamadı.")
+
+async def campaign_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/campaign [pause|resume|cancel <id>]: ilerleme ve kontrol."""
+    if not is_admin(update):
+        return
+    try:
+        if len(context.args) == 2 and context.args[0] in ("pause", "resume", "cancel") and context.args[1].isdigit():
+            action, campaign_id = context.args[0], int(context.args[1])
+            status = {"pause": "paused", "resume": "running", "cancel": "cancelled"}[action]
+            if await set_campaign_status(campaign_id, status):
+                if status == "running" and campaigns is not None:
+                    campaigns.wake()
+                await update.message.reply_text(f"✅ Kampanya #{campaign_id}: {status}")
+            else:
+                await update.message.reply_text(f"Kampanya #{campaign_id} değiştirilemedi.")
+            return
+
+        live = campaigns.progress.snapshot() if campaigns is not None and campaigns.progress else None
+        rows = await recent_campaigns(5)
+        if not rows:
+            await update.message.reply_text("Henüz kampanya yok. /broadcast <mesaj> ile başlatın.")
+            return
+        lines = [
+            format_campaign(row, live if live and live["id"] == row["id"] else None)
+            for row in rows
+        ]
+        await update.message.reply_text("📣 Kampanyalar\n\n" + "\n".join(lines))
+    except Exception as e:
+        logger.error(f"Error in campaign_cmd: {e}")
+        await update.message.reply_text("❌ Kampanya bilgisi alınamadı.")
+
+async def stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/stats [filtre]: metrik özeti; filtre verilirse sadece adında geçenler."""
+    if not is_admin(update):
+        return
+    try:
+        needle = context.args[0] if context.args else ""
+        lines = [line for line in metrics.summary() if needle in line]
+        text = "\n".join(lines) or "Henüz metrik yok."
+        # Telegram mesaj sınırı 4096 karakter
+        if len(text) > 4000:
+            text = text[:4000].rsplit("\n", 1)[0] + "\n… (/stats <filtre> ile daraltın)"
+        await update.message.reply_text("📊 Metrikler\n\n" + text)
+    except Exception as e:
+        logger.error(f"Error in stats_cmd: {e}")
+        await update.message.reply_text("❌ Metrikler alınamadı.")
+
 # Grup komutları
 async def groupstart_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
@@ -375,7 +1067,10 @@ async def groupstart_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if chat.type not in ("group", "supergroup"):
             await update.message.reply_text("Bu komutu bir GRUP içinde çalıştırın.")
             return
-        upsert_group(chat.id, chat.title or "")
+        next_due, resumed = await upsert_group(chat.id, chat.title or "")
+        if resumed:
+            book_slot(next_due)
+        group_queue.schedule(chat.id, next_due)
         await update.message.reply_text(
             "✅ Grup aboneliği aktif!\n\n"
             "🤖 Artık sohbetlere katılabilirim\n"
@@ -393,7 +1088,7 @@ async def groupstop_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if chat.type not in ("group", "supergroup"):
             await update.message.reply_text("Bu komutu bir GRUP içinde çalıştırın.")
             return
-        set_group_active(chat.id, False)
+        free_slot(await set_group_active(chat.id, False))
         await update.message.reply_text("🛑 Grup aboneliği durduruldu.")
         logger.info(f"Group unsubscribed: {chat.id}")
     except Exception as e:
@@ -418,127 +1113,347 @@ async def groupstatus_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # -----------------------------------------------------------------------------
 # DRIP WORKER'LAR
 # -----------------------------------------------------------------------------
-async def drip_worker(app: Application):
-    """DM aboneleri için periyodik gönderim."""
-    logger.info("DM drip worker started")
-    per_minute = PER_MINUTE_LIMIT
-    window_start = time.time()
-    sent_this_window = 0
-
-    while True:
-        try:
-            now = int(time.time())
-            if time.time() - window_start >= 60:
-                window_start = time.time()
-                sent_this_window = 0
+async def next_due_rows(queue: DueScheduler, claim, fetch_by_ids, limit: int):
+    """Zamanlayıcının verdiği id'lerden due olanları bu worker adına kirala.
 
-            rows = due_users(now_ts=now, limit=per_minute)
-            if not rows:
-                await asyncio.sleep(30)
-                continue
+    Kiralanamayan id'ler DB'deki güncel haline göre tekrar planlanır:
+    başka bir süreç kiraladıysa kira bitiminde, sessiz saatteyse ilk açık
+    saatte tekrar bakılır. next_due_ts'i ileride olan kayıt bayattır (canlı
+    kaydı o zamanda, başka süreçlerin ilerlettikleri resync ile yüklenir)
+    ve opt-out olanlarla birlikte düşer.
+    """
+    chat_ids = await queue.wait_due(limit)
+    now = int(time.time())
+    rows = await claim(DRIP_WORKER_ID, chat_ids, now, DRIP_LEASE_S)
+    claimed = {row["chat_id"] for row in rows}
+    missed = [chat_id for chat_id in chat_ids if chat_id not in claimed]
+    if missed:
+        for row in await fetch_by_ids(missed):
+            if row["lease_owner"] not in (None, DRIP_WORKER_ID) and (row["lease_until"] or 0) > now:
+                queue.schedule(row["chat_id"], row["lease_until"])
+            elif (row["next_due_ts"] or 0) > now:
+                continue  # bayat kayıt; yeniden planlamak kopya üretirdi
+            elif is_quiet(row["quiet_mask"], now):
+                # Tekrar tekrar yoklamak yerine ilk açık saate ertele
+                queue.schedule(row["chat_id"], next_open_ts(row["quiet_mask"], now))
+    return rows
 
-            for row in rows:
-                if sent_this_window >= per_minute:
-                    to_wait = 60 - (time.time() - window_start)
-                    if to_wait > 0:
-                        await asyncio.sleep(to_wait)
-                    window_start = time.time()
-                    sent_this_window = 0
-
-                idx = (row["msg_index"] or 0) % len(MESSAGES)
-                text = MESSAGES[idx]
+async def enqueue_due(kind: str, queue: DueScheduler, rows):
+    """Kiralanan satırların mesajını outbox'a yaz ve sonraki zamanı planla.
 
-                success = await send_message_safely(app, row["chat_id"], text)
-                if success:
-                    sent_this_window += 1
-                    next_due = now + seconds_between_days(MIN_DAYS, MAX_DAYS)
-                    mark_sent(row["chat_id"], next_due_ts=next_due, new_index=(idx + 1) % len(MESSAGES))
+    Gönderim burada beklenmez; RetryAfter ya da ağ hataları dispatcher'da
+    backoff ile ele alınır.
+    """
+    now = int(time.time())
+    batch = []
+    # Parti boyunca aynı katalog sürümü; yeniden yükleme referansı değiştirir
+    snapshot = catalog.snapshot
+    for row in rows:
+        msg_id, text = snapshot.next_after(row["last_msg_id"], row["lang"])
+        next_due = next_due_after(now, row["quiet_mask"])
+        batch.append((row["chat_id"], text, next_due, msg_id))
+    DRIP_BATCH.observe(len(batch), kind=kind)
+    retry_at = now + DRIP_RETRY_S
+    # Önceki mesajı hâlâ outbox'ta bekleyenler imleç ilerlemeden ertelenir
+    postponed = set(await enqueue_drips(kind, batch, DRIP_WORKER_ID, now, retry_at))
+    for chat_id, _, next_due, _ in batch:
+        if chat_id in postponed:
+            # Planlanan zaman kullanılmayacak; slotu boşalt
+            free_slot(next_due)
+            next_due = retry_at
+        queue.schedule(chat_id, next_due)
+    if outbox is not None:
+        outbox.wake()
 
-                await asyncio.sleep(SLEEP_MS / 1000.0)
+async def drip_worker(app: Application):
+    """DM aboneleri için periyodik gönderim.
 
-            await asyncio.sleep(2)
+    Due satırlar outbox'a yazılır ve worker hemen sonraki partiye geçer.
+    """
+    logger.info("DM drip worker started")
+    while True:
+        rows = []
+        try:
+            rows = await next_due_rows(
+                user_queue, claim_users, active_users_by_ids,
+                min(PER_MINUTE_LIMIT, DRIP_CLAIM_BATCH),
+            )
+            await enqueue_due(USER_DRIP, user_queue, rows)
         except Exception as e:
             logger.error(f"Error in drip_worker: {e}")
+            retry_at = int(time.time()) + DRIP_RETRY_S
+            for row in rows:
+                user_queue.schedule(row["chat_id"], retry_at)
             await asyncio.sleep(30)
 
 async def group_drip_worker(app: Application):
     """Gruplar için periyodik gönderim."""
     logger.info("Group drip worker started")
-    
     while True:
+        rows = []
         try:
-            now = int(time.time())
-            rows = due_groups(now_ts=now, limit=20)
-            if not rows:
-                await asyncio.sleep(30)
-                continue
-
-            for row in rows:
-                idx = (row["msg_index"] or 0) % len(MESSAGES)
-                text = MESSAGES[idx]
-                
-                success = await send_message_safely(app, row["chat_id"], text)
-                if success:
-                    next_due = now + seconds_between_days(MIN_DAYS, MAX_DAYS)
-                    mark_group_sent(row["chat_id"], next_due_ts=next_due, new_index=(idx + 1) % len(MESSAGES))
-                else:
-                    set_group_active(row["chat_id"], False)
-
-                await asyncio.sleep(SLEEP_MS / 1000.0)
-
-            await asyncio.sleep(5)
+            rows = await next_due_rows(
+                group_queue, claim_groups, active_groups_by_ids,
+                min(20, DRIP_CLAIM_BATCH),
+            )
+            await enqueue_due(GROUP_DRIP, group_queue, rows)
         except Exception as e:
             logger.error(f"Error in group_drip_worker: {e}")
+            retry_at = int(time.time()) + DRIP_RETRY_S
+            for row in rows:
+                group_queue.schedule(row["chat_id"], retry_at)
             await asyncio.sleep(30)
 
+async def on_dead_letter(row, error: str):
+    """Gönderilemeyen grup mesajı grubu pasifleştirir (eski davranış)."""
+    if row["kind"] == GROUP_DRIP:
+        free_slot(await set_group_active(row["chat_id"], False))
+
+def start_campaigns(app: Application) -> CampaignRunner:
+    global campaigns
+    campaigns = CampaignRunner(
+        functools.partial(send_message_once, app, priority=BROADCAST),
+        claim_campaign,
+        campaign_recipients,
+        checkpoint_campaign,
+        final_checkpoint_campaign,
+        finish_campaign,
+        release_campaigns,
+        owner=DRIP_WORKER_ID,
+        concurrency=CAMPAIGN_CONCURRENCY,
+        page_size=CAMPAIGN_PAGE_SIZE,
+        checkpoint_s=CAMPAIGN_CHECKPOINT_S,
+        max_attempts=OUTBOX_MAX_ATTEMPTS,
+    )
+    worker_tasks.append(asyncio.create_task(campaigns.run()))
+    return campaigns
+
+def start_outbox(app: Application) -> OutboxDispatcher:
+    global outbox
+    outbox = OutboxDispatcher(
+        functools.partial(send_message_once, app),
+        claim_outbox,
+        settle_outbox,
+        owner=DRIP_WORKER_ID,
+        concurrency=SEND_CONCURRENCY,
+        batch=SEND_QUEUE_SIZE,
+        lease_s=OUTBOX_LEASE_S,
+        max_attempts=OUTBOX_MAX_ATTEMPTS,
+        base_backoff=OUTBOX_BASE_BACKOFF_S,
+        max_backoff=OUTBOX_MAX_BACKOFF_S,
+        on_dead=on_dead_letter,
+        priorities={REPLY: INTERACTIVE},
+    )
+    outbox.start()
+    return outbox
+
 # -----------------------------------------------------------------------------
 # STARTUP & MAIN
 # -----------------------------------------------------------------------------
 async def schedule_workers(context: ContextTypes.DEFAULT_TYPE):
     app = context.application
-    app.create_task(drip_worker(app))
-    app.create_task(group_drip_worker(app))
+    # app.create_task yerine doğrudan task: Application.stop() bu sonsuz
+    # döngüleri beklemesin, on_stop içinde iptal edilsinler.
+    worker_tasks.append(asyncio.create_task(drip_worker(app)))
+    worker_tasks.append(asyncio.create_task(group_drip_worker(app)))
+    start_campaigns(app)
+
+async def checkpoint_cooldowns(context: ContextTypes.DEFAULT_TYPE = None):
+    rows = cooldowns.drain_dirty()
+    try:
+        await save_cooldowns(rows, time.time() - RESPONSE_COOLDOWN)
+    except Exception as e:
+        cooldowns.restore_dirty(rows)
+        logger.error(f"Cooldown checkpoint failed: {e}")
+
+async def refresh_catalog(context: ContextTypes.DEFAULT_TYPE = None):
+    try:
+        await catalog.refresh()
+    except Exception as e:
+        logger.error(f"Catalog refresh failed: {e}")
+
+async def refresh_quiet_masks(context: ContextTypes.DEFAULT_TYPE = None):
+    """Yaz saati geçişlerinde UTC maskeleri kayar; farklı ayarları yeniden hesapla."""
+    now = time.time()
+    for kind in ("user", "group"):
+        rows = [
+            (quiet_mask(tz or TZ, start, end, now), tz, start, end)
+            for tz, start, end in await quiet_settings(kind)
+        ]
+        changed = await update_quiet_masks(kind, rows)
+        if changed:
+            logger.info(f"Quiet-hour masks updated for {changed} {kind} rows")
+
+async def resync_schedule(context: ContextTypes.DEFAULT_TYPE):
+    """Diğer süreçlerin eklediği/açtığı satırları yakın pencere için yükle.
+
+    Sadece DRIP_RESYNC_S içinde due olacaklar alınır; zaten kuyrukta olanlar
+    çift kayıt olur ama DB doğrulamasında elenir.
+    """
+    until = int(time.time()) + DRIP_RESYNC_S
+    user_queue.load(*await user_schedule(until_ts=until, shard=DRIP_SHARD_SPEC))
+    group_queue.load(*await group_schedule(until_ts=until, shard=DRIP_SHARD_SPEC))
+
+async def log_stats(context: ContextTypes.DEFAULT_TYPE):
+    logger.info(f"Rate limiter: {rate_limiter.stats()}")
+    logger.info(f"AI cache: {ai_cache.stats()}")
+    logger.info(f"AI executor: {ai_executor.stats()}")
+    logger.info(f"AI circuit: primary={ai_breaker.stats()} hedge={hedge_breaker.stats()}")
+    logger.info(f"Updates: {update_processor.stats()}")
+    logger.info(f"Group prefilter: {prefilter.stats()}")
+    logger.info(f"Conversations: {conversations.stats()}")
+    logger.info(f"Catalog: {catalog.stats()}")
+    if outbox is not None:
+        logger.info(f"Outbox: {outbox.stats()} rows={await outbox_counts()}")
+    if campaigns is not None and campaigns.progress is not None:
+        logger.info(f"Campaign: {campaigns.progress.snapshot()}")
+    if slot_planner is not None:
+        logger.info(f"Drip slots: {slot_planner.stats(time.time(), MAX_DAYS * 86400)}")
+
+def preload_ai():
+    """Gemini istemcisini arka plan thread'inde yükle; ilk AI isteği beklemesin."""
+    try:
+        for lazy in (model, hedge_model):
+            if isinstance(lazy, LazyModel):
+                lazy.load()
+        startup.mark("ai_ready")
+    except Exception as e:
+        logger.error(f"Gemini preload failed, will retry on first request: {e}")
+
+def on_first_update():
+    startup.mark("first_update")
+    startup.report()
 
 async def on_startup(app: Application):
+    global metrics_server
     try:
-        init_db()
+        await init_db()
         logger.info("Database initialized")
+        await catalog.refresh()
+        if AI_CACHE_PERSIST:
+            await prune_cached_responses(int(time.time()) - AI_CACHE_TTL)
+        for queue, schedule in ((user_queue, user_schedule), (group_queue, group_schedule)):
+            chat_ids, dues = await schedule(shard=DRIP_SHARD_SPEC)
+            queue.load(chat_ids, dues)
+            if slot_planner is not None:
+                slot_planner.load(dues, time.time())
+        logger.info(f"Scheduler loaded: {len(user_queue)} users, {len(group_queue)} groups")
+        cooldowns.load(await load_cooldowns(time.time() - RESPONSE_COOLDOWN))
+        await prune_outbox(int(time.time() - OUTBOX_DEAD_TTL_DAYS * 86400))
+        start_outbox(app)
+        if METRICS_PORT > 0:
+            metrics_server = await metrics.start_http_server(METRICS_HOST, METRICS_PORT)
         app.job_queue.run_once(schedule_workers, when=0)
+        app.job_queue.run_repeating(checkpoint_cooldowns, interval=COOLDOWN_CHECKPOINT_S, first=COOLDOWN_CHECKPOINT_S)
+        if DRIP_RESYNC_S > 0:
+            app.job_queue.run_repeating(resync_schedule, interval=DRIP_RESYNC_S, first=DRIP_RESYNC_S)
+        app.job_queue.run_repeating(log_stats, interval=RATE_STATS_INTERVAL, first=RATE_STATS_INTERVAL)
+        app.job_queue.run_repeating(refresh_quiet_masks, interval=3600, first=0)
+        if CATALOG_POLL_S > 0:
+            app.job_queue.run_repeating(refresh_catalog, interval=CATALOG_POLL_S, first=CATALOG_POLL_S)
         logger.info("Workers scheduled")
+        if AI_PRELOAD:
+            asyncio.get_running_loop().run_in_executor(None, preload_ai)
+        startup.mark("ready")
         logger.info("🤖 AI Bot ready!")
     except Exception as e:
         logger.error(f"Startup error: {e}")
         raise
 
+async def on_stop(app: Application):
+    if metrics_server is not None:
+        metrics_server.close()
+    for task in worker_tasks:
+        task.cancel()
+    await asyncio.gather(*worker_tasks, return_exceptions=True)
+    worker_tasks.clear()
+    if outbox is not None:
+        await outbox.close()
+    # Gönderilemeden kalan kiraları diğer süreçler beklemesin
+    await release_users(DRIP_WORKER_ID)
+    await release_groups(DRIP_WORKER_ID)
+    await release_outbox(DRIP_WORKER_ID)
+    await release_campaigns(DRIP_WORKER_ID)
+    await checkpoint_cooldowns()
+    logger.info("Workers stopped, outbox results flushed")
+
+async def on_shutdown(app: Application):
+    ai_executor.shutdown()
+    await close_db()
+    logger.info("Database connections closed")
+
+def build_application() -> Application:
+    """Handler'ları ve yaşam döngüsü kancaları kurulmuş Application.
+
+    TELEGRAM_BASE_URL verilirse Bot API yerine o adrese gidilir (yerel
+    test sunucusu ya da kendi barındırılan Bot API).
+    """
+    startup.mark("module")
+    # AIORateLimiter yerine kendi sınırlayıcımız (aiolimiter gerektirmez)
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .rate_limiter(rate_limiter)
+        .concurrent_updates(update_processor)
+    )
+    if TELEGRAM_BASE_URL:
+        builder = builder.base_url(TELEGRAM_BASE_URL)
+    application = builder.build()
+    update_processor.on_first_update = on_first_update
+
+    # Komut handler'ları
+    application.add_handler(CommandHandler("start", start_cmd))
+    application.add_handler(CommandHandler("stop", stop_cmd))
+    application.add_handler(CommandHandler("status", status_cmd))
+    application.add_handler(CommandHandler("help", help_cmd))
+    application.add_handler(CommandHandler("timezone", timezone_cmd))
+    application.add_handler(CommandHandler("quiet", quiet_cmd))
+    
+    application.add_handler(CommandHandler("groupstart", groupstart_cmd))
+    application.add_handler(CommandHandler("groupstop", groupstop_cmd))
+    application.add_handler(CommandHandler("groupstatus", groupstatus_cmd))
+
+    application.add_handler(CommandHandler("broadcast", broadcast_cmd))
+    application.add_handler(CommandHandler("campaign", campaign_cmd))
+    application.add_handler(CommandHandler("stats", stats_cmd))
+
+    # Mesaj handler'ları - Öncelik önemli!
+    application.add_handler(MessageHandler(
+        filters.TEXT & filters.ChatType.GROUPS, 
+        handle_group_message
+    ))
+    application.add_handler(MessageHandler(
+        filters.TEXT & filters.ChatType.PRIVATE, 
+        handle_private_message
+    ))
+
+    application.post_init = on_startup
+    application.post_stop = on_stop
+    application.post_shutdown = on_shutdown
+    startup.mark("app_built")
+    return application
+
+def run_webhook(application: Application):
+    server = WebhookServer(application, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET)
+    asyncio.run(serve(
+        application,
+        server,
+        webhook_url=WEBHOOK_URL,
+        drain_timeout=WEBHOOK_DRAIN_S,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=Update.ALL_TYPES,
+    ))
+
 def main():
     try:
-        # AIORateLimiter'ı kaldırdık - bu versiyonlarda sorun çıkarıyor
-        application = Application.builder().token(BOT_TOKEN).build()
-
-        # Komut handler'ları
-        application.add_handler(CommandHandler("start", start_cmd))
-        application.add_handler(CommandHandler("stop", stop_cmd))
-        application.add_handler(CommandHandler("status", status_cmd))
-        application.add_handler(CommandHandler("help", help_cmd))
-        
-        application.add_handler(CommandHandler("groupstart", groupstart_cmd))
-        application.add_handler(CommandHandler("groupstop", groupstop_cmd))
-        application.add_handler(CommandHandler("groupstatus", groupstatus_cmd))
-
-        # Mesaj handler'ları - Öncelik önemli!
-        application.add_handler(MessageHandler(
-            filters.TEXT & filters.ChatType.GROUPS, 
-            handle_group_message
-        ))
-        application.add_handler(MessageHandler(
-            filters.TEXT & filters.ChatType.PRIVATE, 
-            handle_private_message
-        ))
-
-        application.post_init = on_startup
+        application = build_application()
 
-        logger.info("🚀 AI Bot starting...")
-        application.run_polling(close_loop=False)
+        if WEBHOOK_URL:
+            logger.info(f"🚀 AI Bot starting (webhook {WEBHOOK_URL})...")
+            run_webhook(application)
+        else:
+            logger.info("🚀 AI Bot starting (polling)...")
+            application.run_polling(close_loop=False)
         
     except Exception as e:
         logger.error(f"Fatal error: {e}")
@@ -0,0 +1,208 @@
+"""Tüm aktif kullanıcı ve gruplara tek seferlik duyuru (kampanya) gönderimi.
+
+Kampanya ``campaigns`` tablosunda saklanır. Alıcılar chat_id sırasıyla
+sayfa sayfa okunur, böylece tablo hiçbir zaman tamamen belleğe alınmaz.
+Gönderimler FanoutSender üzerinden BROADCAST önceliğiyle gider ve global
+limitin interaktif trafiğe ayrılmayan kısmının tamamını kullanır.
+
+İlerleme (cursor) "bu chat_id'ye kadar her şey sonuçlandı" sınırıdır;
+eşzamanlı gönderimlerde sonuçlar sırasız geldiği için sınır ancak
+kesintisiz biten kısımla ilerler. Süreç yeniden başlarsa kampanya son
+checkpoint'ten devam eder; en fazla checkpoint anında uçuşta olan
+mesajlar ikinci kez gidebilir.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from db import CAMPAIGN_KINDS, MIN_CHAT_ID
+from sender import FanoutSender, SENT
+
+logger = logging.getLogger(__name__)
+
+
+class CampaignProgress:
+    __slots__ = ("campaign_id", "total", "sent", "failed", "started", "base")
+
+    def __init__(self, campaign_id: int, total: int, sent: int, failed: int):
+        self.campaign_id = campaign_id
+        self.total = total
+        self.sent = sent
+        self.failed = failed
+        self.started = time.monotonic()
+        # Hız hesabı sadece bu süreçte yapılan gönderimlerle
+        self.base = sent + failed
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed
+
+    def snapshot(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        rate = (self.done - self.base) / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total - self.done)
+        return {
+            "id": self.campaign_id,
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "remaining": remaining,
+            "rate_per_s": round(rate, 1),
+            "eta_s": int(remaining / rate) if rate > 0 else None,
+        }
+
+
+class CampaignRunner:
+    def __init__(self, send_once, claim, recipients, checkpoint, final_checkpoint, finish, release,
+                 owner: str, concurrency: int = 16, page_size: int = 500,
+                 checkpoint_s: float = 5.0, lease_s: int = 120, poll_interval: float = 10.0,
+                 max_attempts: int = 3):
+        """send_once(chat_id, text) -> (SENT | RETRY | FAILED, retry_delay_s, error)
+
+        claim/recipients/checkpoint/final_checkpoint/finish/release
+        async_db'deki kampanya fonksiyonlarıdır.
+        """
+        self._send_once = send_once
+        self._claim = claim
+        self._recipients = recipients
+        self._checkpoint = checkpoint
+        self._final_checkpoint = final_checkpoint
+        self._finish = finish
+        self._release = release
+        self.owner = owner
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.checkpoint_s = checkpoint_s
+        self.lease_s = lease_s
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.progress = None
+        self._wake = asyncio.Event()
+
+    def wake(self):
+        """Yeni ya da devam ettirilen kampanya; poll'u beklemeden bak."""
+        self._wake.set()
+
+    async def run(self):
+        while True:
+            try:
+                campaign = await self._claim(self.owner, int(time.time()), self.lease_s)
+                if campaign is not None:
+                    await self._deliver(campaign)
+                    continue
+            except Exception as e:
+                logger.error(f"Campaign runner error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _deliver(self, campaign):
+        campaign_id = campaign["id"]
+        text = campaign["text"]
+        kinds = CAMPAIGN_KINDS[campaign["target"]]
+        kind = campaign["cursor_kind"] or kinds[0]
+        cursor = campaign["cursor_chat_id"]
+        progress = self.progress = CampaignProgress(
+            campaign_id, campaign["total"], campaign["sent"], campaign["failed"],
+        )
+        logger.info(f"Campaign {campaign_id} started at {kind}:{cursor} ({progress.done}/{progress.total})")
+
+        sender = FanoutSender(
+            self._send_once, concurrency=self.concurrency,
+            max_pending=self.page_size * 2, max_attempts=self.max_attempts,
+        )
+        # Gönderim sırasıyla (kind, chat_id, sonuçlandı_mı); baştaki
+        # sonuçlanmışlar düşülerek cursor ilerletilir.
+        window = deque()
+        mark = [kind, cursor]
+        stopped = False
+
+        async def on_done(entry, outcome, delay, error):
+            entry[2] = True
+            if outcome == SENT:
+                progress.sent += 1
+            else:
+                progress.failed += 1
+
+        def advance():
+            while window and window[0][2]:
+                entry = window.popleft()
+                mark[0], mark[1] = entry[0], entry[1]
+
+        async def save() -> bool:
+            advance()
+            return await self._checkpoint(
+                campaign_id, self.owner, mark[0], mark[1], progress.sent, progress.failed,
+                int(time.time()) + self.lease_s,
+            )
+
+        async def park() -> bool:
+            """Uçuştakileri bitir, son ilerlemeyi yaz ve kirayı bırak.
+
+            Kampanya bu arada duraklatılmış/iptal edilmiş olsa da yazılır;
+            yoksa son checkpoint'ten sonrakiler devamda tekrar giderdi.
+            """
+            await sender.close()
+            advance()
+            saved = await self._final_checkpoint(
+                campaign_id, self.owner, mark[0], mark[1], progress.sent, progress.failed,
+            )
+            if not saved:
+                logger.warning(
+                    f"Campaign {campaign_id} lease was taken over; progress after the last checkpoint "
+                    f"({progress.snapshot()}) is not recorded"
+                )
+            await self._release(self.owner)
+            return saved
+
+        last_save = time.monotonic()
+        try:
+            for kind in kinds[kinds.index(kind):]:
+                while not stopped:
+                    page = await self._recipients(kind, cursor, self.page_size)
+                    if not page:
+                        break
+                    for chat_id in page:
+                        entry = [kind, chat_id, False]
+                        window.append(entry)
+                        await sender.submit(chat_id, text, lambda *r, entry=entry: on_done(entry, *r))
+                        if time.monotonic() - last_save >= self.checkpoint_s:
+                            last_save = time.monotonic()
+                            if not await save():
+                                stopped = True
+                                break
+                    cursor = page[-1]
+                if stopped:
+                    break
+                # Sonraki tür baştan başlar
+                cursor = MIN_CHAT_ID
+
+            if stopped:
+                if await park():
+                    logger.info(
+                        f"Campaign {campaign_id} paused or cancelled at {mark[0]}:{mark[1]} "
+                        f"({progress.done}/{progress.total})"
+                    )
+                return
+
+            await sender.join()
+            advance()
+            if not await self._finish(campaign_id, self.owner, mark[0], mark[1], progress.sent, progress.failed):
+                # Son partide durduruldu ya da kira başka sürece geçti; kampanya
+                # bitmiş sayılmaz
+                if await park():
+                    logger.info(
+                        f"Campaign {campaign_id} paused or cancelled before it finished at "
+                        f"{mark[0]}:{mark[1]} ({progress.done}/{progress.total})"
+                    )
+                return
+            logger.info(f"Campaign {campaign_id} finished: {progress.snapshot()}")
+        except asyncio.CancelledError:
+            # Kapanış: uçuştakileri bitir, ilerlemeyi yaz ve kirayı bırak
+            await park()
+            raise
+        finally:
+            self.progress = None
@@ -0,0 +1,218 @@
+"""Drip mesaj kataloğu: SQLite'ta kararlı id'ler, bellekte anlık görüntü.
+
+Kaynak ``messages.json``'dır; iki biçim kabul edilir::
+
+    ["Metin 1", "Metin 2"]                                  # eski düz liste
+    [{"id": 1, "text": {"tr": "Merhaba", "en": "Hello"}},
+     {"id": 2, "text": "Sadece varsayılan dilde"}]
+
+Dosya değiştiğinde ``db.sync_catalog`` ile tabloya yazılır; tablo
+doğrudan düzenlenirse de tetikleyiciler ``catalog_version``'ı artırır.
+Değişiklik mtime/boyut yoklamasıyla bulunur: inotify gibi platforma
+özgü bir bağımlılık gerekmez, bir yoklama bir ``stat`` ve tek satırlık
+bir SELECT'tir. Her iki durumda yeni bir ``Snapshot``
+kurulur ve tek atamayla değiştirilir: drip worker'ları partinin başında
+``catalog.snapshot``'ı bir kez okur, yarım yüklenmiş bir katalog görmez.
+
+Abonenin imleci son gönderilen mesajın id'sidir (``last_msg_id``);
+sıradaki mesaj, katalog sırasında (position) imlecin ardından gelen ilk
+aktif mesajdır. Araya mesaj eklemek ya da birini çıkarmak diğer
+abonelerin yerini kaydırmaz.
+
+Metinler ParseMode.HTML ile gönderildiği için yüklenirken Telegram'ın
+HTML alt kümesine göre doğrulanır; geçersiz olan metin kaçışlanarak düz
+metin olarak saklanır (gönderimde "can't parse entities" hatası olmaz).
+"""
+import asyncio
+import bisect
+import html
+import json
+import logging
+import os
+import re
+from html.parser import HTMLParser
+
+from async_db import catalog_snapshot, catalog_version, sync_catalog
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_TEXT = "👋 Merhaba! Bot aktif çalışıyor."
+
+# https://core.telegram.org/bots/api#html-style
+ALLOWED_TAGS = {
+    "b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "span", "tg-spoiler",
+    "a", "tg-emoji", "code", "pre", "blockquote",
+}
+_BARE_AMP = re.compile(r"&(?!(lt|gt|amp|quot|#\d+|#x[0-9a-fA-F]+);)")
+_BARE_LT = re.compile(r"<(?![/a-zA-Z])")
+
+
+class _TagChecker(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack = []
+        self.error = ""
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in ALLOWED_TAGS:
+            self.error = self.error or f"unsupported tag <{tag}>"
+        elif tag == "a" and not dict(attrs).get("href"):
+            self.error = self.error or "<a> without href"
+        self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.error = self.error or f"self-closing tag <{tag}/>"
+
+    def handle_endtag(self, tag):
+        if not self.stack or self.stack[-1] != tag:
+            self.error = self.error or f"unbalanced </{tag}>"
+        else:
+            self.stack.pop()
+
+
+def check_html(text: str) -> str:
+    """Telegram HTML'i olarak geçerliyse "", değilse hata açıklaması."""
+    if _BARE_AMP.search(text):
+        return "unescaped '&'"
+    if _BARE_LT.search(text):
+        return "unescaped '<'"
+    checker = _TagChecker()
+    checker.feed(text)
+    checker.close()
+    if checker.error:
+        return checker.error
+    if checker.stack:
+        return f"unclosed <{checker.stack[-1]}>"
+    return ""
+
+
+def prepare_html(text: str, label: str = "") -> str:
+    text = text.strip()
+    error = check_html(text)
+    if not error:
+        return text
+    logger.warning(f"Catalog message {label} is not valid HTML ({error}); sending it escaped")
+    return html.escape(text, quote=False)
+
+
+def parse_file(path: str, default_lang: str):
+    """Dosyayı (msg_id ya da None, {dil: html}) listesine çevirir."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        raise ValueError(f"{path} must be a JSON array")
+    entries = []
+    ids = set()
+    for index, item in enumerate(data):
+        msg_id = None
+        if isinstance(item, dict):
+            msg_id = item.get("id")
+            text = item.get("text")
+            if not isinstance(msg_id, int) or msg_id <= 0 or msg_id in ids:
+                raise ValueError(f"{path}[{index}]: id must be a unique positive integer")
+            ids.add(msg_id)
+        else:
+            text = item
+        variants = {default_lang: text} if isinstance(text, str) else text
+        if not isinstance(variants, dict) or not variants or \
+                not all(isinstance(v, str) and v.strip() for v in variants.values()):
+            raise ValueError(f"{path}[{index}]: text must be a non-empty string or {{lang: text}}")
+        label = f"#{msg_id or index + 1}"
+        entries.append((msg_id, {
+            lang: prepare_html(value, f"{label}/{lang}") for lang, value in variants.items()
+        }))
+    return entries
+
+
+class Snapshot:
+    """Değişmez katalog görüntüsü; sadece okunur, paylaşımı güvenlidir."""
+    __slots__ = ("version", "default_lang", "_order", "_positions", "_texts")
+
+    def __init__(self, version: int, rows, default_lang: str):
+        self.version = version
+        self.default_lang = default_lang
+        positions = {}
+        active = set()
+        texts = {}
+        for msg_id, position, is_active, lang, text in rows:
+            positions[msg_id] = position
+            if lang is not None:
+                texts.setdefault(msg_id, {})[lang] = text
+            if is_active:
+                active.add(msg_id)
+        # Metni olmayan mesaj gönderilemez
+        self._order = sorted((positions[msg_id], msg_id) for msg_id in active if msg_id in texts)
+        self._positions = positions
+        self._texts = texts
+
+    def __len__(self):
+        return len(self._order)
+
+    def text(self, msg_id: int, lang: str = None) -> str:
+        variants = self._texts[msg_id]
+        return variants.get(lang) or variants.get(self.default_lang) or next(iter(variants.values()))
+
+    def next_after(self, cursor: int, lang: str = None):
+        """İmleçten sonraki aktif mesaj: (msg_id, html). Sona gelince başa döner.
+
+        Katalog boşsa imleç değişmez ve yedek metin döner.
+        """
+        if not self._order:
+            return cursor, FALLBACK_TEXT
+        position = self._positions.get(cursor)
+        index = 0 if position is None else bisect.bisect_right(self._order, (position, cursor))
+        if index >= len(self._order):
+            index = 0
+        msg_id = self._order[index][1]
+        return msg_id, self.text(msg_id, lang)
+
+
+class Catalog:
+    def __init__(self, path: str, default_lang: str = "tr"):
+        self.path = path
+        self.default_lang = default_lang
+        self.snapshot = Snapshot(-1, (), default_lang)
+        self._file_stamp = None
+        self.reloads = 0
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    async def refresh(self) -> bool:
+        """Dosya ya da tablo değiştiyse anlık görüntüyü yeniler.
+
+        Dosya okunamazsa (yarım yazılmış JSON vb.) mevcut katalog korunur;
+        dosya tekrar değişince yeniden denenir.
+        """
+        stamp = self._stamp()
+        if stamp is not None and stamp != self._file_stamp:
+            try:
+                entries = await asyncio.get_running_loop().run_in_executor(
+                    None, parse_file, self.path, self.default_lang,
+                )
+            except (OSError, ValueError) as e:
+                self._file_stamp = stamp
+                logger.error(f"Catalog file {self.path} not loaded: {e}")
+            else:
+                counts = await sync_catalog(entries, self.default_lang)
+                self._file_stamp = stamp
+                if any(counts.values()):
+                    logger.info(f"Catalog file synced: {counts}")
+        elif stamp is None and self._file_stamp is None:
+            logger.warning(f"{self.path} not found; using the catalog table as is")
+            self._file_stamp = ()
+
+        if await catalog_version() == self.snapshot.version:
+            return False
+        version, rows = await catalog_snapshot()
+        self.snapshot = Snapshot(version, rows, self.default_lang)
+        self.reloads += 1
+        logger.info(f"Catalog loaded: version {version}, {len(self.snapshot)} active messages")
+        return True
+
+    def stats(self) -> dict:
+        return {"version": self.snapshot.version, "messages": len(self.snapshot), "reloads": self.reloads}
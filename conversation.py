@@ -0,0 +1,126 @@
+"""Sohbet başına kısa bağlam: halka tampon ve token bütçesi.
+
+Her sohbet için son ``max_turns`` tur bir ``deque``'da tutulur; kayıtlar
+``__slots__``'lu ``Turn`` nesneleridir (sözlük yok, tur başına ~100 bayt
++ metin). Bellekte en fazla ``max_chats`` sohbet kalır; en uzun süre
+sessiz kalan atılır (LRU). ``ttl_s``'den eski turlar isteğe girmez.
+
+İstek hazırlanırken turlar yeniden eskiye doğru ``max_tokens``
+dolana kadar alınır; en yeni tur bütçeyi aşsa bile gönderilir. Böylece
+istem boyutu sohbet uzadıkça büyümez. Token sayısı yaklaşık hesaplanır
+(~4 karakter/token); tokenizer çağrısı bir ağ isteği olurdu.
+
+Gemini çok turlu isteklerde ardışık aynı rolü sevmez ve ilk içeriğin
+kullanıcıdan gelmesini ister: ardışık turlar tek içerikte birleşir,
+baştaki model turları atılır.
+
+Sabit talimat burada değil, modelde tutulur (bkz. ``ai_client.LazyModel``).
+"""
+import sys
+import time
+from collections import OrderedDict, deque
+
+USER = "user"
+MODEL = "model"
+
+CHARS_PER_TOKEN = 4
+MAX_TURN_CHARS = 1000
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class Turn:
+    __slots__ = ("role", "text", "tokens", "ts")
+
+    def __init__(self, role: str, text: str, ts: float):
+        self.role = role
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.ts = ts
+
+
+class _Chat:
+    __slots__ = ("turns",)
+
+    def __init__(self, size: int):
+        self.turns = deque(maxlen=size)
+
+
+class ConversationStore:
+    def __init__(self, max_turns: int = 20, max_tokens: int = 600, max_chats: int = 2000,
+                 ttl_s: float = 6 * 3600):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.max_chats = max_chats
+        self.ttl_s = ttl_s
+        self._chats = OrderedDict()
+        self.evictions = 0
+
+    def add(self, chat_id: int, role: str, text: str, now: float = None):
+        """Turu sohbetin sonuna ekler; en eski tur ve sohbet gerekirse düşer."""
+        now = time.time() if now is None else now
+        chat = self._chats.pop(chat_id, None)
+        if chat is None:
+            chat = _Chat(self.max_turns)
+        self._chats[chat_id] = chat
+        while len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
+            self.evictions += 1
+        chat.turns.append(Turn(role, text.strip()[:MAX_TURN_CHARS], now))
+
+    def forget(self, chat_id: int):
+        self._chats.pop(chat_id, None)
+
+    def _pick(self, chat_id: int, now: float) -> list:
+        """Bütçeye ve TTL'e sığan son turlar, yeniden eskiye."""
+        chat = self._chats.get(chat_id)
+        picked = []
+        budget = self.max_tokens
+        if chat is not None:
+            for turn in reversed(chat.turns):
+                if now - turn.ts > self.ttl_s or (picked and turn.tokens > budget):
+                    break
+                picked.append(turn)
+                budget -= turn.tokens
+        return picked
+
+    def turn_count(self, chat_id: int, now: float = None) -> int:
+        """``contents``'e girecek tur sayısı; 1 ise istek sadece son mesajdır."""
+        return len(self._pick(chat_id, time.time() if now is None else now))
+
+    def contents(self, chat_id: int, now: float = None) -> list:
+        """Gemini ``contents`` listesi: bütçeye sığan son turlar."""
+        now = time.time() if now is None else now
+        merged = []
+        for turn in reversed(self._pick(chat_id, now)):
+            if merged and merged[-1]["role"] == turn.role:
+                merged[-1]["parts"][0] += "\n" + turn.text
+            elif merged or turn.role == USER:
+                merged.append({"role": turn.role, "parts": [turn.text]})
+        return merged
+
+    def prompt_tokens(self, contents: list) -> int:
+        return sum(estimate_tokens(part) for content in contents for part in content["parts"])
+
+    def memory_bytes(self) -> int:
+        """Tampon, kayıt ve metinlerin yaklaşık bellek kullanımı."""
+        total = sys.getsizeof(self._chats)
+        for chat in self._chats.values():
+            total += sys.getsizeof(chat) + sys.getsizeof(chat.turns)
+            for turn in chat.turns:
+                total += sys.getsizeof(turn) + sys.getsizeof(turn.text)
+        return total
+
+    def stats(self) -> dict:
+        chats = len(self._chats)
+        turns = sum(len(chat.turns) for chat in self._chats.values())
+        memory = self.memory_bytes()
+        return {
+            "chats": chats,
+            "turns": turns,
+            "evictions": self.evictions,
+            "bytes": memory,
+            "bytes_per_chat": memory // chats if chats else 0,
+        }
@@ -0,0 +1,58 @@
+"""Grup bazında AI yanıt cooldown'ları.
+
+Kayıtlar son yanıt zamanına göre sıralı bir OrderedDict'te tutulur;
+süresi dolanlar baştan atılır, kayıt sayısı ``max_entries`` ile sınırlıdır.
+Değişen kayıtlar ``dirty`` olarak işaretlenir ve arka planda SQLite'a
+yazılır; sıcak yolda (should_respond_to_message) hiçbir I/O yapılmaz.
+"""
+import time
+from collections import OrderedDict
+
+
+class CooldownStore:
+    def __init__(self, ttl: float, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._dirty = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self, now: float):
+        while self._entries:
+            chat_id, ts = next(iter(self._entries.items()))
+            if now - ts < self.ttl and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[chat_id]
+
+    def active(self, chat_id: int, now: float = None) -> bool:
+        """Sohbet hâlâ cooldown'da mı?"""
+        now = time.time() if now is None else now
+        self._evict(now)
+        ts = self._entries.get(chat_id)
+        return ts is not None and now - ts < self.ttl
+
+    def touch(self, chat_id: int, ts: float = None):
+        ts = time.time() if ts is None else ts
+        self._entries.pop(chat_id, None)
+        self._entries[chat_id] = ts
+        self._dirty[chat_id] = ts
+        self._evict(ts)
+
+    def load(self, rows):
+        """(chat_id, ts) satırlarını eskiden yeniye yükle."""
+        now = time.time()
+        for chat_id, ts in sorted(rows, key=lambda r: r[1]):
+            self._entries.pop(chat_id, None)
+            self._entries[chat_id] = ts
+        self._evict(now)
+
+    def drain_dirty(self):
+        """Son checkpoint'ten beri değişen (chat_id, ts) satırları."""
+        rows, self._dirty = list(self._dirty.items()), {}
+        return rows
+
+    def restore_dirty(self, rows):
+        for chat_id, ts in rows:
+            self._dirty.setdefault(chat_id, ts)
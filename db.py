@@ -1,18 +1,71 @@
+import json
+import logging
 import sqlite3
+import threading
 import time
+from array import array
 from pathlib import Path
 
 DB_PATH = Path("data/users.db")
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+logger = logging.getLogger(__name__)
+
+# Her bağlantıda bir kez uygulanan ayarlar
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",      # ~16 MB sayfa önbelleği
+    "PRAGMA mmap_size=268435456",    # 256 MB
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+STATEMENT_CACHE_SIZE = 128
+
+# Thread başına uzun ömürlü bağlantılar; close_db() hepsini kapatır
+_local = threading.local()
+_conns = []
+_conns_lock = threading.Lock()
+_generation = 0
+
+def _connect():
+    conn = sqlite3.connect(
+        DB_PATH,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def init_db():
-    with get_conn() as conn:
-        conn.execute("""
+def get_conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.generation != _generation:
+        conn = _connect()
+        with _conns_lock:
+            _conns.append(conn)
+            _local.conn = conn
+            _local.generation = _generation
+    return conn
+
+def close_db():
+    global _generation
+    with _conns_lock:
+        conns, _conns[:] = list(_conns), []
+        _generation += 1
+    for conn in conns:
+        try:
+            conn.execute("PRAGMA optimize")
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+# Şema göçleri; sıra numarası PRAGMA user_version'a yazılır. Sadece sona ekle.
+MIGRATIONS = (
+    # 1: temel tablolar
+    (
+        """
         CREATE TABLE IF NOT EXISTS users (
             chat_id INTEGER PRIMARY KEY,
             username TEXT,
@@ -24,9 +77,8 @@ def init_db():
             msg_index INTEGER DEFAULT 0,
             created_ts INTEGER DEFAULT (strftime('%s','now'))
         )
-        """)
-        
-        conn.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS groups (
             chat_id INTEGER PRIMARY KEY,
             title TEXT,
@@ -36,84 +88,765 @@ def init_db():
             msg_index INTEGER DEFAULT 0,
             created_ts INTEGER DEFAULT (strftime('%s','now'))
         )
-        """)
-        conn.commit()
+        """,
+    ),
+    # 2: due kuyruğu; NULL yerine 0 (hemen gönder) ve kısmi indeksler.
+    # Böylece due sorguları sıralamayı da indeksten alır.
+    (
+        "UPDATE users SET next_due_ts=0 WHERE next_due_ts IS NULL",
+        "UPDATE groups SET next_due_ts=0 WHERE next_due_ts IS NULL",
+        "CREATE INDEX IF NOT EXISTS idx_users_due ON users(next_due_ts) WHERE opted_out=0",
+        "CREATE INDEX IF NOT EXISTS idx_groups_due ON groups(next_due_ts) WHERE active=1",
+    ),
+    # 3: AI yanıt önbelleğinin kalıcı katmanı
+    (
+        """
+        CREATE TABLE IF NOT EXISTS ai_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            created_ts INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+    ),
+    # 4: grup AI yanıt cooldown'larının checkpoint'i
+    (
+        """
+        CREATE TABLE IF NOT EXISTS cooldowns (
+            chat_id INTEGER PRIMARY KEY,
+            last_response_ts REAL NOT NULL
+        )
+        """,
+    ),
+    # 5: çoklu süreç için kiralama (lease) kolonları
+    (
+        "ALTER TABLE users ADD COLUMN lease_owner TEXT",
+        "ALTER TABLE users ADD COLUMN lease_until INTEGER",
+        "ALTER TABLE groups ADD COLUMN lease_owner TEXT",
+        "ALTER TABLE groups ADD COLUMN lease_until INTEGER",
+    ),
+    # 6: kalıcı gönderim kuyruğu (outbox) ve ölü mektuplar
+    (
+        """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_ts INTEGER NOT NULL,
+            last_error TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            created_ts INTEGER NOT NULL,
+            lease_owner TEXT,
+            lease_until INTEGER
+        )
+        """,
+        # Sohbet başına tek bekleyen drip mesajı; yanıtlar (reply) sınırsız
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_chat ON outbox(kind, chat_id)
+        WHERE status='pending' AND kind!='reply'
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(next_attempt_ts) WHERE status='pending'",
+    ),
+    # 7: toplu duyuru kampanyaları; cursor son teslim edilen (kind, chat_id)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS campaigns (
+            id INTEGER PRIMARY KEY,
+            text TEXT NOT NULL,
+            target TEXT NOT NULL DEFAULT 'all',
+            status TEXT NOT NULL DEFAULT 'running',
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            cursor_kind TEXT,
+            cursor_chat_id INTEGER,
+            created_by INTEGER,
+            created_ts INTEGER NOT NULL,
+            started_ts INTEGER,
+            finished_ts INTEGER,
+            lease_owner TEXT,
+            lease_until INTEGER
+        )
+        """,
+    ),
+    # 8: sohbet başına saat dilimi ve sessiz saatler; quiet_mask UTC saat
+    # bitleridir (bit h açık = UTC h'de gönderme)
+    (
+        "ALTER TABLE users ADD COLUMN tz TEXT",
+        "ALTER TABLE users ADD COLUMN quiet_start INTEGER",
+        "ALTER TABLE users ADD COLUMN quiet_end INTEGER",
+        "ALTER TABLE users ADD COLUMN quiet_mask INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE groups ADD COLUMN tz TEXT",
+        "ALTER TABLE groups ADD COLUMN quiet_start INTEGER",
+        "ALTER TABLE groups ADD COLUMN quiet_end INTEGER",
+        "ALTER TABLE groups ADD COLUMN quiet_mask INTEGER NOT NULL DEFAULT 0",
+    ),
+    # 9: mesaj kataloğu; kararlı id, dil varyantları ve id tabanlı imleç.
+    # Katalogdaki her değişiklik tetikleyiciyle catalog_version'ı artırır;
+    # süreçler sürümü yoklayarak anlık görüntülerini yeniler. İlk içe
+    # aktarmada id = sıra + 1 olduğundan eski msg_index imleç olarak kalır.
+    # msg_index bundan sonra kuyruğa yazılan mesaj sayısıdır; eski değer
+    # katalog boyunda sarılan bir konumdu ve gönderilen outbox satırları
+    # silindiğinden gerçek sayı geri hesaplanamaz, bu yüzden sıfırlanır.
+    (
+        """
+        CREATE TABLE IF NOT EXISTS catalog (
+            msg_id INTEGER PRIMARY KEY,
+            position INTEGER NOT NULL,
+            active INTEGER NOT NULL DEFAULT 1,
+            updated_ts INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS catalog_text (
+            msg_id INTEGER NOT NULL,
+            lang TEXT NOT NULL,
+            html TEXT NOT NULL,
+            PRIMARY KEY (msg_id, lang)
+        ) WITHOUT ROWID
+        """,
+        "CREATE TABLE IF NOT EXISTS catalog_version (id INTEGER PRIMARY KEY CHECK (id=1), version INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)",
+        *(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()} AFTER {event} ON {table}
+            BEGIN UPDATE catalog_version SET version=version+1 WHERE id=1; END
+            """
+            for table in ("catalog", "catalog_text") for event in ("INSERT", "UPDATE", "DELETE")
+        ),
+        "ALTER TABLE users ADD COLUMN last_msg_id INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE users ADD COLUMN lang TEXT",
+        "ALTER TABLE groups ADD COLUMN last_msg_id INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE groups ADD COLUMN lang TEXT",
+        "UPDATE users SET last_msg_id=coalesce(msg_index, 0), msg_index=0",
+        "UPDATE groups SET last_msg_id=coalesce(msg_index, 0), msg_index=0",
+    ),
+)
 
-def upsert_user(chat_id: int, username: str, first: str, last: str):
-    with get_conn() as conn:
-        conn.execute("""
-            INSERT INTO users (chat_id, username, first_name, last_name, opted_out)
-            VALUES (?, ?, ?, ?, 0)
-            ON CONFLICT(chat_id) DO UPDATE SET
-                username=excluded.username,
-                first_name=excluded.first_name,
-                last_name=excluded.last_name,
-                opted_out=0
-            """, (chat_id, username, first, last))
-        conn.commit()
+# Zamanlayıcı yüklemesinde "sınır yok" değeri
+FAR_FUTURE_TS = 2 ** 62
+
+# Sorgular modül seviyesinde sabit; aynı metin sqlite3'ün statement
+# önbelleğinden tekrar derlenmeden kullanılır.
+SQL_UPSERT_USER = """
+    INSERT INTO users (chat_id, username, first_name, last_name, opted_out, next_due_ts, lang)
+    VALUES (?, ?, ?, ?, 0, 0, ?)
+    ON CONFLICT(chat_id) DO UPDATE SET
+        username=excluded.username,
+        first_name=excluded.first_name,
+        last_name=excluded.last_name,
+        opted_out=0,
+        lang=coalesce(excluded.lang, lang)
+    RETURNING next_due_ts
+"""
+SQL_USER_OPTED_OUT = "SELECT opted_out FROM users WHERE chat_id=?"
+# Durum gerçekten değiştiyse next_due_ts döner (planlayıcıdaki slot için)
+SQL_SET_OPTOUT = "UPDATE users SET opted_out=? WHERE chat_id=? AND opted_out IS NOT ? RETURNING next_due_ts"
+SQL_GET_USER = "SELECT * FROM users WHERE chat_id=?"
+SQL_DUE_USERS = """
+    SELECT * FROM users
+    WHERE opted_out=0 AND next_due_ts<=? AND (quiet_mask >> ?) & 1 = 0
+    ORDER BY next_due_ts
+    LIMIT ?
+"""
+SQL_ACTIVE_USERS_BY_IDS = """
+    SELECT * FROM users
+    WHERE chat_id IN (SELECT value FROM json_each(?)) AND opted_out=0
+"""
+SQL_USER_SCHEDULE = """
+    SELECT chat_id, next_due_ts FROM users
+    WHERE opted_out=0 AND next_due_ts<=? AND abs(chat_id) % ? = ?
+"""
+# Kiralama: sadece due, aktif, sessiz saatinde olmayan ve kiralanmamış (ya
+# da kirası dolmuş / zaten bizim olan) satırlar alınır. Tek UPDATE olduğu
+# için süreçler arası atomik.
+SQL_CLAIM_USERS = """
+    UPDATE users SET lease_owner=?, lease_until=?
+    WHERE chat_id IN (SELECT value FROM json_each(?))
+      AND opted_out=0 AND next_due_ts<=? AND (quiet_mask >> ?) & 1 = 0
+      AND (lease_owner IS NULL OR lease_until<=? OR lease_owner=?)
+    RETURNING *
+"""
+SQL_RELEASE_USERS = "UPDATE users SET lease_owner=NULL, lease_until=NULL WHERE lease_owner=?"
+SQL_UPSERT_GROUP = """
+    INSERT INTO groups (chat_id, title, active, next_due_ts)
+    VALUES (?, ?, 1, 0)
+    ON CONFLICT(chat_id) DO UPDATE SET
+        title=excluded.title,
+        active=1
+    RETURNING next_due_ts
+"""
+SQL_GROUP_ACTIVE = "SELECT active FROM groups WHERE chat_id=?"
+SQL_SET_GROUP_ACTIVE = "UPDATE groups SET active=? WHERE chat_id=? AND active IS NOT ? RETURNING next_due_ts"
+SQL_DUE_GROUPS = """
+    SELECT * FROM groups
+    WHERE active=1 AND next_due_ts<=? AND (quiet_mask >> ?) & 1 = 0
+    ORDER BY next_due_ts
+    LIMIT ?
+"""
+SQL_ACTIVE_GROUPS_BY_IDS = """
+    SELECT * FROM groups
+    WHERE chat_id IN (SELECT value FROM json_each(?)) AND active=1
+"""
+SQL_GROUP_SCHEDULE = """
+    SELECT chat_id, next_due_ts FROM groups
+    WHERE active=1 AND next_due_ts<=? AND abs(chat_id) % ? = ?
+"""
+SQL_CLAIM_GROUPS = """
+    UPDATE groups SET lease_owner=?, lease_until=?
+    WHERE chat_id IN (SELECT value FROM json_each(?))
+      AND active=1 AND next_due_ts<=? AND (quiet_mask >> ?) & 1 = 0
+      AND (lease_owner IS NULL OR lease_until<=? OR lease_owner=?)
+    RETURNING *
+"""
+SQL_RELEASE_GROUPS = "UPDATE groups SET lease_owner=NULL, lease_until=NULL WHERE lease_owner=?"
+
+# Outbox: drip worker'ları sadece kuyruğa yazar, gönderimi dispatcher yapar.
+# Abonenin sıradaki zamanı ve imleci (son mesaj id'si) kuyruğa yazılırken
+# ilerletilir (aynı transaction), last_sent_ts ise teslimatta güncellenir.
+# msg_index artık konum değil, kuyruğa yazılan mesaj sayısıdır.
+SQL_ADVANCE_USER = """
+    UPDATE users SET next_due_ts=?, last_msg_id=?, msg_index=coalesce(msg_index, 0)+1,
+        lease_owner=NULL, lease_until=NULL
+    WHERE chat_id=? AND (lease_owner IS NULL OR lease_owner=?)
+"""
+SQL_ADVANCE_GROUP = """
+    UPDATE groups SET next_due_ts=?, last_msg_id=?, msg_index=coalesce(msg_index, 0)+1,
+        lease_owner=NULL, lease_until=NULL
+    WHERE chat_id=? AND (lease_owner IS NULL OR lease_owner=?)
+"""
+# Sohbetin bekleyen drip mesajı varken yenisi eklenmez (idx_outbox_chat);
+# imleç yerinde kalır, abone sadece ileri bir zamana ertelenir.
+SQL_POSTPONE_USER = """
+    UPDATE users SET next_due_ts=?, lease_owner=NULL, lease_until=NULL
+    WHERE chat_id=? AND (lease_owner IS NULL OR lease_owner=?)
+"""
+SQL_POSTPONE_GROUP = """
+    UPDATE groups SET next_due_ts=?, lease_owner=NULL, lease_until=NULL
+    WHERE chat_id=? AND (lease_owner IS NULL OR lease_owner=?)
+"""
+SQL_UNENQUEUE = "DELETE FROM outbox WHERE id=?"
+SQL_ENQUEUE = """
+    INSERT OR IGNORE INTO outbox (kind, chat_id, text, attempts, next_attempt_ts, last_error, created_ts)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_CLAIM_OUTBOX = """
+    UPDATE outbox SET lease_owner=?, lease_until=?
+    WHERE id IN (
+        SELECT id FROM outbox
+        WHERE status='pending' AND next_attempt_ts<=?
+          AND (lease_owner IS NULL OR lease_until<=?)
+        ORDER BY next_attempt_ts
+        LIMIT ?
+    )
+    RETURNING *
+"""
+SQL_OUTBOX_DONE = "DELETE FROM outbox WHERE id=? AND lease_owner IS ?"
+SQL_OUTBOX_RETRY = """
+    UPDATE outbox SET attempts=?, next_attempt_ts=?, last_error=?, lease_owner=NULL, lease_until=NULL
+    WHERE id=? AND lease_owner IS ?
+"""
+SQL_OUTBOX_DEAD = """
+    UPDATE outbox SET status='dead', attempts=?, last_error=?, lease_owner=NULL, lease_until=NULL
+    WHERE id=? AND lease_owner IS ?
+"""
+SQL_RELEASE_OUTBOX = "UPDATE outbox SET lease_owner=NULL, lease_until=NULL WHERE lease_owner=?"
+SQL_PRUNE_OUTBOX = "DELETE FROM outbox WHERE status='dead' AND created_ts<?"
+SQL_OUTBOX_COUNTS = "SELECT status, count(*) FROM outbox GROUP BY status"
+SQL_USER_DELIVERED = "UPDATE users SET last_sent_ts=? WHERE chat_id=?"
+SQL_GROUP_DELIVERED = "UPDATE groups SET last_sent_ts=? WHERE chat_id=?"
+
+_ADVANCE = {"user": SQL_ADVANCE_USER, "group": SQL_ADVANCE_GROUP}
+_POSTPONE = {"user": SQL_POSTPONE_USER, "group": SQL_POSTPONE_GROUP}
+_DELIVERED = {"user": SQL_USER_DELIVERED, "group": SQL_GROUP_DELIVERED}
+
+# Kampanyalar: alıcılar chat_id sırasıyla sayfa sayfa (keyset) okunur,
+# tablo hiçbir zaman tamamen belleğe alınmaz.
+CAMPAIGN_KINDS = {"all": ("user", "group"), "users": ("user",), "groups": ("group",)}
+MIN_CHAT_ID = -(2 ** 63)
+SQL_CREATE_CAMPAIGN = """
+    INSERT INTO campaigns (text, target, total, created_by, created_ts, cursor_kind, cursor_chat_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_GET_CAMPAIGN = "SELECT * FROM campaigns WHERE id=?"
+SQL_RECENT_CAMPAIGNS = "SELECT * FROM campaigns ORDER BY id DESC LIMIT ?"
+SQL_CLAIM_CAMPAIGN = """
+    UPDATE campaigns SET lease_owner=?, lease_until=?, started_ts=coalesce(started_ts, ?)
+    WHERE id=(
+        SELECT id FROM campaigns
+        WHERE status='running' AND (lease_owner IS NULL OR lease_until<=? OR lease_owner=?)
+        ORDER BY id LIMIT 1
+    )
+    RETURNING *
+"""
+# Kira bizde ve kampanya hâlâ çalışıyorsa yazılır; 0 satır = durdurulmuş
+SQL_CHECKPOINT_CAMPAIGN = """
+    UPDATE campaigns SET cursor_kind=?, cursor_chat_id=?, sent=?, failed=?, lease_until=?
+    WHERE id=? AND lease_owner=? AND status='running'
+"""
+# Durdurma/kapanışta son ilerleme: kampanya bu arada duraklatılmış ya da
+# iptal edilmiş olabilir; kira hâlâ bizdeyse yine de yazılır
+SQL_FINAL_CHECKPOINT_CAMPAIGN = """
+    UPDATE campaigns SET cursor_kind=?, cursor_chat_id=?, sent=?, failed=?
+    WHERE id=? AND lease_owner=? AND status IN ('running', 'paused', 'cancelled')
+"""
+SQL_FINISH_CAMPAIGN = """
+    UPDATE campaigns SET cursor_kind=?, cursor_chat_id=?, sent=?, failed=?, status='done',
+        finished_ts=?, lease_owner=NULL, lease_until=NULL
+    WHERE id=? AND lease_owner=? AND status='running'
+"""
+SQL_SET_CAMPAIGN_STATUS = """
+    UPDATE campaigns SET status=?, finished_ts=CASE WHEN ?='cancelled' THEN ? ELSE finished_ts END
+    WHERE id=? AND status IN ('running', 'paused')
+"""
+SQL_RELEASE_CAMPAIGNS = "UPDATE campaigns SET lease_owner=NULL, lease_until=NULL WHERE lease_owner=?"
+SQL_COUNT_RECIPIENTS = {
+    "user": "SELECT count(*) FROM users WHERE opted_out=0",
+    "group": "SELECT count(*) FROM groups WHERE active=1",
+}
+SQL_RECIPIENTS_PAGE = {
+    "user": "SELECT chat_id FROM users WHERE chat_id>? AND opted_out=0 ORDER BY chat_id LIMIT ?",
+    "group": "SELECT chat_id FROM groups WHERE chat_id>? AND active=1 ORDER BY chat_id LIMIT ?",
+}
+
+# Saat dilimi / sessiz saatler; tablo adı sabit sözlükten gelir
+_TABLES = {"user": "users", "group": "groups"}
+SQL_SET_TZ = {
+    kind: f"UPDATE {table} SET tz=?, quiet_mask=? WHERE chat_id=?" for kind, table in _TABLES.items()
+}
+SQL_SET_QUIET = {
+    kind: f"UPDATE {table} SET quiet_start=?, quiet_end=?, quiet_mask=? WHERE chat_id=?"
+    for kind, table in _TABLES.items()
+}
+SQL_QUIET_SETTINGS = {
+    kind: f"SELECT DISTINCT tz, quiet_start, quiet_end FROM {table} WHERE quiet_start IS NOT NULL"
+    for kind, table in _TABLES.items()
+}
+SQL_UPDATE_QUIET_MASK = {
+    kind: f"""
+        UPDATE {table} SET quiet_mask=?
+        WHERE tz IS ? AND quiet_start=? AND quiet_end=? AND quiet_mask!=?
+    """
+    for kind, table in _TABLES.items()
+}
+SQL_GET_CHAT = {kind: f"SELECT * FROM {table} WHERE chat_id=?" for kind, table in _TABLES.items()}
+
+# Mesaj kataloğu
+SQL_CATALOG_VERSION = "SELECT version FROM catalog_version WHERE id=1"
+SQL_CATALOG_ROWS = """
+    SELECT c.msg_id, c.position, c.active, t.lang, t.html
+    FROM catalog c LEFT JOIN catalog_text t ON t.msg_id=c.msg_id
+"""
+SQL_CATALOG_MESSAGES = "SELECT msg_id, position, active FROM catalog"
+SQL_CATALOG_TEXTS = "SELECT msg_id, lang, html FROM catalog_text"
+SQL_UPSERT_CATALOG_MESSAGE = """
+    INSERT INTO catalog (msg_id, position, active, updated_ts) VALUES (?, ?, 1, ?)
+    ON CONFLICT(msg_id) DO UPDATE SET
+        position=excluded.position,
+        active=1,
+        updated_ts=excluded.updated_ts
+"""
+SQL_TOUCH_CATALOG_MESSAGE = "UPDATE catalog SET updated_ts=? WHERE msg_id=?"
+SQL_DEACTIVATE_CATALOG_MESSAGE = "UPDATE catalog SET active=0, updated_ts=? WHERE msg_id=?"
+SQL_UPSERT_CATALOG_TEXT = """
+    INSERT INTO catalog_text (msg_id, lang, html) VALUES (?, ?, ?)
+    ON CONFLICT(msg_id, lang) DO UPDATE SET html=excluded.html
+"""
+SQL_DELETE_CATALOG_TEXT = "DELETE FROM catalog_text WHERE msg_id=? AND lang=?"
+
+def _utc_hour(ts: int) -> int:
+    return int(ts // 3600) % 24
+
+def _migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version={target}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info(f"Database migrated to schema version {target}")
+
+def _check_query_plans(conn):
+    """Due sorgularının indeks aralık taraması yaptığını doğrula."""
+    for name, sql, params, index in (
+        ("due_users", SQL_DUE_USERS, (0, 0, 1), "idx_users_due"),
+        ("due_groups", SQL_DUE_GROUPS, (0, 0, 1), "idx_groups_due"),
+        ("claim_outbox", SQL_CLAIM_OUTBOX, (None, 0, 0, 0, 1), "idx_outbox_due"),
+    ):
+        plan = [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        if not any(index in detail for detail in plan) or any("TEMP B-TREE" in detail for detail in plan):
+            logger.warning(f"{name} is not using {index}: {plan}")
+
+def _schedule(sql, until_ts, shard):
+    shard_index, shard_count = shard or (0, 1)
+    chat_ids, due_ts = array("q"), array("q")
+    params = (FAR_FUTURE_TS if until_ts is None else until_ts, shard_count, shard_index)
+    for chat_id, next_due_ts in get_conn().execute(sql, params):
+        chat_ids.append(chat_id)
+        due_ts.append(next_due_ts or 0)
+    return chat_ids, due_ts
+
+SQL_GET_CACHED_RESPONSE = "SELECT response, created_ts FROM ai_cache WHERE key=? AND created_ts>=?"
+SQL_PUT_CACHED_RESPONSE = "INSERT OR REPLACE INTO ai_cache (key, response, created_ts) VALUES (?, ?, ?)"
+SQL_PRUNE_CACHED_RESPONSES = "DELETE FROM ai_cache WHERE created_ts<?"
+
+SQL_LOAD_COOLDOWNS = "SELECT chat_id, last_response_ts FROM cooldowns WHERE last_response_ts>=?"
+SQL_SAVE_COOLDOWN = """
+    INSERT INTO cooldowns (chat_id, last_response_ts) VALUES (?, ?)
+    ON CONFLICT(chat_id) DO UPDATE SET last_response_ts=excluded.last_response_ts
+"""
+SQL_PRUNE_COOLDOWNS = "DELETE FROM cooldowns WHERE last_response_ts<?"
+
+def init_db():
+    conn = get_conn()
+    _migrate(conn)
+    _check_query_plans(conn)
+
+def upsert_user(chat_id: int, username: str, first: str, last: str, lang: str = None) -> tuple:
+    """Aboneyi ekler ya da yeniden etkinleştirir.
+
+    (next_due_ts, resumed) döndürür; yeni abonenin zamanı 0'dır, resumed
+    abonelik iptalden dönüldüyse True'dur.
+    """
+    conn = get_conn()
+    with conn:
+        before = conn.execute(SQL_USER_OPTED_OUT, (chat_id,)).fetchone()
+        next_due = conn.execute(SQL_UPSERT_USER, (chat_id, username, first, last, lang)).fetchone()[0] or 0
+    return next_due, bool(before and before[0])
 
 def set_optout(chat_id: int, value: bool = True):
-    with get_conn() as conn:
-        conn.execute("UPDATE users SET opted_out=? WHERE chat_id=?", 
-                    (1 if value else 0, chat_id))
-        conn.commit()
+    """Durum değiştiyse aboneliğin next_due_ts'ini, değişmediyse None döndürür."""
+    flag = 1 if value else 0
+    conn = get_conn()
+    with conn:
+        row = conn.execute(SQL_SET_OPTOUT, (flag, chat_id, flag)).fetchone()
+    return (row[0] or 0) if row else None
 
 def get_user(chat_id: int):
-    with get_conn() as conn:
-        cur = conn.execute("SELECT * FROM users WHERE chat_id=?", (chat_id,))
-        return cur.fetchone()
+    return get_conn().execute(SQL_GET_USER, (chat_id,)).fetchone()
 
 def due_users(now_ts: int, limit: int = 500):
-    with get_conn() as conn:
-        cur = conn.execute("""
-            SELECT * FROM users 
-            WHERE opted_out=0 AND (next_due_ts IS NULL OR next_due_ts<=?)
-            ORDER BY next_due_ts IS NOT NULL, next_due_ts
-            LIMIT ?
-            """, (now_ts, limit))
-        return cur.fetchall()
-
-def mark_sent(chat_id: int, next_due_ts: int, new_index: int):
-    with get_conn() as conn:
-        conn.execute("""
-            UPDATE users 
-            SET last_sent_ts=?, next_due_ts=?, msg_index=? 
-            WHERE chat_id=?
-            """, (int(time.time()), next_due_ts, new_index, chat_id))
-        conn.commit()
+    return get_conn().execute(SQL_DUE_USERS, (now_ts, _utc_hour(now_ts), limit)).fetchall()
 
-def upsert_group(chat_id: int, title: str):
-    with get_conn() as conn:
-        conn.execute("""
-        INSERT INTO groups (chat_id, title, active)
-        VALUES (?, ?, 1)
-        ON CONFLICT(chat_id) DO UPDATE SET
-            title=excluded.title,
-            active=1
-        """, (chat_id, title))
-        conn.commit()
+def active_users_by_ids(chat_ids):
+    return get_conn().execute(SQL_ACTIVE_USERS_BY_IDS, (json.dumps(list(chat_ids)),)).fetchall()
+
+def user_schedule(until_ts: int = None, shard=None):
+    """Aktif kullanıcıların (chat_id, next_due_ts) dizileri.
+
+    until_ts verilirse sadece o ana kadar due olanlar; shard=(index, count)
+    verilirse sadece abs(chat_id) % count == index olanlar döner.
+    """
+    return _schedule(SQL_USER_SCHEDULE, until_ts, shard)
+
+def _claim(sql, owner, chat_ids, now_ts, lease_s):
+    conn = get_conn()
+    with conn:
+        return conn.execute(
+            sql, (owner, now_ts + lease_s, json.dumps(list(chat_ids)), now_ts, _utc_hour(now_ts), now_ts, owner)
+        ).fetchall()
+
+def _release(sql, owner):
+    conn = get_conn()
+    with conn:
+        return conn.execute(sql, (owner,)).rowcount
+
+def claim_users(owner: str, chat_ids, now_ts: int, lease_s: int):
+    """Verilen id'lerden due olanları owner adına kirala ve satırları döndür."""
+    return _claim(SQL_CLAIM_USERS, owner, chat_ids, now_ts, lease_s)
+
+def release_users(owner: str):
+    return _release(SQL_RELEASE_USERS, owner)
+
+def upsert_group(chat_id: int, title: str) -> tuple:
+    """Grubu ekler ya da yeniden etkinleştirir; (next_due_ts, resumed) döndürür."""
+    conn = get_conn()
+    with conn:
+        before = conn.execute(SQL_GROUP_ACTIVE, (chat_id,)).fetchone()
+        next_due = conn.execute(SQL_UPSERT_GROUP, (chat_id, title)).fetchone()[0] or 0
+    return next_due, bool(before and not before[0])
 
 def set_group_active(chat_id: int, active: bool = True):
-    with get_conn() as conn:
-        conn.execute("UPDATE groups SET active=? WHERE chat_id=?",
-                     (1 if active else 0, chat_id))
-        conn.commit()
+    """Durum değiştiyse grubun next_due_ts'ini, değişmediyse None döndürür."""
+    flag = 1 if active else 0
+    conn = get_conn()
+    with conn:
+        row = conn.execute(SQL_SET_GROUP_ACTIVE, (flag, chat_id, flag)).fetchone()
+    return (row[0] or 0) if row else None
 
 def due_groups(now_ts: int, limit: int = 50):
-    with get_conn() as conn:
-        cur = conn.execute("""
-        SELECT * FROM groups
-        WHERE active=1 AND (next_due_ts IS NULL OR next_due_ts<=?)
-        ORDER BY next_due_ts IS NOT NULL, next_due_ts
-        LIMIT ?
-        """, (now_ts, limit))
-        return cur.fetchall()
-
-def mark_group_sent(chat_id: int, next_due_ts: int, new_index: int):
-    with get_conn() as conn:
-        conn.execute("""
-        UPDATE groups
-        SET last_sent_ts=?, next_due_ts=?, msg_index=?
-        WHERE chat_id=?
-        """, (int(time.time()), next_due_ts, new_index, chat_id))
-        conn.commit()
\ No newline at end of file
+    return get_conn().execute(SQL_DUE_GROUPS, (now_ts, _utc_hour(now_ts), limit)).fetchall()
+
+def active_groups_by_ids(chat_ids):
+    return get_conn().execute(SQL_ACTIVE_GROUPS_BY_IDS, (json.dumps(list(chat_ids)),)).fetchall()
+
+def group_schedule(until_ts: int = None, shard=None):
+    """Aktif grupların (chat_id, next_due_ts) dizileri; bkz. user_schedule."""
+    return _schedule(SQL_GROUP_SCHEDULE, until_ts, shard)
+
+def claim_groups(owner: str, chat_ids, now_ts: int, lease_s: int):
+    return _claim(SQL_CLAIM_GROUPS, owner, chat_ids, now_ts, lease_s)
+
+def release_groups(owner: str):
+    return _release(SQL_RELEASE_GROUPS, owner)
+
+def get_cached_response(key: str, min_ts: int):
+    row = get_conn().execute(SQL_GET_CACHED_RESPONSE, (key, min_ts)).fetchone()
+    return (row["response"], row["created_ts"]) if row else None
+
+def put_cached_response(key: str, response: str, ts: int):
+    conn = get_conn()
+    with conn:
+        conn.execute(SQL_PUT_CACHED_RESPONSE, (key, response, ts))
+
+def prune_cached_responses(min_ts: int):
+    conn = get_conn()
+    with conn:
+        return conn.execute(SQL_PRUNE_CACHED_RESPONSES, (min_ts,)).rowcount
+
+def load_cooldowns(min_ts: float):
+    return [tuple(row) for row in get_conn().execute(SQL_LOAD_COOLDOWNS, (min_ts,))]
+
+def save_cooldowns(rows, min_ts: float):
+    """rows: (chat_id, last_response_ts); süresi dolmuşları da temizler."""
+    conn = get_conn()
+    with conn:
+        conn.executemany(SQL_SAVE_COOLDOWN, rows)
+        conn.execute(SQL_PRUNE_COOLDOWNS, (min_ts,))
+
+def enqueue_drips(kind: str, rows, owner: str = None, now_ts: int = None, retry_ts: int = None) -> list:
+    """rows: (chat_id, text, next_due_ts, last_msg_id) demetleri.
+
+    Mesaj outbox'a yazılır ve abonenin zamanlaması ile imleci ilerletilir;
+    ikisi aynı transaction'dadır. Kirası başka bir worker'a geçmiş
+    satırlar atlanır. Sohbetin hâlâ bekleyen bir drip mesajı varsa ekleme
+    yapılmaz, imleç ilerlemez ve abone ``retry_ts``'ye ertelenir; bu
+    chat_id'ler döndürülür.
+    """
+    now_ts = int(time.time()) if now_ts is None else now_ts
+    retry_ts = now_ts + 60 if retry_ts is None else retry_ts
+    conn = get_conn()
+    postponed = []
+    with conn:
+        for chat_id, text, next_due_ts, last_msg_id in rows:
+            cur = conn.execute(SQL_ENQUEUE, (kind, chat_id, text, 0, now_ts, None, now_ts))
+            if cur.rowcount != 1:
+                if conn.execute(_POSTPONE[kind], (retry_ts, chat_id, owner)).rowcount:
+                    postponed.append(chat_id)
+            elif not conn.execute(_ADVANCE[kind], (next_due_ts, last_msg_id, chat_id, owner)).rowcount:
+                conn.execute(SQL_UNENQUEUE, (cur.lastrowid,))
+    return postponed
+
+def enqueue_outbox(kind: str, chat_id: int, text: str, next_attempt_ts: int = None,
+                   attempts: int = 0, last_error: str = None) -> bool:
+    now_ts = int(time.time())
+    conn = get_conn()
+    with conn:
+        return bool(conn.execute(SQL_ENQUEUE, (
+            kind, chat_id, text, attempts,
+            now_ts if next_attempt_ts is None else next_attempt_ts, last_error, now_ts,
+        )).rowcount)
+
+def claim_outbox(owner: str, now_ts: int, limit: int, lease_s: int):
+    """Zamanı gelmiş outbox satırlarını owner adına kirala."""
+    conn = get_conn()
+    with conn:
+        return conn.execute(SQL_CLAIM_OUTBOX, (owner, now_ts + lease_s, now_ts, now_ts, limit)).fetchall()
+
+def settle_outbox(done, retry, dead, owner: str = None, now_ts: int = None):
+    """Gönderim sonuçlarını tek transaction'da yaz.
+
+    done: (id, kind, chat_id); retry: (id, attempts, next_attempt_ts, error);
+    dead: (id, attempts, error). Kirası başka bir worker'a geçmiş satırlar
+    değiştirilmez.
+    """
+    now_ts = int(time.time()) if now_ts is None else now_ts
+    conn = get_conn()
+    with conn:
+        for outbox_id, kind, chat_id in done:
+            if conn.execute(SQL_OUTBOX_DONE, (outbox_id, owner)).rowcount and kind in _DELIVERED:
+                conn.execute(_DELIVERED[kind], (now_ts, chat_id))
+        conn.executemany(SQL_OUTBOX_RETRY, [row[1:] + (row[0], owner) for row in retry])
+        conn.executemany(SQL_OUTBOX_DEAD, [row[1:] + (row[0], owner) for row in dead])
+
+def release_outbox(owner: str):
+    return _release(SQL_RELEASE_OUTBOX, owner)
+
+def prune_outbox(min_ts: int):
+    """Eski ölü mektupları sil."""
+    conn = get_conn()
+    with conn:
+        return conn.execute(SQL_PRUNE_OUTBOX, (min_ts,)).rowcount
+
+def outbox_counts():
+    return dict(get_conn().execute(SQL_OUTBOX_COUNTS).fetchall())
+
+def create_campaign(text: str, target: str = "all", created_by: int = None) -> int:
+    kinds = CAMPAIGN_KINDS[target]
+    conn = get_conn()
+    with conn:
+        total = sum(conn.execute(SQL_COUNT_RECIPIENTS[kind]).fetchone()[0] for kind in kinds)
+        return conn.execute(SQL_CREATE_CAMPAIGN, (
+            text, target, total, created_by, int(time.time()), kinds[0], MIN_CHAT_ID,
+        )).lastrowid
+
+def get_campaign(campaign_id: int):
+    return get_conn().execute(SQL_GET_CAMPAIGN, (campaign_id,)).fetchone()
+
+def recent_campaigns(limit: int = 5):
+    return get_conn().execute(SQL_RECENT_CAMPAIGNS, (limit,)).fetchall()
+
+def claim_campaign(owner: str, now_ts: int, lease_s: int):
+    """Çalışan en eski kampanyayı owner adına kirala; yoksa None."""
+    conn = get_conn()
+    with conn:
+        return conn.execute(SQL_CLAIM_CAMPAIGN, (owner, now_ts + lease_s, now_ts, now_ts, owner)).fetchone()
+
+def checkpoint_campaign(campaign_id: int, owner: str, cursor_kind: str, cursor_chat_id: int,
+                        sent: int, failed: int, lease_until: int) -> bool:
+    """İlerlemeyi yaz ve kirayı uzat; kampanya durdurulduysa False."""
+    conn = get_conn()
+    with conn:
+        return bool(conn.execute(SQL_CHECKPOINT_CAMPAIGN, (
+            cursor_kind, cursor_chat_id, sent, failed, lease_until, campaign_id, owner,
+        )).rowcount)
+
+def final_checkpoint_campaign(campaign_id: int, owner: str, cursor_kind: str, cursor_chat_id: int,
+                              sent: int, failed: int) -> bool:
+    """Durdurulmuş kampanyanın da son ilerlemesini yaz; kira kaybedildiyse False."""
+    conn = get_conn()
+    with conn:
+        return bool(conn.execute(SQL_FINAL_CHECKPOINT_CAMPAIGN, (
+            cursor_kind, cursor_chat_id, sent, failed, campaign_id, owner,
+        )).rowcount)
+
+def finish_campaign(campaign_id: int, owner: str, cursor_kind: str, cursor_chat_id: int,
+                    sent: int, failed: int) -> bool:
+    conn = get_conn()
+    with conn:
+        return bool(conn.execute(SQL_FINISH_CAMPAIGN, (
+            cursor_kind, cursor_chat_id, sent, failed, int(time.time()), campaign_id, owner,
+        )).rowcount)
+
+def set_campaign_status(campaign_id: int, status: str) -> bool:
+    """running / paused / cancelled; bitmiş kampanyalar değişmez."""
+    conn = get_conn()
+    with conn:
+        return bool(conn.execute(SQL_SET_CAMPAIGN_STATUS, (
+            status, status, int(time.time()), campaign_id,
+        )).rowcount)
+
+def release_campaigns(owner: str):
+    return _release(SQL_RELEASE_CAMPAIGNS, owner)
+
+def campaign_recipients(kind: str, after_chat_id: int, limit: int):
+    """kind ('user' | 'group') alıcılarından after_chat_id'den büyük ilk limit tanesi."""
+    return array("q", (row[0] for row in get_conn().execute(SQL_RECIPIENTS_PAGE[kind], (after_chat_id, limit))))
+
+def get_chat(kind: str, chat_id: int):
+    return get_conn().execute(SQL_GET_CHAT[kind], (chat_id,)).fetchone()
+
+def set_chat_timezone(kind: str, chat_id: int, tz: str, mask: int) -> bool:
+    conn = get_conn()
+    with conn:
+        return bool(conn.execute(SQL_SET_TZ[kind], (tz, mask, chat_id)).rowcount)
+
+def set_quiet_hours(kind: str, chat_id: int, start: int, end: int, mask: int) -> bool:
+    """start/end None ise sessiz saatler kapatılır."""
+    conn = get_conn()
+    with conn:
+        return bool(conn.execute(SQL_SET_QUIET[kind], (start, end, mask, chat_id)).rowcount)
+
+def quiet_settings(kind: str):
+    """Kullanılan farklı (tz, quiet_start, quiet_end) üçlüleri."""
+    return [tuple(row) for row in get_conn().execute(SQL_QUIET_SETTINGS[kind])]
+
+def update_quiet_masks(kind: str, rows) -> int:
+    """rows: (mask, tz, start, end); maskesi değişen satır sayısını döndürür."""
+    conn = get_conn()
+    changed = 0
+    with conn:
+        for mask, tz, start, end in rows:
+            changed += conn.execute(SQL_UPDATE_QUIET_MASK[kind], (mask, tz, start, end, mask)).rowcount
+    return changed
+
+def catalog_snapshot():
+    """(sürüm, satırlar); ikisi aynı okuma transaction'ından gelir.
+
+    Satırlar: (msg_id, position, active, lang, html); metni olmayan
+    mesajlarda lang/html NULL'dır.
+    """
+    conn = get_conn()
+    conn.execute("BEGIN")
+    try:
+        version = conn.execute(SQL_CATALOG_VERSION).fetchone()[0]
+        return version, [tuple(row) for row in conn.execute(SQL_CATALOG_ROWS)]
+    finally:
+        conn.commit()
+
+def catalog_version() -> int:
+    return get_conn().execute(SQL_CATALOG_VERSION).fetchone()[0]
+
+def sync_catalog(entries, default_lang: str, now_ts: int = None) -> dict:
+    """Dosyadaki kataloğu tabloya yaz; sadece değişen satırlara dokunur.
+
+    entries: dosya sırasıyla (msg_id ya da None, {dil: html}) demetleri.
+    id'siz girdiler (düz metin listesi) varsayılan dildeki metniyle mevcut
+    bir mesaja eşlenir, yoksa yeni id alır; araya eklenen bir metin diğer
+    mesajların id'sini değiştirmez. Dosyada olmayan mesajlar silinmez,
+    pasifleşir: imleci onlarda kalan aboneler sıradakinden devam eder.
+    Hiçbir şey değişmediyse catalog_version artmaz.
+    """
+    now_ts = int(time.time()) if now_ts is None else now_ts
+    counts = {"added": 0, "updated": 0, "deactivated": 0}
+    conn = get_conn()
+    with conn:
+        current = {row[0]: (row[1], row[2]) for row in conn.execute(SQL_CATALOG_MESSAGES)}
+        texts = {}
+        for msg_id, lang, html in conn.execute(SQL_CATALOG_TEXTS):
+            texts.setdefault(msg_id, {})[lang] = html
+        explicit = {msg_id for msg_id, _ in entries if msg_id is not None}
+        by_text = {
+            variants[default_lang]: msg_id for msg_id, variants in texts.items()
+            if msg_id not in explicit and default_lang in variants
+        }
+        next_id = max(list(current) + list(explicit), default=0) + 1
+        seen = set()
+        for position, (msg_id, variants) in enumerate(entries):
+            if msg_id is None:
+                msg_id = by_text.pop(variants.get(default_lang), None)
+                if msg_id is None:
+                    msg_id, next_id = next_id, next_id + 1
+            seen.add(msg_id)
+
+            old = texts.get(msg_id, {})
+            changed = False
+            for lang, html in variants.items():
+                if old.get(lang) != html:
+                    conn.execute(SQL_UPSERT_CATALOG_TEXT, (msg_id, lang, html))
+                    changed = True
+            for lang in old.keys() - variants.keys():
+                conn.execute(SQL_DELETE_CATALOG_TEXT, (msg_id, lang))
+                changed = True
+
+            if msg_id not in current:
+                conn.execute(SQL_UPSERT_CATALOG_MESSAGE, (msg_id, position, now_ts))
+                counts["added"] += 1
+            elif current[msg_id] != (position, 1):
+                conn.execute(SQL_UPSERT_CATALOG_MESSAGE, (msg_id, position, now_ts))
+                counts["updated"] += 1
+            elif changed:
+                conn.execute(SQL_TOUCH_CATALOG_MESSAGE, (now_ts, msg_id))
+                counts["updated"] += 1
+
+        for msg_id, (_, active) in current.items():
+            if active and msg_id not in seen:
+                conn.execute(SQL_DEACTIVATE_CATALOG_MESSAGE, (now_ts, msg_id))
+                counts["deactivated"] += 1
+    return counts
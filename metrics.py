@@ -0,0 +1,324 @@
+"""Bağımlılıksız, düşük maliyetli metrikler ve Prometheus metin çıktısı.
+
+Sayaçlar, anlık değerler (gauge) ve sabit kovalı histogramlar bellekte
+tutulur; bir gözlem bir kilit, bir sözlük araması ve bir ``bisect``
+kadardır. Sıcak yollarda ``labels(...)`` ile etiketler bir kez
+çözülür. DB fonksiyonları thread'lerde çalıştığı için yazmalar kilitlidir.
+
+Kuyruk derinlikleri gibi değerler ``gauge(..., fn=...)`` ile toplanma
+anında okunur; sıcak yola hiç maliyet eklemez.
+
+Çıktı iki yoldan alınır: ``render()`` (Prometheus 0.0.4 metin formatı,
+``start_http_server`` ile /metrics) ve ``summary()`` (admin /stats).
+"""
+import asyncio
+import bisect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Child:
+    """Etiketleri önceden çözülmüş metrik; sıcak yollar için."""
+    __slots__ = ("_metric", "_key")
+
+    def __init__(self, metric, key):
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount: float = 1):
+        self._metric._inc(self._key, amount)
+
+    def set(self, value: float):
+        self._metric._set(self._key, value)
+
+    def observe(self, value: float):
+        self._metric._observe(self._key, value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def labels(self, **labels) -> _Child:
+        return _Child(self, self._key(labels))
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def inc(self, amount: float = 1, **labels):
+        self._inc(self._key(labels), amount)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        for key, value in self.items():
+            yield self.name, key, "", value
+
+
+class Gauge(_Metric):
+    """Elle ayarlanan ya da ``fn`` ile toplanma anında okunan değer.
+
+    ``fn`` etiketsiz gauge için sayı, etiketli gauge için
+    ``{etiket_değeri(leri): sayı}`` döndürür.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def _set(self, key, value):
+        with self._lock:
+            self._values[key] = value
+
+    def _inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels):
+        self._set(self._key(labels), value)
+
+    def inc(self, amount: float = 1, **labels):
+        self._inc(self._key(labels), amount)
+
+    def dec(self, amount: float = 1, **labels):
+        self._inc(self._key(labels), -amount)
+
+    def items(self):
+        if self.fn is None:
+            return super().items()
+        value = self.fn()
+        if not isinstance(value, dict):
+            return [((), value)]
+        return [
+            (tuple(map(str, key)) if isinstance(key, tuple) else (str(key),), v)
+            for key, v in value.items()
+        ]
+
+    def samples(self):
+        for key, value in self.items():
+            yield self.name, key, "", value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _observe(self, key, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [kova sayıları (+Inf dahil, kümülatif değil), toplam, adet]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def observe(self, value: float, **labels):
+        self._observe(self._key(labels), value)
+
+    def time(self, **labels):
+        return _Timer(self.labels(**labels))
+
+    def items(self):
+        with self._lock:
+            return [(key, (list(counts), total, n)) for key, (counts, total, n) in self._values.items()]
+
+    def quantile(self, q: float, counts, n: int) -> float:
+        """Kova sayılarından doğrusal aradeğerle yaklaşık yüzdelik."""
+        if not n:
+            return float("nan")
+        rank = q * n
+        seen = 0
+        for i, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower  # +Inf kovası: bilinen en büyük sınır
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def samples(self):
+        for key, (counts, total, n) in self.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", key, f'le="{_format_value(float(bound))}"', cumulative
+            yield f"{self.name}_sum", key, "", total
+            yield f"{self.name}_count", key, "", n
+
+
+class _Timer:
+    __slots__ = ("_child", "_started")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._started)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Aynı adla ikinci kayıt ilkini döndürür (modül tekrar yüklenirse)."""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered with another type/labels")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for name, key, extra, value in metric.samples():
+                    lines.append(f"{name}{_format_labels(metric.labelnames, key, extra)} {_format_value(value)}")
+            except Exception as e:
+                logger.warning(f"Collecting {metric.name} failed: {e}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> list:
+        """İnsan okuyabilir satırlar; histogramlar adet, p50, p95 ve ortalama."""
+        lines = []
+        for metric in self.metrics():
+            try:
+                items = sorted(metric.items())
+            except Exception as e:
+                logger.warning(f"Collecting {metric.name} failed: {e}")
+                continue
+            for key, value in items:
+                label = metric.name + _format_labels(metric.labelnames, key)
+                if isinstance(metric, Histogram):
+                    counts, total, n = value
+                    if not n:
+                        continue
+                    scale, unit = (1000, "ms") if metric.name.endswith("_seconds") else (1, "")
+                    p50 = metric.quantile(0.5, counts, n) * scale
+                    p95 = metric.quantile(0.95, counts, n) * scale
+                    lines.append(
+                        f"{label}: n={n} p50={p50:.1f}{unit} p95={p95:.1f}{unit} "
+                        f"avg={total / n * scale:.1f}{unit}"
+                    )
+                else:
+                    lines.append(f"{label}: {_format_value(value)}")
+        return lines
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labels=()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def gauge(name: str, help: str, labels=(), fn=None) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labels, fn))
+
+
+def histogram(name: str, help: str, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def summary() -> list:
+    return REGISTRY.summary()
+
+
+async def _handle(reader, writer, registry):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?", 1)[0] == "/metrics":
+            status, body = "200 OK", registry.render().encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_http_server(host: str, port: int, registry: Registry = REGISTRY):
+    """GET /metrics sunan küçük HTTP sunucusu; botun event loop'unda çalışır."""
+    server = await asyncio.start_server(lambda r, w: _handle(r, w, registry), host, port)
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,146 @@
+"""Kalıcı outbox'tan gönderim yapan dispatcher.
+
+Drip worker'ları mesajı ``outbox`` tablosuna yazıp devam eder; gönderim,
+tekrar deneme ve vazgeçme burada, çağıranın coroutine'inden bağımsız
+yürür. Bir sohbetteki RetryAfter ya da ağ hatası diğer sohbetleri
+bekletmez.
+
+- Satırlar kiralanarak alınır; birden fazla süreç aynı tabloyu paylaşabilir.
+- Geçici hatalarda satır, üstel artan ve rastgele yayılmış (jitter) bir
+  gecikmeyle tekrar planlanır; RetryAfter süresinin altına inilmez.
+- ``max_attempts`` denemeden sonra ya da kalıcı hatalarda (engellendi,
+  hatalı istek) satır ``dead`` olarak işaretlenir ve son hata saklanır.
+- Ertelenmiş yanıtlar (``REPLY``) ``priorities``'deki öncelikle gider;
+  drip bütçesinin ya da toplu gönderim slotlarının arkasında beklemez.
+- Sonuçlar toplanıp tek transaction'da yazılır. Süreç teslimattan sonra,
+  yazmadan önce çökerse satır kira bitiminde bir kez daha gönderilir.
+"""
+import asyncio
+import functools
+import logging
+import random
+import time
+
+from sender import FanoutSender, SENT, RETRY
+
+logger = logging.getLogger(__name__)
+
+USER_DRIP = "user"
+GROUP_DRIP = "group"
+REPLY = "reply"
+
+
+def backoff_delay(attempts: int, base: float, cap: float, rng=random) -> float:
+    """attempts. başarısız denemeden sonraki bekleme (eşit jitter)."""
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    return delay / 2 + rng.uniform(0, delay / 2)
+
+
+class OutboxDispatcher:
+    def __init__(self, send_once, claim, settle, owner: str, concurrency: int = 8,
+                 batch: int = 100, lease_s: int = 600, max_attempts: int = 8,
+                 base_backoff: float = 5.0, max_backoff: float = 3600.0,
+                 poll_interval: float = 1.0, on_dead=None, priorities=None):
+        """send_once(chat_id, text[, priority]) -> (SENT | RETRY | FAILED, retry_delay_s, error)
+
+        claim(owner, now_ts, limit, lease_s) ve settle(done, retry, dead, owner)
+        async_db'deki outbox fonksiyonlarıdır. on_dead(row, error) ölü
+        mektuplar için isteğe bağlı coroutine'dir. priorities {kind: öncelik}
+        eşlemesidir; listede olmayan türler send_once'ın varsayılanıyla gider.
+        """
+        self._claim = claim
+        self._settle = settle
+        self.owner = owner
+        self.batch = batch
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self._on_dead = on_dead
+        self.priorities = priorities or {}
+        self._sender = FanoutSender(send_once, concurrency=concurrency, max_pending=batch, max_attempts=1)
+        self._done = []
+        self._retry = []
+        self._dead = []
+        self._wake = asyncio.Event()
+        self._task = None
+        self.counts = {"sent": 0, "retried": 0, "dead": 0}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def wake(self):
+        """Yeni satır eklendi; bir sonraki poll'u beklemeden bak."""
+        self._wake.set()
+
+    async def _on_result(self, row, outcome: str, delay: float, error: str):
+        if outcome == SENT:
+            self.counts["sent"] += 1
+            self._done.append((row["id"], row["kind"], row["chat_id"]))
+            return
+        attempts = row["attempts"] + 1
+        if outcome == RETRY and attempts < self.max_attempts:
+            self.counts["retried"] += 1
+            wait = max(delay or 0, backoff_delay(attempts, self.base_backoff, self.max_backoff))
+            self._retry.append((row["id"], attempts, int(time.time() + wait), error))
+            return
+        self.counts["dead"] += 1
+        logger.warning(f"Outbox message {row['id']} to {row['chat_id']} dead after {attempts} attempts: {error}")
+        self._dead.append((row["id"], attempts, error))
+        if self._on_dead is not None:
+            await self._on_dead(row, error)
+
+    async def flush(self):
+        if not (self._done or self._retry or self._dead):
+            return
+        done, retry, dead = self._done, self._retry, self._dead
+        self._done, self._retry, self._dead = [], [], []
+        try:
+            await self._settle(done, retry, dead, self.owner)
+        except Exception:
+            self._done[:0], self._retry[:0], self._dead[:0] = done, retry, dead
+            raise
+
+    async def _poll(self):
+        await self.flush()
+        room = self.batch - self._sender.pending
+        if room <= 0:
+            return 0
+        rows = await self._claim(self.owner, int(time.time()), room, self.lease_s)
+        for row in rows:
+            await self._sender.submit(
+                row["chat_id"], row["text"], functools.partial(self._on_result, row),
+                priority=self.priorities.get(row["kind"]),
+            )
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self._poll()
+            except Exception as e:
+                logger.error(f"Outbox dispatch failed: {e}")
+                claimed = 0
+            if claimed:
+                # Kuyrukta daha fazlası olabilir; yine de gönderimlerin
+                # ilerlemesi için loop'a bir tur ver
+                await asyncio.sleep(0)
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def stats(self) -> dict:
+        return {"in_flight": self._sender.pending, **self.counts}
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._sender.close()
+        await self.flush()
@@ -0,0 +1,214 @@
+"""Gruplarda Gemini'ye gitmeden önce ucuz, yerel ön eleme.
+
+İki aşama:
+
+1. Yakın kopya: mesajın normalize edilmiş halinin 4 karakterlik
+   parçaları hash'lenir ve en küçük ``SKETCH_SIZE`` hash saklanır
+   (bottom-k MinHash). İki taslağın Jaccard benzerliği sohbetin son
+   ``per_chat`` taslağından biriyle ``min_similarity`` ya da daha fazlaysa
+   (ve ``window_s`` içindeyse) mesaj tekrar sayılır. Küçük değişiklikli
+   kopyala-yapıştır ve yönlendirilen zincir mesajlar da yakalanır.
+   Kısa metinlerde 64 bitlik SimHash tek harf farkında bile 7-14 bit
+   oynadığından ilgisiz mesajlardan ayrılamıyordu; taslakta tek harf
+   farkı benzerliği ~0.8'de tutar, ilgisiz mesajlar ~0.3'ün altında
+   kalır. Karşılaştırma bir frozenset kesişimidir (~2 µs).
+2. Soru olasılığı: soru işareti, Türkçe soru ekleri (mı/mi/mu/mü),
+   soru kelimeleri ve bota yanıt artırır; bağlantı, yönlendirme, çok
+   uzun metin ve harfsiz (emoji/sembol) mesajlar azaltır. Skor [0, 1]
+   arasıdır ve yazı-turanın yerine geçer.
+
+Bellek sınırlıdır: sohbet başına en fazla ``per_chat`` taslak, en
+fazla ``max_chats`` sohbet (en uzun süre sessiz kalan atılır). Taslaklar
+sıralı ``array('Q')`` olarak saklanır; dolu bir sohbet (64 taslak) ~35 KB
+tutar (frozenset ve hash sözlüğüyle ~300 KB idi). ``stats()`` sohbet
+başına baytı raporlar.
+
+Skor yanıt ihtimalini ``response_chance``'ın üstüne çıkarır; eleme
+sonrası kalan mesajlar eski yazı-turadan daha sık yanıtlanır. Bu yüzden
+``saved_calls`` net bir değerdir: soru ağırlıklı gruplarda eksiye düşebilir
+(yazı-turadan fazla çağrı).
+"""
+import heapq
+import random
+import re
+import sys
+import time
+from array import array
+from collections import OrderedDict, deque
+
+from ai_cache import normalize
+
+SHINGLE = 4
+SKETCH_SIZE = 32
+MASK64 = (1 << 64) - 1
+# Sohbet başına sayaç sayısı: 64 taslak x 32 hash'te sayaçların ~%40'ı dolu,
+# rastgele bir taslağın alt sınırı (>= 0.7 * 32) geçme ihtimali ihmal edilebilir
+COUNTERS = 4096
+
+_URL = re.compile(r"(https?://|www\.|t\.me/|@\w{5,})", re.IGNORECASE)
+_QUESTION_SUFFIX = re.compile(r"\bm[ıiuü](s[ıiuü]n(uz)?|y[ıiuü]m|y[ıiuü]z|d[ıiuü]r)?\b")
+_QUESTION_WORDS = re.compile(
+    r"\b(ne|neden|niye|niçin|nasıl|kim|kime|kimin|nerede|nereye|nereden|hangi|kaç|"
+    r"what|why|how|who|where|when|which)\b"
+)
+
+
+def sketch(text: str) -> frozenset:
+    """Normalize edilmiş metnin bottom-k MinHash taslağı.
+
+    Python'un str hash'i süreç içinde tutarlıdır; taslaklar zaten sadece
+    bellekte tutulur. Parça sayısı ``SKETCH_SIZE``'dan azsa taslak tüm
+    kümedir ve benzerlik kesin Jaccard olur.
+    """
+    text = normalize(text)
+    if len(text) <= SHINGLE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)}
+    hashes = {hash(s) & MASK64 for s in shingles}
+    if len(hashes) > SKETCH_SIZE:
+        hashes = heapq.nsmallest(SKETCH_SIZE, hashes)
+    return frozenset(hashes)
+
+
+def similarity(a: frozenset, b) -> float:
+    """İki taslağın Jaccard benzerliği (0-1); ``b`` saklanan ``array`` olabilir."""
+    common = len(a.intersection(b))
+    return common / (len(a) + len(b) - common) if common else 0.0
+
+
+def question_score(text: str, forwarded: bool = False, reply_to_bot: bool = False) -> float:
+    """Mesajın yanıt beklediğine dair kaba skor (0-1)."""
+    stripped = text.strip()
+    lowered = stripped.casefold()
+    score = 0.1
+    if stripped.endswith("?"):
+        score += 0.45
+    elif "?" in stripped:
+        score += 0.25
+    if _QUESTION_SUFFIX.search(lowered):
+        score += 0.3
+    if _QUESTION_WORDS.search(lowered):
+        score += 0.2
+    if reply_to_bot:
+        score += 0.5
+    if _URL.search(stripped):
+        score -= 0.4
+    if forwarded:
+        score -= 0.4
+    if len(stripped) > 400:
+        score -= 0.2
+    letters = sum(map(str.isalpha, stripped))
+    if letters < len(stripped) * 0.5:
+        score -= 0.2
+    return min(1.0, max(0.0, score))
+
+
+class _ChatPrints:
+    """Sohbetin son taslakları ve hash'lerin sayaçlı süzgeci.
+
+    Jaccard >= t ise ortak hash sayısı en az t * len(taslak) olmalıdır.
+    Bu alt sınır ``COUNTERS`` sayaçlı bir süzgeçte (hash % COUNTERS) tek
+    geçişte kontrol edilir ve çoğu mesajda taslak taslak karşılaştırmaya
+    girilmez. Çakışma sadece fazladan karşılaştırmaya yol açar; tekrar
+    kaçırılmaz.
+    """
+    __slots__ = ("prints", "counters")
+
+    def __init__(self, size: int):
+        self.prints = deque(maxlen=size)  # (sıralı array('Q') taslak, ts)
+        self.counters = array("H" if size * SKETCH_SIZE < 1 << 16 else "I", [0]) * COUNTERS
+
+    def hits(self, fingerprint: frozenset) -> int:
+        counters = self.counters
+        return sum(1 for h in fingerprint if counters[h % COUNTERS])
+
+    def add(self, fingerprint: frozenset, now: float):
+        counters = self.counters
+        if len(self.prints) == self.prints.maxlen:
+            old, _ = self.prints.popleft()
+            for h in old:
+                counters[h % COUNTERS] -= 1
+        for h in fingerprint:
+            counters[h % COUNTERS] += 1
+        self.prints.append((array("Q", sorted(fingerprint)), now))
+
+    def memory_bytes(self) -> int:
+        size = sys.getsizeof(self) + sys.getsizeof(self.prints) + sys.getsizeof(self.counters)
+        for entry in self.prints:
+            size += sys.getsizeof(entry) + sys.getsizeof(entry[0]) + sys.getsizeof(entry[1])
+        return size
+
+
+class GroupPrefilter:
+    def __init__(self, response_chance: float, min_score: float = 0.3, per_chat: int = 64,
+                 max_chats: int = 2000, window_s: float = 3600, min_similarity: float = 0.7, rng=None):
+        self.response_chance = response_chance
+        self.min_score = min_score
+        self.per_chat = per_chat
+        self.max_chats = max_chats
+        self.window_s = window_s
+        self.min_similarity = min_similarity
+        self._rng = rng or random.Random()
+        self._chats = OrderedDict()
+        self.counts = {"checked": 0, "duplicate": 0, "low_score": 0, "gate": 0, "passed": 0}
+
+    def seen_recently(self, chat_id: int, fingerprint: frozenset, now: float) -> bool:
+        """Yakın kopya mı? Taslağı her durumda kaydeder."""
+        chat = self._chats.pop(chat_id, None)
+        if chat is None:
+            chat = _ChatPrints(self.per_chat)
+        self._chats[chat_id] = chat
+        while len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
+
+        duplicate = (
+            chat.hits(fingerprint) >= self.min_similarity * len(fingerprint)
+            and any(
+                now - ts <= self.window_s and similarity(fingerprint, fp) >= self.min_similarity
+                for fp, ts in chat.prints
+            )
+        )
+        chat.add(fingerprint, now)
+        return duplicate
+
+    def check(self, chat_id: int, text: str, forwarded: bool = False, reply_to_bot: bool = False,
+              now: float = None) -> str:
+        """Karar: "duplicate", "low_score", "gate" (şans tutmadı) ya da "passed"."""
+        now = time.time() if now is None else now
+        self.counts["checked"] += 1
+        if self.seen_recently(chat_id, sketch(text), now):
+            decision = "duplicate"
+        else:
+            score = question_score(text, forwarded, reply_to_bot)
+            if score < self.min_score:
+                decision = "low_score"
+            elif self._rng.random() < self.response_chance + (1 - self.response_chance) * score:
+                decision = "passed"
+            else:
+                decision = "gate"
+        self.counts[decision] += 1
+        return decision
+
+    def saved_calls(self) -> float:
+        """Eski yazı-tura ile beklenen Gemini çağrısı eksi şimdiki çağrılar.
+
+        Net değerdir; elemeyi geçenler yazı-turadan sık yanıtlandığı için
+        soru ağırlıklı trafikte eksi olabilir.
+        """
+        return self.counts["checked"] * self.response_chance - self.counts["passed"]
+
+    def memory_bytes(self) -> int:
+        """Taslak, sayaç ve tamponların yaklaşık bellek kullanımı."""
+        return sys.getsizeof(self._chats) + sum(chat.memory_bytes() for chat in self._chats.values())
+
+    def stats(self) -> dict:
+        chats = len(self._chats)
+        memory = self.memory_bytes()
+        return {
+            **self.counts,
+            "chats": chats,
+            "bytes": memory,
+            "bytes_per_chat": memory // chats if chats else 0,
+            "gemini_calls_saved": round(self.saved_calls(), 1),
+        }
@@ -0,0 +1,82 @@
+"""Sohbet başına saat dilimi ve sessiz saatler.
+
+Sessiz saatler yerel saatle ``[start, end)`` olarak girilir (örn. 22-8) ve
+bir kez 24 bitlik UTC saat maskesine çevrilir: bit ``h`` açıksa UTC
+``h:00-h:59`` arasında gönderim yapılmaz. Due sorguları bu maskeyi SQL'de
+``(quiet_mask >> utc_saat) & 1`` ile eler; satır başına Python'da saat
+dilimi hesabı yapılmaz.
+
+Yaz saati geçişlerinde maske değişeceği için periyodik olarak yeniden
+hesaplanır (bkz. bot.refresh_quiet_masks).
+"""
+import functools
+import time
+from datetime import datetime, timezone
+
+import pytz
+
+HOUR = 3600
+FULL_MASK = (1 << 24) - 1
+
+
+@functools.lru_cache(maxsize=512)
+def get_tz(name: str):
+    """pytz.timezone önbellekli; geçersiz adda UnknownTimeZoneError."""
+    return pytz.timezone(name)
+
+
+def is_valid_tz(name: str) -> bool:
+    try:
+        get_tz(name)
+        return True
+    except (pytz.UnknownTimeZoneError, AttributeError):
+        return False
+
+
+def _in_window(hour: int, start: int, end: int) -> bool:
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def quiet_mask(tz_name: str, start: int, end: int, at: float = None) -> int:
+    """Yerel [start, end) sessiz saatlerinin UTC saat maskesi.
+
+    Yarım saatlik ofsetlerde, yerel sessiz aralığa değen UTC saati de
+    kapatılır (gönderim sessiz saate taşmasın).
+    """
+    if start == end:
+        return 0
+    tz = get_tz(tz_name)
+    at = time.time() if at is None else at
+    day = int(at // 86400) * 86400
+    mask = 0
+    for hour in range(24):
+        for ts in (day + hour * HOUR, day + hour * HOUR + HOUR - 60):
+            local = datetime.fromtimestamp(ts, tz=timezone.utc).astimezone(tz)
+            if _in_window(local.hour, start, end):
+                mask |= 1 << hour
+                break
+    return mask
+
+
+def utc_hour(ts: float) -> int:
+    return int(ts // HOUR) % 24
+
+
+def is_quiet(mask: int, ts: float) -> bool:
+    return bool(mask >> utc_hour(ts) & 1)
+
+
+def next_open_ts(mask: int, ts: float) -> int:
+    """ts'den itibaren ilk açık saatin başlangıcı; ts açıksa kendisi."""
+    if not mask or not is_quiet(mask, ts):
+        return int(ts)
+    if mask & FULL_MASK == FULL_MASK:
+        return int(ts) + 86400  # her saat kapalı: günde bir tekrar bak
+    hour_start = int(ts // HOUR) * HOUR
+    for step in range(1, 25):
+        candidate = hour_start + step * HOUR
+        if not is_quiet(mask, candidate):
+            return candidate
+    return int(ts) + 86400
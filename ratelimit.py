@@ -0,0 +1,196 @@
+"""Tüm bot çağrılarının geçtiği, Telegram limitlerini modelleyen hız sınırlayıcı.
+
+Application'a ``rate_limiter`` olarak verilir; send_message, edit,
+reply_text gibi sohbete giden her istek buradan geçer. Modellenen limitler:
+
+- Global: saniyede ~30 mesaj (tüm sohbetler toplamı)
+- Özel sohbet: sohbet başına saniyede 1 mesaj
+- Grup: grup başına dakikada 20 mesaj
+- Toplu (drip) trafik: PER_MINUTE_LIMIT ile ayrıca kısılır
+
+İstekler ``rate_limit_args`` ile öncelik taşır: INTERACTIVE (AI yanıtları,
+komutlar), BULK (drip) ve BROADCAST (kampanyalar). BULK ve BROADCAST,
+global kovada interaktif trafik için ayrılan payı kullanamaz ve bekleyen
+interaktif istek varken sıra vermez. BROADCAST drip bütçesine takılmaz;
+global limitin geri kalanını kullanır.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+BROADCAST = "broadcast"
+
+# Kullanılmayan sohbet kovaları bu süreden sonra unutulur
+CHAT_IDLE_TTL = 120.0
+CHAT_PRUNE_THRESHOLD = 10_000
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float, reserve: float = 0.0) -> float:
+        """Bir jeton (+reserve) alınabilmesi için beklenecek süre."""
+        self.refill(now)
+        missing = 1.0 + reserve - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate
+
+    def take(self):
+        self.tokens -= 1.0
+
+
+class TelegramRateLimiter(BaseRateLimiter[str]):
+    def __init__(
+        self,
+        global_per_second: float = 30.0,
+        private_per_second: float = 1.0,
+        group_per_minute: float = 20.0,
+        bulk_per_minute: float = 20.0,
+        interactive_reserve: float = 0.2,
+    ):
+        now = time.monotonic()
+        self.global_bucket = TokenBucket(global_per_second, global_per_second, now)
+        self.bulk_bucket = TokenBucket(bulk_per_minute / 60.0, max(1.0, bulk_per_minute / 60.0), now)
+        self.private_per_second = private_per_second
+        self.group_per_minute = group_per_minute
+        # BULK/BROADCAST, global kovada bu kadar jetonu interaktif trafiğe bırakır
+        self.reserve = global_per_second * interactive_reserve
+        self._chats = {}
+        self._paused_until = 0.0
+        self._interactive_waiting = 0
+        self._recent = deque(maxlen=int(global_per_second * 2) + 1)
+        self.granted = {INTERACTIVE: 0, BULK: 0, BROADCAST: 0}
+        self.delayed = {INTERACTIVE: 0, BULK: 0, BROADCAST: 0}
+        self.wait_seconds = {INTERACTIVE: 0.0, BULK: 0.0, BROADCAST: 0.0}
+        self.retry_after_events = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= CHAT_PRUNE_THRESHOLD:
+                self._prune(now)
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_per_minute / 60.0, self.group_per_minute, now)
+            else:
+                bucket = TokenBucket(self.private_per_second, 1.0, now)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self, now: float):
+        idle = [chat_id for chat_id, b in self._chats.items() if now - b.updated > CHAT_IDLE_TTL]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    def _global_wait(self, priority: str, now: float) -> float:
+        wait = self._paused_until - now
+        if priority != INTERACTIVE:
+            if self._interactive_waiting:
+                wait = max(wait, 0.05)
+            wait = max(wait, self.global_bucket.wait_time(now, self.reserve))
+            if priority == BULK:
+                wait = max(wait, self.bulk_bucket.wait_time(now))
+        else:
+            wait = max(wait, self.global_bucket.wait_time(now))
+        return wait
+
+    async def acquire(self, chat_id=None, priority: str = INTERACTIVE):
+        """İstek gönderilebilir olana kadar bekle ve jetonları düş."""
+        started = time.monotonic()
+        queued = False
+        bucket = None
+        try:
+            while True:
+                now = time.monotonic()
+                wait = self._global_wait(priority, now)
+                # Sadece global kovayı bekleyen interaktif istekler toplu trafiği tutar
+                if priority == INTERACTIVE and (wait > 0) != queued:
+                    queued = wait > 0
+                    self._interactive_waiting += 1 if queued else -1
+                if chat_id is not None:
+                    # Her turda yeniden alınır: uzun bekleme (RetryAfter) sırasında
+                    # _prune kovayı silmiş olabilir; take() aynı nesneye yapılmalı
+                    bucket = self._chat_bucket(chat_id, now)
+                    wait = max(wait, bucket.wait_time(now))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+        finally:
+            if queued:
+                self._interactive_waiting -= 1
+
+        self.global_bucket.take()
+        if priority == BULK:
+            self.bulk_bucket.take()
+        if bucket is not None:
+            bucket.take()
+        waited = now - started
+        if waited > 0.001:
+            self.delayed[priority] += 1
+            self.wait_seconds[priority] += waited
+        self.granted[priority] += 1
+        self._recent.append(now)
+
+    def penalize(self, retry_after: float):
+        """RetryAfter geldiğinde tüm gönderimleri birlikte durdur."""
+        self.retry_after_events += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            # getUpdates, setWebhook vb. sohbete gitmeyen çağrılar
+            return await callback(*args, **kwargs)
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            chat_id = None  # @kanaladi gibi kullanıcı adları
+        await self.acquire(chat_id, rate_limit_args or INTERACTIVE)
+        try:
+            return await callback(*args, **kwargs)
+        except RetryAfter as e:
+            self.penalize(e.retry_after)
+            logger.warning(f"RetryAfter {e.retry_after}s on {endpoint}, pausing all senders")
+            raise
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 1.0:
+            self._recent.popleft()
+        self.global_bucket.refill(now)
+        self.bulk_bucket.refill(now)
+        return {
+            "sent_last_second": len(self._recent),
+            "global_limit_per_second": self.global_bucket.rate,
+            "global_tokens": round(self.global_bucket.tokens, 2),
+            "bulk_tokens": round(self.bulk_bucket.tokens, 2),
+            "paused_for": round(max(0.0, self._paused_until - now), 2),
+            "interactive_waiting": self._interactive_waiting,
+            "tracked_chats": len(self._chats),
+            "granted": dict(self.granted),
+            "delayed": dict(self.delayed),
+            "wait_seconds": {k: round(v, 2) for k, v in self.wait_seconds.items()},
+            "retry_after_events": self.retry_after_events,
+        }
@@ -0,0 +1,83 @@
+"""next_due_ts'e göre çalışan bellek içi zamanlayıcı (timer wheel).
+
+Abone id'leri ``resolution`` saniyelik kovalarda ``array('q')`` olarak
+tutulur (abone başına ~8 byte); kova anahtarları bir min-heap'tedir.
+Milyon abone birkaç on MB'ye sığar.
+
+İptal ve erteleme tembeldir: eski kayıtlar zamanı gelince yine çıkar,
+worker bunları DB'deki güncel satırla doğrulayıp eler. Bu yüzden
+set_optout için ayrıca bir şey yapmaya gerek yoktur. Satırın next_due_ts'i
+ileriyse kayıt bayattır (canlı kaydı o zamanda bekliyor) ve yeniden
+planlanmadan düşürülür; böylece bayat kayıtlar çoğalmaz. ``len()`` bayat
+kayıtları da sayar.
+"""
+import asyncio
+import heapq
+import time
+from array import array
+from typing import List, Optional
+
+
+class DueScheduler:
+    def __init__(self, resolution: int = 1):
+        self.resolution = max(1, int(resolution))
+        self._buckets = {}
+        self._heap = []
+        self._size = 0
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _slot(self, due_ts: int) -> int:
+        # Yukarı yuvarla: kova hiçbir zaman içindeki kayıtlardan önce açılmasın
+        return -(-int(due_ts or 0) // self.resolution)
+
+    def schedule(self, chat_id: int, due_ts: int):
+        slot = self._slot(due_ts)
+        bucket = self._buckets.get(slot)
+        if bucket is None:
+            bucket = self._buckets[slot] = array("q")
+            if not self._heap or slot < self._heap[0]:
+                self._wakeup.set()
+            heapq.heappush(self._heap, slot)
+        bucket.append(chat_id)
+        self._size += 1
+
+    def load(self, chat_ids, due_ts):
+        """Başlangıçta DB'den gelen (chat_id, next_due_ts) dizilerini yükle."""
+        for chat_id, due in zip(chat_ids, due_ts):
+            self.schedule(chat_id, due)
+
+    def next_due_ts(self) -> Optional[int]:
+        return self._heap[0] * self.resolution if self._heap else None
+
+    def pop_due(self, now_ts: float, limit: int) -> List[int]:
+        out = []
+        while self._heap and self._heap[0] * self.resolution <= now_ts and len(out) < limit:
+            slot = self._heap[0]
+            bucket = self._buckets[slot]
+            take = min(limit - len(out), len(bucket))
+            out.extend(bucket[-take:])
+            del bucket[-take:]
+            if not bucket:
+                heapq.heappop(self._heap)
+                del self._buckets[slot]
+        self._size -= len(out)
+        # Aynı abone iki kez planlanmış olabilir (ör. tekrar /start)
+        return list(dict.fromkeys(out))
+
+    async def wait_due(self, limit: int) -> List[int]:
+        """Bir sonraki kova açılana kadar uyu; boşta DB'ye dokunmaz."""
+        while True:
+            now = time.time()
+            chat_ids = self.pop_due(now, limit)
+            if chat_ids:
+                return chat_ids
+            self._wakeup.clear()
+            next_due = self.next_due_ts()
+            timeout = None if next_due is None else max(0.0, next_due - now)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
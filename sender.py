@@ -0,0 +1,141 @@
+"""Toplu gönderimler için eşzamanlı, sınırlı fan-out gönderici.
+
+Aynı anda en fazla ``concurrency`` gönderim uçuşta olur; aynı sohbete ait
+işler sırayla gider (bir sohbetin işi bitmeden sonrakine geçilmez).
+Tekrar denenecek işler gönderim slotunu bırakır ve gecikme sonunda
+kuyruğa geri girer; o sürede aynı sohbetin sonraki işleri bekler.
+
+``submit`` kuyruk doluyken bekler; üretici bu sayede kendiliğinden
+yavaşlar ve bir sonraki partiyi gönderim sürerken hazırlayabilir.
+
+``priority`` verilen işler (ertelenmiş yanıtlar) ``send_once``'a üçüncü
+argüman olarak geçer ve gönderim slotu beklemez; slotlar toplu
+gönderimin hız bütçesinde bekliyor olabilir.
+"""
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+SENT = "sent"
+RETRY = "retry"
+FAILED = "failed"
+
+
+class SendJob:
+    __slots__ = ("chat_id", "text", "on_done", "attempts", "priority")
+
+    def __init__(self, chat_id: int, text: str, on_done=None, priority: str = None):
+        self.chat_id = chat_id
+        self.text = text
+        self.on_done = on_done
+        self.attempts = 0
+        self.priority = priority
+
+
+class FanoutSender:
+    def __init__(self, send_once, concurrency: int = 8, max_pending: int = 1000,
+                 max_attempts: int = 3):
+        """send_once(chat_id, text[, priority]) -> (SENT | RETRY | FAILED, retry_delay_s, error)"""
+        self._send_once = send_once
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self._in_flight = asyncio.Semaphore(concurrency)
+        self._capacity = asyncio.Semaphore(max_pending)
+        self._chains = {}
+        self._tasks = set()
+        self._timers = {}
+        self._closed = False
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.counts = {SENT: 0, RETRY: 0, FAILED: 0}
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def submit(self, chat_id: int, text: str, on_done=None, priority: str = None):
+        """İşi kuyruğa al; on_done(outcome, delay, error) son denemeden sonra çağrılır."""
+        await self._capacity.acquire()
+        self._pending += 1
+        self._idle.clear()
+        job = SendJob(chat_id, text, on_done, priority)
+        chain = self._chains.get(chat_id)
+        if chain is not None:
+            chain.append(job)
+        else:
+            self._chains[chat_id] = deque()
+            self._spawn(job)
+
+    def _spawn(self, job: SendJob):
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _respawn(self, job: SendJob):
+        self._timers.pop(job, None)
+        self._spawn(job)
+
+    async def _attempt(self, job: SendJob):
+        job.attempts += 1
+        try:
+            if job.priority is None:
+                return await self._send_once(job.chat_id, job.text)
+            return await self._send_once(job.chat_id, job.text, job.priority)
+        except Exception as e:
+            logger.error(f"Unexpected send error for {job.chat_id}: {e}")
+            return FAILED, 0, repr(e)
+
+    async def _run(self, job: SendJob):
+        if job.priority is None:
+            async with self._in_flight:
+                outcome, delay, error = await self._attempt(job)
+        else:
+            outcome, delay, error = await self._attempt(job)
+
+        if outcome == RETRY and job.attempts < self.max_attempts:
+            self.counts[RETRY] += 1
+            loop = asyncio.get_running_loop()
+            self._timers[job] = loop.call_later(max(0.0, delay), self._respawn, job)
+            return
+
+        self.counts[SENT if outcome == SENT else FAILED] += 1
+        try:
+            if job.on_done is not None:
+                await job.on_done(outcome, delay, error)
+        except Exception as e:
+            logger.error(f"Send callback failed for {job.chat_id}: {e}")
+        finally:
+            self._finish(job)
+
+    def _finish(self, job: SendJob):
+        self._pending -= 1
+        self._capacity.release()
+        chain = self._chains.get(job.chat_id)
+        if chain and not self._closed:
+            self._spawn(chain.popleft())
+        else:
+            self._chains.pop(job.chat_id, None)
+        if not self._pending:
+            self._idle.set()
+
+    async def join(self):
+        await self._idle.wait()
+
+    async def close(self, timeout: float = 10.0):
+        """Uçuştaki gönderimlerin bitmesini bekle, kalanları bırak.
+
+        Bırakılan işlerin sonucu yazılmadığı için (outbox kirası dolunca)
+        tekrar denenir.
+        """
+        self._closed = True
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
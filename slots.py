@@ -0,0 +1,112 @@
+"""Yük dengeleyen next_due_ts ataması.
+
+``random.uniform`` ile seçilen zamanlar, bir kayıt dalgasının ardından
+aynı saatlere yığılır. SlotPlanner, gelecekteki gönderimleri sabit
+genişlikte slotlarda sayar (histogram) ve her yeni zamanı
+``[min_s, max_s]`` penceresindeki en az dolu slota koyar. Eşitlikte slot
+rastgele seçilir; aynı slottaki gönderimler slot içine eşit aralıklarla
+yayılır.
+
+Sayaçlar ``now`` slotundan başlayan düz bir dizide tutulur; zaman
+ilerledikçe geçmiş slotlar baştan atılır. En az dolu slot aramaları
+dizinin dilimleri üzerinde C hızında yapılır.
+
+Seçilen zaman sonradan kaydırılacaksa (örn. sessiz saatler) ``pick`` ile
+seçilir ve kaydırılmış zaman ``book`` ile yazılır; böylece sayılan slot
+gerçek gönderimin slotudur. Gerçekleşmeyecek gönderim (abonelik iptali)
+``release`` ile düşülür.
+"""
+import random
+from array import array
+
+GOLDEN = 0.6180339887498949
+
+
+class SlotPlanner:
+    def __init__(self, slot_s: int = 600, horizon_s: int = 4 * 86400, rng=None):
+        self.slot_s = slot_s
+        self.size = horizon_s // slot_s + 2
+        self._rng = rng or random.Random()
+        self._base = None
+        self._counts = array("l", [0] * self.size)
+        self.booked = 0
+
+    def _slot(self, ts: float) -> int:
+        return int(ts // self.slot_s)
+
+    def _advance(self, now: float):
+        slot = self._slot(now)
+        if self._base is None:
+            self._base = slot
+            return
+        shift = slot - self._base
+        if shift <= 0:
+            return
+        shift = min(shift, self.size)
+        self.booked -= sum(self._counts[:shift])
+        del self._counts[:shift]
+        self._counts.extend([0] * shift)
+        self._base = slot
+
+    def book(self, ts: float, now: float):
+        """Var olan bir gönderimi say (ufkun dışındakiler atlanır)."""
+        self._advance(now)
+        index = self._slot(ts) - self._base
+        if 0 <= index < self.size:
+            self._counts[index] += 1
+            self.booked += 1
+
+    def release(self, ts: float, now: float):
+        """``book`` edilmiş ama artık gerçekleşmeyecek bir gönderimi düş."""
+        self._advance(now)
+        index = self._slot(ts) - self._base
+        if 0 <= index < self.size and self._counts[index] > 0:
+            self._counts[index] -= 1
+            self.booked -= 1
+
+    def load(self, dues, now: float):
+        for ts in dues:
+            self.book(ts, now)
+
+    def assign(self, now: float, min_s: float, max_s: float) -> int:
+        """Pencere içindeki en az dolu slota bir gönderim yaz, zamanını döndür."""
+        ts = self.pick(now, min_s, max_s)
+        self.book(ts, now)
+        return ts
+
+    def pick(self, now: float, min_s: float, max_s: float) -> int:
+        """Pencere içindeki en az dolu slottan bir zaman seç; slot yazılmaz."""
+        self._advance(now)
+        start_ts, end_ts = now + min_s, now + max_s
+        # Sadece tamamı pencerede kalan slotlar; kısmi slotlar dar bir
+        # aralığa yığılmaya yol açar
+        first = max(0, -int(-start_ts // self.slot_s) - self._base)
+        last = min(self.size - 1, self._slot(end_ts) - 1 - self._base)
+        if last < first:
+            return int(self._rng.uniform(start_ts, end_ts))
+
+        window = self._counts[first:last + 1]
+        lowest = min(window)
+        # Eşitlikte rastgele bir noktadan başlayıp ilk minimumu al
+        offset = self._rng.randrange(len(window))
+        tail = window[offset:]
+        pick = offset + tail.index(lowest) if lowest in tail else window.index(lowest)
+        index = first + pick
+
+        # Slot içinde altın oran adımıyla yay: aynı slota düşenler dakikalara
+        # rastgele atamadan daha düzgün dağılır
+        position = ((self._counts[index] + 1) * GOLDEN + self._rng.random() / self.slot_s) % 1.0
+        return (self._base + index) * self.slot_s + int(position * self.slot_s)
+
+    def stats(self, now: float, span_s: float = 86400) -> dict:
+        """Önümüzdeki span_s içindeki slotların doluluğu."""
+        self._advance(now)
+        counts = self._counts[:max(1, int(span_s // self.slot_s))]
+        mean = sum(counts) / len(counts)
+        return {
+            "slot_s": self.slot_s,
+            "booked": self.booked,
+            "peak": max(counts),
+            "mean": round(mean, 2),
+            "peak_to_mean": round(max(counts) / mean, 2) if mean else 0.0,
+        }
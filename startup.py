@@ -0,0 +1,32 @@
+"""Soğuk başlangıç ölçümü.
+
+``import startup`` bot.py'nin ilk import'udur; aşama süreleri oradan
+ölçülür (yorumlayıcının açılışı hariç). Her aşama ``mark`` ile bir kez
+kaydedilir; ``report`` tek bir log satırı yazar, değerler /metrics'te
+``startup_seconds{phase}`` olarak da görünür.
+
+Modül bazında import süreleri ve süreç başlangıcından ilk işlenen
+update'e kadar geçen süre için bkz. benchmarks/bench_startup.py.
+"""
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+STARTED = time.perf_counter()
+_phases = {}
+
+
+def mark(phase: str) -> float:
+    """Aşamanın ilk görülme anını kaydeder; sonraki çağrılar değiştirmez."""
+    if phase not in _phases:
+        _phases[phase] = time.perf_counter() - STARTED
+    return _phases[phase]
+
+
+def phases() -> dict:
+    return dict(_phases)
+
+
+def report():
+    logger.info("Startup: " + " ".join(f"{phase}={seconds:.3f}s" for phase, seconds in _phases.items()))
@@ -0,0 +1,138 @@
+"""Sohbet bazında sıralı, sohbetler arası eşzamanlı update işleme.
+
+PTB'nin varsayılan ayarında update'ler tek tek işlenir; yavaş bir Gemini
+yanıtı /start'ı ve diğer sohbetleri de bekletir. Bu işlemci:
+
+- En fazla ``concurrency`` update'i aynı anda çalıştırır.
+- Aynı sohbetin update'lerini geliş sırasıyla, birbiri ardına işler.
+- Sohbet başına bekleyen update sayısını ``per_chat_limit`` ile sınırlar;
+  sınırı aşan update'ler düşürülür, böylece tek bir grubun seli diğer
+  sohbetlerin slotlarını tüketemez. Dolu sohbete gelen komut (/stop,
+  /status ...) düşürülmez; yerine sırada bekleyen en eski komut olmayan
+  update düşürülür. Bekleyenlerin hepsi komutsa yeni komut da düşer.
+
+Sırasını bekleyen update bir çalışma slotu tutmaz; slot ancak sohbetin
+kilidi alındıktan sonra istenir.
+"""
+import asyncio
+import logging
+from collections import deque
+
+from telegram.ext import BaseUpdateProcessor, filters
+
+logger = logging.getLogger(__name__)
+
+
+class _Waiting:
+    __slots__ = ("command", "dropped")
+
+    def __init__(self, command: bool):
+        self.command = command
+        self.dropped = False
+
+
+class _ChatLane:
+    __slots__ = ("lock", "pending", "waiting")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+        self.waiting = deque()  # kilidi bekleyen update'ler, geliş sırasıyla
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, concurrency: int = 16, per_chat_limit: int = 20, max_pending: int = 4096):
+        # Üst sınıfın semaforu toplam kabul edilen (çalışan + bekleyen) update
+        # sayısını sınırlar; gerçek eşzamanlılığı _slots belirler.
+        super().__init__(max_concurrent_updates=max(max_pending, concurrency))
+        self.concurrency = concurrency
+        self.per_chat_limit = per_chat_limit
+        self._slots = asyncio.Semaphore(concurrency)
+        self._lanes = {}
+        self._running = 0
+        self.processed = 0
+        self.dropped = 0
+        # İlk update işlendiğinde bir kez çağrılır (başlangıç ölçümü)
+        self.on_first_update = None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @staticmethod
+    def _chat_id(update):
+        chat = getattr(update, "effective_chat", None)
+        return chat.id if chat is not None else None
+
+    @staticmethod
+    def _is_command(update) -> bool:
+        return bool(getattr(update, "effective_message", None) and filters.COMMAND.check_update(update))
+
+    def _evict(self, lane: _ChatLane) -> bool:
+        """Kilidi bekleyen en eski komut olmayan update'i düşür."""
+        for waiting in lane.waiting:
+            if not waiting.command:
+                lane.waiting.remove(waiting)
+                waiting.dropped = True
+                lane.pending -= 1
+                self.dropped += 1
+                return True
+        return False
+
+    async def _run(self, coroutine):
+        async with self._slots:
+            self._running += 1
+            try:
+                await coroutine
+            finally:
+                self._running -= 1
+                self.processed += 1
+                if self.processed == 1 and self.on_first_update is not None:
+                    self.on_first_update()
+
+    async def do_process_update(self, update, coroutine) -> None:
+        chat_id = self._chat_id(update)
+        if chat_id is None:
+            await self._run(coroutine)
+            return
+
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            lane = self._lanes[chat_id] = _ChatLane()
+        command = self._is_command(update)
+        if lane.pending >= self.per_chat_limit and not (command and self._evict(lane)):
+            self.dropped += 1
+            coroutine.close()
+            logger.debug(f"Dropping update for chat {chat_id}: {lane.pending} already queued")
+            return
+
+        waiting = _Waiting(command)
+        lane.pending += 1
+        lane.waiting.append(waiting)
+        try:
+            async with lane.lock:
+                if waiting.dropped:
+                    # Sırada beklerken bir komuta yer açmak için düşürüldü
+                    coroutine.close()
+                    return
+                lane.waiting.remove(waiting)
+                await self._run(coroutine)
+        finally:
+            if not waiting.dropped:
+                lane.pending -= 1
+                if waiting in lane.waiting:  # kilit beklenirken iptal
+                    lane.waiting.remove(waiting)
+            if not lane.pending:
+                self._lanes.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "running": self._running,
+            "queued": max(0, sum(lane.pending for lane in self._lanes.values()) - self._running),
+            "busy_chats": len(self._lanes),
+            "processed": self.processed,
+            "dropped": self.dropped,
+        }
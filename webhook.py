@@ -0,0 +1,259 @@
+"""Webhook modu: run_polling yerine gömülü asyncio HTTP sunucusu.
+
+Telegram update'leri POST ile gönderir. Sunucu:
+
+- ``X-Telegram-Bot-Api-Secret-Token`` başlığını sabit zamanlı karşılaştırır
+  (uyuşmazsa 403),
+- gövdeyi JSON olarak çözer, hemen 200 döner ve update'i
+  ``application.update_queue``'ya koyar; işleme handler'larda sürer,
+- Telegram zaman aşımında aynı update'i tekrar yollarsa son
+  ``dedup_size`` update_id içinde görüleni atlar,
+- kapanırken yeni bağlantı almaz, süren istekleri bitirir (drain) ve
+  kuyruktaki update'leri Application.stop() ile işletir. Drain sırasında
+  gelen isteklere 503 döner; Telegram onları sonra tekrar gönderir.
+
+Yalnızca standart kütüphane kullanılır (PTB'nin run_webhook'u tornado
+ister). Yerel deneme için kayıtlı bir update gönderilebilir::
+
+    curl -X POST http://127.0.0.1:8443/telegram \\
+         -H "X-Telegram-Bot-Api-Secret-Token: $SECRET" \\
+         -H "Content-Type: application/json" -d @update.json
+
+(bkz. benchmarks/post_updates.py)
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import signal
+import time
+from collections import deque
+
+from telegram import Update
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+REQUESTS = metrics.counter("webhook_requests_total", "Webhook HTTP requests", ("status",))
+HANDLE_SECONDS = metrics.histogram("webhook_response_seconds", "Time from request line to response written")
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+    405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable",
+}
+
+
+def derive_secret(bot_token: str) -> str:
+    """WEBHOOK_SECRET verilmezse token'dan türetilir.
+
+    Tüm replikalar aynı değeri bulur (birinin setWebhook'u diğerini
+    geçersiz kılmaz) ve token bilinmeden tahmin edilemez.
+    """
+    return hashlib.sha256(f"webhook:{bot_token}".encode("utf-8")).hexdigest()[:64]
+
+
+class WebhookServer:
+    def __init__(self, application, host: str, port: int, path: str, secret_token: str,
+                 max_body: int = 1_000_000, dedup_size: int = 2048, idle_timeout: float = 60.0):
+        self.application = application
+        self.host = host
+        self.port = port
+        self.path = path
+        self._secret = secret_token.encode("utf-8")
+        self.max_body = max_body
+        self.idle_timeout = idle_timeout
+        self._seen = set()
+        self._seen_order = deque(maxlen=dedup_size)
+        self._server = None
+        self._connections = set()
+        self._busy = 0
+        self._idle = None
+        self.draining = False
+        self.accepted = 0
+        self.duplicates = 0
+
+    @property
+    def secret_token(self) -> str:
+        return self._secret.decode("utf-8")
+
+    async def start(self):
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Webhook listening on {self.host}:{self.port}{self.path}")
+        return self
+
+    # -- HTTP --------------------------------------------------------------
+    async def _handle(self, reader, writer):
+        self._connections.add(writer)
+        try:
+            while not self.draining:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                self._busy += 1
+                self._idle.clear()
+                try:
+                    keep_alive = await self._request(request_line, reader, writer)
+                finally:
+                    self._busy -= 1
+                    if not self._busy:
+                        self._idle.set()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _request(self, request_line: bytes, reader, writer) -> bool:
+        started = time.perf_counter()
+        parts = request_line.decode("latin-1").split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0") or 0)
+        keep_alive = headers.get("connection", "").lower() != "close"
+
+        if len(parts) < 2 or parts[1].split("?", 1)[0] != self.path:
+            status = 404
+        elif parts[0] != "POST":
+            status = 405
+        elif length > self.max_body:
+            # Gövde okunmadı; bağlantı yeniden kullanılamaz
+            status, keep_alive = 413, False
+        elif self.draining:
+            status = 503
+        elif not hmac.compare_digest(headers.get(SECRET_HEADER, "").encode("utf-8"), self._secret):
+            status = 403
+        else:
+            status = None
+        body = await reader.readexactly(length) if length and status != 413 else b""
+
+        data = None
+        if status is None:
+            try:
+                data = json.loads(body)
+                status = 200 if isinstance(data, dict) and "update_id" in data else 400
+            except ValueError:
+                status = 400
+
+        # Önce yanıt: Telegram işleme süresini beklemez
+        await self._respond(writer, status, keep_alive)
+        REQUESTS.inc(status=status)
+        HANDLE_SECONDS.observe(time.perf_counter() - started)
+        if status == 200:
+            self._enqueue(data)
+        elif status == 403:
+            logger.warning(f"Webhook request with bad secret token from {writer.get_extra_info('peername')}")
+        return keep_alive
+
+    @staticmethod
+    async def _respond(writer, status: int, keep_alive: bool):
+        body = b'{"ok":true}' if status == 200 else b""
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+            .encode("latin-1") + body
+        )
+        await writer.drain()
+
+    def _enqueue(self, data: dict):
+        update_id = data["update_id"]
+        if update_id in self._seen:
+            self.duplicates += 1
+            return
+        if len(self._seen_order) == self._seen_order.maxlen:
+            self._seen.discard(self._seen_order[0])
+        self._seen_order.append(update_id)
+        self._seen.add(update_id)
+        try:
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            logger.error(f"Could not parse update {update_id}: {e}")
+            return
+        self.application.update_queue.put_nowait(update)
+        self.accepted += 1
+
+    # -- kapanış -----------------------------------------------------------
+    async def stop(self, timeout: float = 10.0):
+        """Yeni bağlantıları kes, süren istekleri bekle, boştaki bağlantıları kapat."""
+        if self._server is None:
+            return
+        self.draining = True
+        self._server.close()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Webhook drain timed out with {self._busy} requests in flight")
+        for writer in list(self._connections):
+            writer.close()
+        await self._server.wait_closed()
+        self._server = None
+        logger.info(f"Webhook stopped: {self.accepted} updates accepted, {self.duplicates} duplicates skipped")
+
+    def stats(self) -> dict:
+        return {
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "connections": len(self._connections),
+            "in_flight": self._busy,
+        }
+
+
+async def serve(application, server: WebhookServer, webhook_url: str = "", drain_timeout: float = 10.0,
+                **set_webhook_kwargs):
+    """run_polling'in webhook karşılığı: yaşam döngüsü ve kancalar.
+
+    ``webhook_url`` verilirse setWebhook çağrılır (secret_token ile).
+    SIGINT/SIGTERM ile durur: önce HTTP drain, sonra Application.stop()
+    kuyruktaki update'leri işler, en son post_stop/post_shutdown.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: KeyboardInterrupt ile çıkılır
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await server.start()
+        try:
+            if webhook_url:
+                await application.bot.set_webhook(
+                    url=webhook_url,
+                    secret_token=server.secret_token,
+                    **set_webhook_kwargs,
+                )
+                logger.info(f"Webhook registered at {webhook_url}")
+            await application.start()
+            try:
+                await stop.wait()
+            finally:
+                await server.stop(drain_timeout)
+                await application.stop()
+                if application.post_stop:
+                    await application.post_stop(application)
+        finally:
+            await server.stop(0)  # setWebhook/start hata verdiyse
+    finally:
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)